@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark: dense full-vocabulary TF dicts vs the sparse vector index
+
+Builds a synthetic Zipf-distributed corpus and compares index memory and
+per-query latency. The dense baseline is O(docs x vocab), so at large sizes it
+is measured on a sample of documents and extrapolated linearly (marked in the
+output) - materialising it in full would need tens of gigabytes.
+
+    python benchmark_vector_search.py                 # 10k and 100k chunks
+    python benchmark_vector_search.py --sizes 1000 10000 --json results.json
+"""
+import argparse
+import json
+import math
+import random
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List
+
+from vector_search import SparseVectorIndex, preprocess_text
+
+
+# --- Legacy dense implementation (as it was in main.py) ---
+def dense_tf_vector(words: List[str], vocabulary: set) -> Dict[str, float]:
+    word_count = Counter(words)
+    total_words = len(words)
+    return {word: (word_count.get(word, 0) / total_words if total_words > 0 else 0) for word in vocabulary}
+
+
+def dense_cosine(vec1: Dict[str, float], vec2: Dict[str, float]) -> float:
+    dot_product = sum(vec1.get(word, 0) * vec2.get(word, 0) for word in vec1.keys() | vec2.keys())
+    magnitude1 = math.sqrt(sum(val**2 for val in vec1.values()))
+    magnitude2 = math.sqrt(sum(val**2 for val in vec2.values()))
+    if magnitude1 == 0 or magnitude2 == 0:
+        return 0
+    return dot_product / (magnitude1 * magnitude2)
+
+
+# --- Synthetic corpus ---
+def make_corpus(num_docs: int, vocab_size: int, doc_length: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    words = [f"term{i:05d}" for i in range(vocab_size)]
+    zipf_weights = [1 / (rank + 1) for rank in range(vocab_size)]
+    return [" ".join(rng.choices(words, weights=zipf_weights, k=doc_length)) for _ in range(num_docs)]
+
+
+def measure(fn):
+    """Run fn under tracemalloc; return (result, seconds, peak bytes)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def bench_size(num_docs: int, args) -> Dict:
+    corpus = make_corpus(num_docs, args.vocab, args.doc_length, args.seed)
+    queries = make_corpus(args.queries, args.vocab, 6, args.seed + 1)
+    tokenized = [preprocess_text(text) for text in corpus]
+    query_words = [preprocess_text(q) for q in queries]
+
+    # Sparse index over the full corpus
+    index, sparse_build, sparse_peak = measure(lambda: SparseVectorIndex(tokenized))
+    start = time.perf_counter()
+    for words in query_words:
+        index.search(words, top_k=3)
+    sparse_query = (time.perf_counter() - start) / len(query_words)
+
+    # Dense baseline on a sample, scaled up to the full corpus size
+    sample = min(num_docs, args.dense_sample)
+    scale = num_docs / sample
+    vocabulary = set(index.vocabulary)
+    dense_vectors, dense_build, dense_peak = measure(
+        lambda: [dense_tf_vector(words, vocabulary) for words in tokenized[:sample]])
+    start = time.perf_counter()
+    for words in query_words[:args.dense_queries]:
+        query_vector = dense_tf_vector(words, vocabulary)
+        scores = [dense_cosine(query_vector, vec) for vec in dense_vectors]
+        sorted(scores, reverse=True)[:3]
+    dense_query = (time.perf_counter() - start) / min(len(query_words), args.dense_queries)
+    del dense_vectors
+
+    return {
+        "docs": num_docs,
+        "vocabulary": len(vocabulary),
+        "sparse": {
+            "build_seconds": round(sparse_build, 3),
+            "peak_build_bytes": sparse_peak,
+            "index_bytes": index.nbytes(),
+            "query_ms": round(sparse_query * 1000, 3),
+        },
+        "dense": {
+            "extrapolated": scale > 1,
+            "sample_docs": sample,
+            "build_seconds": round(dense_build * scale, 3),
+            "peak_build_bytes": int(dense_peak * scale),
+            "query_ms": round(dense_query * scale * 1000, 3),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--vocab", type=int, default=20_000, help="synthetic vocabulary size")
+    parser.add_argument("--doc-length", type=int, default=80, help="words per chunk")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dense-sample", type=int, default=300, help="max docs to materialise densely")
+    parser.add_argument("--dense-queries", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        row = bench_size(size, args)
+        results.append(row)
+        sparse, dense = row["sparse"], row["dense"]
+        note = " (extrapolated)" if dense["extrapolated"] else ""
+        print(f"{size:>8} docs | vocab {row['vocabulary']:>6}")
+        print(f"  sparse: index {sparse['index_bytes'] / 1e6:9.1f} MB, build peak {sparse['peak_build_bytes'] / 1e6:9.1f} MB, "
+              f"query {sparse['query_ms']:10.3f} ms")
+        print(f"  dense:  build peak {dense['peak_build_bytes'] / 1e6:9.1f} MB, query {dense['query_ms']:10.3f} ms{note}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,6 @@
 import json
 import os
-import re
-import math
 import datetime
-from collections import Counter
 from typing import List, Dict, Optional
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
@@ -12,6 +9,9 @@ from pydantic import BaseModel
 from google import genai
 from google.genai import types
 
+from semantic_cache import SemanticCache
+from vector_search import SparseVectorIndex, preprocess_text
+
 # FastAPI app will be initialized after lifespan function definition
 
 # Initialize Gemini client
@@ -19,8 +19,8 @@ client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
 
 # Global variables for the knowledge base
 ayurvedic_texts = []
-text_word_vectors = []
-vocabulary = set()
+vector_index: Optional[SparseVectorIndex] = None
+semantic_cache = SemanticCache()
 
 
 class ChatRequest(BaseModel):
@@ -161,46 +161,6 @@ def load_ayurvedic_knowledge():
     }]
 
 
-def preprocess_text(text: str) -> List[str]:
-    """Simple text preprocessing"""
-    # Convert to lowercase and extract words
-    words = re.findall(r'\b\w+\b', text.lower())
-    # Filter out common stop words
-    stop_words = {
-        'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
-        'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'have',
-        'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should',
-        'may', 'might', 'can', 'this', 'that', 'these', 'those'
-    }
-    return [word for word in words if word not in stop_words and len(word) > 2]
-
-
-def create_tf_vector(words: List[str], vocabulary: set) -> Dict[str, float]:
-    """Create term frequency vector"""
-    word_count = Counter(words)
-    total_words = len(words)
-    tf_vector = {}
-    for word in vocabulary:
-        tf = word_count.get(word, 0) / total_words if total_words > 0 else 0
-        tf_vector[word] = tf
-    return tf_vector
-
-
-def cosine_similarity_simple(vec1: Dict[str, float],
-                             vec2: Dict[str, float]) -> float:
-    """Calculate cosine similarity between two vectors"""
-    dot_product = sum(
-        vec1.get(word, 0) * vec2.get(word, 0)
-        for word in vec1.keys() | vec2.keys())
-    magnitude1 = math.sqrt(sum(val**2 for val in vec1.values()))
-    magnitude2 = math.sqrt(sum(val**2 for val in vec2.values()))
-
-    if magnitude1 == 0 or magnitude2 == 0:
-        return 0
-
-    return dot_product / (magnitude1 * magnitude2)
-
-
 def format_ayurvedic_response_html(response_text: str, user_query: str, sources: Optional[List[Dict]] = None) -> str:
     """
     Format Gemini's Ayurvedic response in beautiful HTML with emojis and professional styling
@@ -343,30 +303,18 @@ def format_ayurvedic_response_html(response_text: str, user_query: str, sources:
 def vector_similarity_search(query: str,
                              texts: List[Dict],
                              top_k: int = 3) -> List[Dict]:
-    """Vector similarity search using simple TF and cosine similarity"""
-    global text_word_vectors, vocabulary
-
-    if not text_word_vectors or not vocabulary:
+    """Vector similarity search using sparse TF vectors and cosine similarity"""
+    if vector_index is None or len(vector_index) == 0:
         print("Error: Vector search not initialized")
         return texts[:top_k]  # Fallback to first few texts
 
     try:
-        # Preprocess query
-        query_words = preprocess_text(query)
-        query_vector = create_tf_vector(query_words, vocabulary)
-
-        # Calculate similarities
-        similarities = []
-        for i, text_vector in enumerate(text_word_vectors):
-            similarity = cosine_similarity_simple(query_vector, text_vector)
-            similarities.append((i, similarity))
-
-        # Sort by similarity and get top results
-        similarities.sort(key=lambda x: x[1], reverse=True)
+        # Sparse dot product over the query's own terms only
+        similarities = vector_index.search(preprocess_text(query), top_k)
 
         # Filter out very low similarities (threshold 0.1) and get relevant texts
         relevant_texts = []
-        for idx, sim in similarities[:top_k]:
+        for idx, sim in similarities:
             if sim > 0.05:  # Lower threshold for simple TF
                 relevant_texts.append(texts[idx])
 
@@ -394,8 +342,12 @@ def vector_similarity_search(query: str,
 def generate_ayurvedic_response(
         query: str,
         relevant_texts: List[Dict],
-        conversation_history: Optional[List[Dict]] = None) -> Dict[str, str]:
-    """Generate response using Gemini with Ayurvedic context and format as beautiful HTML"""
+        conversation_history: Optional[List[Dict]] = None,
+        cache_words: Optional[List[str]] = None) -> Dict[str, str]:
+    """Generate response using Gemini with Ayurvedic context and format as beautiful HTML
+
+    When cache_words is given, a successful answer is stored in the semantic cache.
+    """
 
     # Prepare context from relevant texts
     context = "\n\n".join([
@@ -452,6 +404,10 @@ Please provide a detailed Ayurvedic perspective addressing their question, inclu
                 max_output_tokens=2500))
 
         if response.text:
+            if cache_words:
+                semantic_cache.add(cache_words, [text['id'] for text in relevant_texts],
+                                   {"plain_text": response.text})
+
             # Format the response as beautiful HTML
             formatted_html = format_ayurvedic_response_html(response.text, query, relevant_texts)
             return {"formatted_html": formatted_html, "plain_text": response.text}
@@ -467,30 +423,16 @@ Please provide a detailed Ayurvedic perspective addressing their question, inclu
 
 
 def initialize_vector_search():
-    """Initialize simple vector search with TF vectors"""
-    global text_word_vectors, vocabulary, ayurvedic_texts
+    """Initialize sparse vector search with normalized TF vectors"""
+    global vector_index
 
     print("Initializing vector search...")
 
-    # Build vocabulary from all texts
-    all_words = set()
-    all_processed_texts = []
-
-    for text in ayurvedic_texts:
-        processed_words = preprocess_text(text['content'])
-        all_processed_texts.append(processed_words)
-        all_words.update(processed_words)
-
-    vocabulary = all_words
-
-    # Create TF vectors for each text
-    text_word_vectors = []
-    for processed_words in all_processed_texts:
-        tf_vector = create_tf_vector(processed_words, vocabulary)
-        text_word_vectors.append(tf_vector)
+    vector_index = SparseVectorIndex(
+        [preprocess_text(text['content']) for text in ayurvedic_texts])
 
     print(
-        f"Vector search initialized with {len(text_word_vectors)} documents and {len(vocabulary)} vocabulary terms."
+        f"Vector search initialized with {len(vector_index)} documents and {len(vector_index.vocabulary)} vocabulary terms."
     )
 
 
@@ -805,9 +747,21 @@ async def chat_endpoint(request: ChatRequest):
                                                   ayurvedic_texts,
                                                   top_k=3)
 
-        # Generate response using Gemini with conversation history
-        response_data = generate_ayurvedic_response(request.message, relevant_texts,
-                                                   request.conversation_history)
+        # Answers that depend on earlier turns are never served from the cache
+        query_words = preprocess_text(request.message)
+        use_cache = not request.conversation_history
+        cached = semantic_cache.lookup(query_words, [text['id'] for text in relevant_texts]) if use_cache else None
+
+        if cached:
+            response_data = {
+                "plain_text": cached["plain_text"],
+                "formatted_html": format_ayurvedic_response_html(cached["plain_text"], request.message, relevant_texts)
+            }
+        else:
+            # Generate response using Gemini with conversation history
+            response_data = generate_ayurvedic_response(request.message, relevant_texts,
+                                                       request.conversation_history,
+                                                       cache_words=query_words if use_cache else None)
 
         # Extract sources
         sources = [text['metadata']['source'] for text in relevant_texts]
@@ -826,7 +780,8 @@ async def chat_endpoint(request: ChatRequest):
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "knowledge_base_size": len(ayurvedic_texts)}
+    return {"status": "healthy", "knowledge_base_size": len(ayurvedic_texts),
+            "semantic_cache": semantic_cache.stats()}
 
 
 if __name__ == "__main__":
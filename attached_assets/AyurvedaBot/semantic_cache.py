@@ -0,0 +1,112 @@
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from vector_search import cosine_similarity_simple, create_tf_vector
+
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.5))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", 20000))
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+class SemanticCache:
+    """Near-duplicate answer cache for past questions.
+
+    Queries are stored as normalized sparse TF vectors. Candidate lookup goes
+    through MinHash/LSH buckets over the query's word set, so a lookup only
+    compares against entries sharing a bucket rather than scanning the cache.
+    A hit needs cosine similarity >= threshold AND the same retrieved context,
+    which keeps "vata imbalance" from answering "pitta imbalance".
+    """
+
+    def __init__(self,
+                 threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+                 bands: int = 32,
+                 rows: int = 2,
+                 seed: int = 7):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.bands = bands
+        self.rows = rows
+        # Universal hash family h(x) = (a*x + b) mod p, one (a, b) pair per permutation.
+        # a, b < 2**31 and x < 2**32 keep a*x + b inside uint64.
+        rng = np.random.default_rng(seed)
+        num_perm = bands * rows
+        self._a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+
+        self._next_id = 0
+        # entry id -> (vector, context ids, bucket keys, value); oldest first
+        self._entries: "OrderedDict[int, Tuple]" = OrderedDict()
+        self._buckets: Dict[Tuple, set] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _bucket_keys(self, words: List[str]) -> List[Tuple]:
+        tokens = np.array([zlib.crc32(word.encode('utf-8')) for word in set(words)], dtype=np.uint64)
+        signature = ((self._a[:, None] * tokens[None, :] + self._b[:, None]) % np.uint64(_MERSENNE_PRIME)).min(axis=1)
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                for band in range(self.bands)]
+
+    def lookup(self, words: List[str], context_ids: List[str]) -> Optional[Dict]:
+        """Return the cached value of the most similar past query, or None"""
+        if not words:
+            return None
+        vector = create_tf_vector(words)
+        context = tuple(sorted(context_ids))
+        with self._lock:
+            candidates = set()
+            for key in self._bucket_keys(words):
+                candidates |= self._buckets.get(key, set())
+
+            best_id, best_score = None, self.threshold
+            for entry_id in candidates:
+                entry_vector, entry_context, _, _ = self._entries[entry_id]
+                if entry_context != context:
+                    continue
+                score = cosine_similarity_simple(vector, entry_vector)
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id][3]
+
+    def add(self, words: List[str], context_ids: List[str], value: Dict):
+        """Remember the answer for a query, evicting the least recently used entry when full"""
+        if not words:
+            return
+        keys = self._bucket_keys(words)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (create_tf_vector(words), tuple(sorted(context_ids)), keys, value)
+            for key in keys:
+                self._buckets.setdefault(key, set()).add(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                old_id, (_, _, old_keys, _) = self._entries.popitem(last=False)
+                for key in old_keys:
+                    bucket = self._buckets[key]
+                    bucket.discard(old_id)
+                    if not bucket:
+                        del self._buckets[key]
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "buckets": len(self._buckets),
+            "hits": self.hits,
+            "misses": self.misses,
+            "threshold": self.threshold,
+        }
@@ -0,0 +1,95 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+def preprocess_text(text: str) -> List[str]:
+    """Simple text preprocessing"""
+    # Convert to lowercase and extract words
+    words = re.findall(r'\b\w+\b', text.lower())
+    # Filter out common stop words
+    stop_words = {
+        'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+        'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'have',
+        'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should',
+        'may', 'might', 'can', 'this', 'that', 'these', 'those'
+    }
+    return [word for word in words if word not in stop_words and len(word) > 2]
+
+
+def create_tf_vector(words: List[str]) -> Dict[str, float]:
+    """Create a sparse, L2-normalized term frequency vector (nonzero terms only)"""
+    word_count = Counter(words)
+    # TF is count / total_words; the total cancels out once the vector is normalized
+    magnitude = math.sqrt(sum(count * count for count in word_count.values()))
+    if magnitude == 0:
+        return {}
+    return {word: count / magnitude for word, count in word_count.items()}
+
+
+def cosine_similarity_simple(vec1: Dict[str, float],
+                             vec2: Dict[str, float]) -> float:
+    """Cosine similarity of two normalized sparse vectors (a dot product over the smaller one)"""
+    if len(vec1) > len(vec2):
+        vec1, vec2 = vec2, vec1
+    return sum(weight * vec2.get(word, 0.0) for word, weight in vec1.items())
+
+
+class SparseVectorIndex:
+    """Inverted index of normalized TF vectors.
+
+    Each term maps to a (doc ids, weights) pair of NumPy arrays, i.e. one column
+    of the sparse doc x term matrix. Scoring a query is a sparse dot product
+    that only touches the columns of the query's own terms.
+    """
+
+    def __init__(self, documents: List[List[str]]):
+        doc_ids: Dict[str, List[int]] = {}
+        weights: Dict[str, List[float]] = {}
+        for doc_idx, words in enumerate(documents):
+            for word, weight in create_tf_vector(words).items():
+                doc_ids.setdefault(word, []).append(doc_idx)
+                weights.setdefault(word, []).append(weight)
+
+        self.num_docs = len(documents)
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+            word: (np.asarray(doc_ids[word], dtype=np.int32),
+                   np.asarray(weights[word], dtype=np.float32))
+            for word in doc_ids
+        }
+
+    @property
+    def vocabulary(self):
+        return self.postings.keys()
+
+    def __len__(self) -> int:
+        return self.num_docs
+
+    def nbytes(self) -> int:
+        """Approximate size of the postings arrays in bytes"""
+        return sum(ids.nbytes + values.nbytes for ids, values in self.postings.values())
+
+    def search(self, query_words: List[str], top_k: int = 3) -> List[Tuple[int, float]]:
+        """Return up to top_k (doc index, cosine similarity) pairs, best first"""
+        query_vector = create_tf_vector(query_words)
+        scores = None
+        for word, query_weight in query_vector.items():
+            column = self.postings.get(word)
+            if column is None:
+                continue
+            if scores is None:
+                scores = np.zeros(self.num_docs, dtype=np.float32)
+            ids, values = column
+            # Doc ids are unique within a column, so fancy-index accumulation is safe
+            scores[ids] += query_weight * values
+
+        if scores is None or top_k <= 0:
+            return []
+
+        top_k = min(top_k, self.num_docs)
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        ranked = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(int(idx), float(scores[idx])) for idx in ranked if scores[idx] > 0]
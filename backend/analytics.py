@@ -0,0 +1,87 @@
+"""
+Session rollups - per-bucket status counts kept up to date on every session write
+A bucket is a (dimension, key) pair such as ("therapy", "Abhyanga") or ("day", "2025-01-02");
+each holds a count per status. The storage backends apply the deltas below in the same
+batch or transaction as the session write, so dashboards read O(buckets) documents.
+
+Rebuild every bucket from the sessions themselves (after a migration or a suspected drift):
+
+    python analytics.py --rebuild
+"""
+from collections import Counter, defaultdict
+from typing import Any, Dict, Optional, Tuple
+
+# Dimension name -> the session field it groups by; "all" is the single overall bucket
+DIMENSIONS = {
+    "all": None,
+    "therapy": "therapy",
+    "practitioner": "practitioner",
+    "day": "date",
+}
+ROLLUP_FIELDS = {"status"} | {field for field in DIMENSIONS.values() if field}
+UNKNOWN = "unknown"
+
+Bucket = Tuple[str, str]
+Deltas = Dict[Bucket, Dict[str, int]]
+
+
+def bucket_key(session: Dict[str, Any], dimension: str) -> str:
+    field = DIMENSIONS[dimension]
+    if field is None:
+        return "all"
+    value = session.get(field)
+    if not value:
+        return UNKNOWN
+    return str(value)[:10] if dimension == "day" else str(value)
+
+
+def session_deltas(before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> Deltas:
+    """Status count changes per bucket for one session going from `before` to `after` (None = absent)"""
+    counts = defaultdict(Counter)
+    for session, step in ((before, -1), (after, 1)):
+        if session is None:
+            continue
+        status = session.get("status") or UNKNOWN
+        for dimension in DIMENSIONS:
+            counts[(dimension, bucket_key(session, dimension))][status] += step
+    return {
+        bucket: {status: n for status, n in statuses.items() if n}
+        for bucket, statuses in counts.items()
+        if any(statuses.values())
+    }
+
+
+def merge_deltas(into: Deltas, deltas: Deltas) -> Deltas:
+    for bucket, statuses in deltas.items():
+        target = into.setdefault(bucket, {})
+        for status, n in statuses.items():
+            target[status] = target.get(status, 0) + n
+    return into
+
+
+def touches_rollups(update_data: Dict[str, Any]) -> bool:
+    """Whether a partial update can move a session between buckets"""
+    return not ROLLUP_FIELDS.isdisjoint(update_data)
+
+
+def bucket_summary(key: str, statuses: Dict[str, int]) -> Dict[str, Any]:
+    total = sum(statuses.values())
+    return {
+        "key": key,
+        "total": total,
+        "statuses": statuses,
+        "completionRate": round(statuses.get("completed", 0) / total, 4) if total else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Session rollup maintenance")
+    parser.add_argument("--rebuild", action="store_true", help="recompute every rollup bucket from the sessions")
+    args = parser.parse_args()
+    if args.rebuild:
+        from repositories import get_session_repository
+        print(f"Rebuilt rollups from {get_session_repository().rebuild_rollups()} sessions")
+    else:
+        parser.print_help()
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Benchmark: whole-app load test and chatbot microbenchmarks
+
+`load` boots the FastAPI app from main.py in-process (lifespan included) against the
+Firestore fake and a stub OpenAI-compatible LLM server, then drives a weighted mix of
+session list / create / reschedule / chat requests at each concurrency level and reports
+p50/p95/p99 latency per operation, throughput and process memory.
+
+`micro` times find_relevant_knowledge, preprocess_text and format_ayurvedic_response_html
+over synthetic corpora and inputs of increasing size.
+
+Both write JSON with --json so runs can be diffed for regressions:
+
+    python benchmarks/app_load.py load --concurrency 1,8,32 --requests 400 --json load.json
+    python benchmarks/app_load.py load --mix list=70,chat=30 --llm-latency-ms 800
+    python benchmarks/app_load.py micro --sizes 3,100,1000,10000 --json micro.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+import timeit
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+QUESTIONS = [
+    "How can I balance Vata dosha during winter?",
+    "What foods calm excess Pitta?",
+    "Is Abhyanga safe every day?",
+    "How should I prepare for Virechana?",
+    "Which herbs help Kapha congestion?",
+    "What is a good daily routine for digestion?",
+]
+THERAPIES = ["Abhyanga", "Shirodhara", "Virechana", "Basti", "Nasya", "Udvartana"]
+DEFAULT_MIX = "list=50,create=15,reschedule=20,chat=15"
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)]
+
+
+def latency_summary(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "max_ms": round(values[-1], 3) if values else 0.0,
+    }
+
+
+def memory_mb() -> Dict[str, float]:
+    """Current and peak resident set size of this process"""
+    memory = {}
+    try:
+        with open("/proc/self/statm") as f:
+            memory["rss_mb"] = round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        memory["peak_rss_mb"] = round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+    except ImportError:
+        pass
+    return memory
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ("list", "create", "reschedule", "chat"):
+            raise SystemExit(f"Unknown operation '{name}' in --mix")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+def environment() -> Dict[str, str]:
+    return {"python": platform.python_version(), "platform": platform.platform(), "created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+# --- Load test ---
+def new_session(number: int, patient_id: str, rng: random.Random) -> Dict:
+    # Every session gets its own practitioner and room, so creates and reschedules never conflict
+    return {
+        "therapy": rng.choice(THERAPIES), "date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "time": f"{rng.randint(8, 17)}:00", "duration": "60 min", "practitioner": f"Dr. Bench {number}",
+        "location": f"Room {number}", "status": "confirmed", "sessionId": f"B{number}", "patientId": patient_id,
+    }
+
+
+class LoadContext:
+    def __init__(self, client, patients: List[str], session_ids: List[str], seed: int):
+        self.client = client
+        self.patients = patients
+        self.session_ids = session_ids
+        self.rng = random.Random(seed)
+        self.numbers = itertools.count(len(session_ids))
+
+    async def list(self):
+        return await self.client.get(f"/sessions/{self.rng.choice(self.patients)}", params={"limit": 50})
+
+    async def create(self):
+        response = await self.client.post("/sessions/", json=new_session(next(self.numbers), self.rng.choice(self.patients), self.rng))
+        if response.status_code == 201:
+            self.session_ids.append(response.json()["id"])
+        return response
+
+    async def reschedule(self):
+        update = {"date": f"2026-{self.rng.randint(1, 12):02d}-{self.rng.randint(1, 28):02d}", "time": f"{self.rng.randint(8, 17)}:30"}
+        return await self.client.put(f"/sessions/{self.rng.choice(self.session_ids)}", json=update)
+
+    async def chat(self):
+        return await self.client.post("/chatbot/chat", json={"message": self.rng.choice(QUESTIONS), "conversation_history": []})
+
+
+async def run_level(context: LoadContext, mix: Dict[str, int], concurrency: int, total: int) -> Dict:
+    names = list(mix)
+    plan = iter(context.rng.choices(names, weights=[mix[name] for name in names], k=total))
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[str, Counter] = defaultdict(Counter)
+
+    async def worker():
+        for name in plan:
+            start = time.perf_counter()
+            try:
+                status = (await getattr(context, name)()).status_code
+            except Exception as e:
+                status = type(e).__name__
+            latencies[name].append((time.perf_counter() - start) * 1000)
+            statuses[name][str(status)] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    everything = [value for values in latencies.values() for value in values]
+    errors = sum(n for counts in statuses.values() for status, n in counts.items() if not status.startswith("2"))
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1),
+        "errors": errors,
+        "latency": latency_summary(everything),
+        "operations": {name: {**latency_summary(latencies[name]), "statuses": dict(statuses[name])} for name in names},
+        "memory": memory_mb(),
+    }
+
+
+def run_load(args) -> Dict:
+    from benchmarks import fake_firestore
+    from benchmarks.stub_llm import StubLLMServer
+
+    llm = StubLLMServer(latency_ms=args.llm_latency_ms, token_ms=args.llm_token_ms).start()
+    # llm_client and response_cache read these at import, so they are set before main is imported
+    os.environ.update({
+        "STORAGE_BACKEND": "firestore",
+        "MISTRAL_API_KEY": "benchmark",
+        "MISTRAL_BASE_URL": llm.base_url,
+        "LLM_MAX_INFLIGHT": str(args.llm_max_inflight),
+        "CHATBOT_CACHE_BACKEND": "memory" if args.chat_cache else "none",
+    })
+    db = fake_firestore.install()
+
+    import httpx
+    import main
+    from models import SessionCreate
+    from repositories import get_session_repository
+    from scheduling import get_schedule_index
+
+    rng = random.Random(args.seed)
+    repo = get_session_repository()
+    patients = [f"bench-patient-{i}" for i in range(args.patients)]
+    session_ids = [
+        repo.create(SessionCreate(**new_session(n, patients[n % len(patients)], rng)).dict())
+        for n in range(args.patients * args.sessions_per_patient)
+    ]
+    get_schedule_index() # warm, like a server that has already served a write
+    db.latency = args.firestore_latency_ms / 1000
+    mix = parse_mix(args.mix)
+    results = {
+        "benchmark": "app_load",
+        "environment": environment(),
+        "config": {
+            "mix": mix, "requests_per_level": args.requests, "patients": args.patients,
+            "sessions_per_patient": args.sessions_per_patient, "firestore_latency_ms": args.firestore_latency_ms,
+            "llm_latency_ms": args.llm_latency_ms, "llm_max_inflight": args.llm_max_inflight, "chat_cache": args.chat_cache,
+        },
+        "memory_before": memory_mb(),
+        "levels": [],
+    }
+
+    async def drive():
+        async with main.app.router.lifespan_context(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+                context = LoadContext(client, patients, session_ids, args.seed)
+                for concurrency in args.concurrency:
+                    results["levels"].append(await run_level(context, mix, concurrency, args.requests))
+
+    try:
+        asyncio.run(drive())
+    finally:
+        llm.stop()
+    return results
+
+
+def print_load(results: Dict):
+    for level in results["levels"]:
+        print(f"concurrency {level['concurrency']:>4}: {level['throughput_rps']:>8.1f} req/s  "
+              f"p50 {level['latency']['p50_ms']:>8.2f} ms  p95 {level['latency']['p95_ms']:>8.2f} ms  "
+              f"p99 {level['latency']['p99_ms']:>8.2f} ms  errors {level['errors']}  rss {level['memory'].get('rss_mb', '?')} MB")
+        for name, row in level["operations"].items():
+            print(f"    {name:<11} n={row['count']:<5} p50 {row['p50_ms']:>8.2f}  p95 {row['p95_ms']:>8.2f}  p99 {row['p99_ms']:>8.2f}  {row['statuses']}")
+
+
+# --- Microbenchmarks ---
+def time_per_call(fn: Callable[[], object], repeat: int = 5) -> Dict[str, float]:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    runs = sorted(run / number * 1e6 for run in timer.repeat(repeat=repeat, number=number))
+    return {"best_us": round(runs[0], 3), "median_us": round(runs[len(runs) // 2], 3), "calls_per_run": number}
+
+
+def synthetic_corpus(size: int, base: List[Dict], rng: random.Random) -> List[Dict]:
+    """The real entries plus generated ones: ~80 words with a Zipf-like vocabulary"""
+    real_words = sorted({word for entry in base for word in entry["content"].split()})
+    vocabulary = real_words + [f"term{i}" for i in range(max(size * 5, 500))]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    rng.shuffle(vocabulary)
+    corpus = list(base[:size])
+    for i in range(len(corpus), size):
+        corpus.append({
+            "id": f"synthetic-{i}",
+            "content": " ".join(rng.choices(vocabulary, weights=weights, k=80)),
+            "metadata": {"source": "Synthetic", "category": rng.choice(["Doshas", "Diet", "Therapies", "Herbs"])},
+        })
+    return corpus
+
+
+def run_micro(args) -> Dict:
+    from knowledge_base import KnowledgeBase
+    from retrieval import BM25Index
+    from routers import chatbot
+
+    rng = random.Random(args.seed)
+    results = {"benchmark": "chatbot_micro", "environment": environment(), "find_relevant_knowledge": [], "preprocess_text": [], "format_ayurvedic_response_html": []}
+
+    base = list(chatbot.AYURVEDIC_KNOWLEDGE)
+    original = chatbot.knowledge_base
+    try:
+        for size in args.sizes:
+            corpus = synthetic_corpus(size, base, rng)
+            build_started = time.perf_counter()
+            index = BM25Index(corpus, tokenizer=chatbot.preprocess_text)
+            build_ms = (time.perf_counter() - build_started) * 1000
+            chatbot.knowledge_base = KnowledgeBase(index)
+            queries = itertools.cycle(QUESTIONS)
+            results["find_relevant_knowledge"].append({
+                "corpus_size": size, "index_build_ms": round(build_ms, 3),
+                **time_per_call(lambda: chatbot.find_relevant_knowledge(next(queries))),
+            })
+    finally:
+        chatbot.knowledge_base = original
+
+    words = " ".join(entry["content"] for entry in base).split()
+    for length in (10, 100, 1000, 10000):
+        text = " ".join(itertools.islice(itertools.cycle(words), length))
+        results["preprocess_text"].append({"words": length, **time_per_call(lambda: chatbot.preprocess_text(text))})
+
+    for paragraphs, sources in ((3, 0), (3, 3), (30, 3), (30, 10)):
+        text = "\n".join(" ".join(rng.choices(words, k=60)) for _ in range(paragraphs))
+        srcs = (base * 4)[:sources]
+        results["format_ayurvedic_response_html"].append({
+            "paragraphs": paragraphs, "sources": sources,
+            **time_per_call(lambda: chatbot.format_ayurvedic_response_html(text, QUESTIONS[0], srcs)),
+        })
+    return results
+
+
+def print_micro(results: Dict):
+    for name in ("find_relevant_knowledge", "preprocess_text", "format_ayurvedic_response_html"):
+        print(name)
+        for row in results[name]:
+            params = ", ".join(f"{k}={v}" for k, v in row.items() if k not in ("best_us", "median_us", "calls_per_run"))
+            print(f"    {params:<40} best {row['best_us']:>10.2f} us  median {row['median_us']:>10.2f} us")
+
+
+def int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    load = commands.add_parser("load", help="drive the whole app with a request mix")
+    load.add_argument("--concurrency", type=int_list, default=[1, 8, 32], help="comma-separated concurrency levels")
+    load.add_argument("--requests", type=int, default=400, help="requests per concurrency level")
+    load.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights (default {DEFAULT_MIX})")
+    load.add_argument("--patients", type=int, default=20)
+    load.add_argument("--sessions-per-patient", type=int, default=25)
+    load.add_argument("--firestore-latency-ms", type=float, default=5.0, help="simulated latency per Firestore RPC")
+    load.add_argument("--llm-latency-ms", type=float, default=400.0, help="stub LLM delay per completion")
+    load.add_argument("--llm-token-ms", type=float, default=0.0, help="stub LLM delay per generated token")
+    load.add_argument("--llm-max-inflight", type=int, default=16, help="LLM_MAX_INFLIGHT for the app")
+    load.add_argument("--chat-cache", action="store_true", help="keep the chatbot response cache on")
+
+    micro = commands.add_parser("micro", help="time the chatbot's retrieval and formatting helpers")
+    micro.add_argument("--sizes", type=int_list, default=[3, 100, 1000, 10000], help="comma-separated corpus sizes")
+
+    for command in (load, micro):
+        command.add_argument("--seed", type=int, default=1)
+        command.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    if args.command == "load":
+        results = run_load(args)
+        print_load(results)
+    else:
+        results = run_micro(args)
+        print_micro(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
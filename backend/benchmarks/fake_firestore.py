@@ -0,0 +1,327 @@
+"""
+In-process stand-in for the Firestore client, for benchmarks only
+Implements the subset of google-cloud-firestore the routers use, counts every
+round trip and can add a fixed per-RPC latency to mimic a real network hop.
+install() registers it as the `firebase_config` module before the routers import it.
+"""
+import enum
+import sys
+import threading
+import time
+import types
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from google.api_core.exceptions import FailedPrecondition, NotFound
+from google.cloud.firestore import Increment
+
+_OPERATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+}
+
+
+def _apply(target: Dict[str, Any], data: Dict[str, Any], merge: bool) -> Dict[str, Any]:
+    """Write `data` into `target`, resolving Increment transforms; merge=True merges nested maps"""
+    for field, value in data.items():
+        if isinstance(value, Increment):
+            target[field] = (target.get(field) or 0) + value.value
+        elif isinstance(value, dict) and (merge or any(isinstance(v, Increment) for v in value.values())):
+            existing = target.get(field)
+            target[field] = _apply(dict(existing) if merge and isinstance(existing, dict) else {}, value, merge)
+        else:
+            target[field] = value
+    return target
+
+
+class ChangeType(enum.Enum):
+    ADDED = 1
+    REMOVED = 2
+    MODIFIED = 3
+
+
+class FakeDocumentChange:
+    def __init__(self, change_type: ChangeType, document: "FakeDocumentSnapshot"):
+        self.type = change_type
+        self.document = document
+
+
+class FakeWatch:
+    def __init__(self, collection: "FakeCollection", callback: Callable):
+        self._collection = collection
+        self.callback = callback
+
+    def unsubscribe(self):
+        with self._collection._client._lock:
+            if self in self._collection._watches:
+                self._collection._watches.remove(self)
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference: "FakeDocumentReference", data: Optional[Dict[str, Any]], update_time: Optional[int] = None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self.update_time = update_time
+        self._data = data
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return dict(self._data) if self._data is not None else None
+
+    def get(self, field: str) -> Any:
+        return (self._data or {}).get(field)
+
+
+class FakeWriteResult:
+    def __init__(self, update_time: Optional[int]):
+        self.update_time = update_time
+
+
+class FakeDocumentReference:
+    def __init__(self, collection: "FakeCollection", doc_id: str):
+        self._collection = collection
+        self.id = doc_id
+
+    @property
+    def _store(self):
+        return self._collection._docs
+
+    def _snapshot(self) -> FakeDocumentSnapshot:
+        data = self._store.get(self.id)
+        return FakeDocumentSnapshot(self, dict(data) if data is not None else None, self._collection._times.get(self.id))
+
+    def get(self) -> FakeDocumentSnapshot:
+        self._collection._client._rpc()
+        with self._collection._client._lock:
+            return self._snapshot()
+
+    def set(self, data: Dict[str, Any], merge: bool = False) -> FakeWriteResult:
+        self._collection._client._rpc()
+        return self._set(data, merge)
+
+    def update(self, data: Dict[str, Any], option: Optional[Dict[str, Any]] = None) -> FakeWriteResult:
+        self._collection._client._rpc()
+        return self._update(data, option)
+
+    def delete(self, option: Optional[Dict[str, Any]] = None) -> FakeWriteResult:
+        self._collection._client._rpc()
+        return self._delete(option)
+
+    # Unbatched mutations, shared with FakeWriteBatch
+    def _check(self, option):
+        """Write preconditions: exists=True and last_update_time=<snapshot.update_time>"""
+        if not option:
+            return
+        if option.get("exists") and self.id not in self._store:
+            raise NotFound(f"No document to update: {self._collection.id}/{self.id}")
+        if "last_update_time" in option and self._collection._times.get(self.id) != option["last_update_time"]:
+            raise FailedPrecondition(f"Document changed since it was read: {self._collection.id}/{self.id}")
+
+    def _touch(self) -> FakeWriteResult:
+        update_time = self._collection._times[self.id] = self._collection._client._tick()
+        return FakeWriteResult(update_time)
+
+    def _set(self, data, merge=False):
+        with self._collection._client._lock:
+            existed = self.id in self._store
+            base = _apply(dict(self._store.get(self.id) or {}) if merge else {}, data, merge)
+            self._store[self.id] = base
+            result = self._touch()
+            self._collection._notify(ChangeType.MODIFIED if existed else ChangeType.ADDED, self, base)
+            return result
+
+    def _update(self, data, option=None):
+        with self._collection._client._lock:
+            self._check(option)
+            if self.id not in self._store:
+                raise NotFound(f"No document to update: {self._collection.id}/{self.id}")
+            _apply(self._store[self.id], data, merge=False)
+            result = self._touch()
+            self._collection._notify(ChangeType.MODIFIED, self, self._store[self.id])
+            return result
+
+    def _delete(self, option=None):
+        with self._collection._client._lock:
+            self._check(option)
+            data = self._store.pop(self.id, None)
+            self._collection._times.pop(self.id, None)
+            if data is not None:
+                self._collection._notify(ChangeType.REMOVED, self, data)
+            return FakeWriteResult(self._collection._client._clock)
+
+
+class FakeQuery:
+    def __init__(self, collection: "FakeCollection", filters=None, orders=None, limit=None, fields=None, cursor=None):
+        self._collection = collection
+        self._filters = filters or []
+        self._orders = orders or []
+        self._limit = limit
+        self._fields = fields
+        self._cursor = cursor
+
+    def _copy(self, **changes) -> "FakeQuery":
+        state = dict(filters=self._filters, orders=self._orders, limit=self._limit, fields=self._fields, cursor=self._cursor)
+        state.update(changes)
+        return FakeQuery(self._collection, **state)
+
+    def where(self, field: str, op: str, value: Any) -> "FakeQuery":
+        return self._copy(filters=self._filters + [(field, _OPERATORS[op], value)])
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "FakeQuery":
+        return self._copy(orders=self._orders + [(field, direction == "DESCENDING")])
+
+    def limit(self, count: int) -> "FakeQuery":
+        return self._copy(limit=count)
+
+    def select(self, fields: List[str]) -> "FakeQuery":
+        return self._copy(fields=list(fields))
+
+    def start_after(self, snapshot: FakeDocumentSnapshot) -> "FakeQuery":
+        return self._copy(cursor=snapshot)
+
+    def _sort_key(self, doc_id: str, data: Dict[str, Any]):
+        return [data.get(field) or "" for field, _ in self._orders] + [doc_id]
+
+    def stream(self):
+        self._collection._client._rpc()
+        with self._collection._client._lock:
+            rows = [(doc_id, dict(data)) for doc_id, data in self._collection._docs.items()
+                    if all(op(data.get(field), value) for field, op, value in self._filters)]
+            times = dict(self._collection._times)
+        # Firestore orders by document ID after the explicit orderings
+        for position in range(len(self._orders), -1, -1):
+            if position == len(self._orders):
+                rows.sort(key=lambda row: row[0])
+            else:
+                field, descending = self._orders[position]
+                rows.sort(key=lambda row: row[1].get(field) or "", reverse=descending)
+        if self._cursor is not None:
+            cursor_key = self._sort_key(self._cursor.id, self._cursor.to_dict() or {})
+            rows = [row for row in rows if self._sort_key(*row) > cursor_key]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        for doc_id, data in rows:
+            if self._fields is not None:
+                data = {field: data[field] for field in self._fields if field in data}
+            yield FakeDocumentSnapshot(FakeDocumentReference(self._collection, doc_id), data, times.get(doc_id))
+
+    def get(self) -> List[FakeDocumentSnapshot]:
+        return list(self.stream())
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, client: "FakeFirestore", name: str):
+        super().__init__(self)
+        self._client = client
+        self.id = name
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._times: Dict[str, int] = {} # document ID -> update_time
+        self._watches: List[FakeWatch] = []
+
+    def document(self, doc_id: Optional[str] = None) -> FakeDocumentReference:
+        return FakeDocumentReference(self, doc_id or uuid.uuid4().hex[:20])
+
+    def add(self, data: Dict[str, Any]):
+        doc_ref = self.document()
+        doc_ref.set(data)
+        return time.time(), doc_ref
+
+    def on_snapshot(self, callback: Callable) -> FakeWatch:
+        """Like Firestore: an initial snapshot of every document as ADDED, then one per write"""
+        with self._client._lock:
+            watch = FakeWatch(self, callback)
+            self._watches.append(watch)
+            snapshots = [FakeDocumentSnapshot(self.document(doc_id), dict(data), self._times.get(doc_id))
+                         for doc_id, data in self._docs.items()]
+        callback(snapshots, [FakeDocumentChange(ChangeType.ADDED, snapshot) for snapshot in snapshots], time.time())
+        return watch
+
+    def _notify(self, change_type: ChangeType, doc_ref: FakeDocumentReference, data: Dict[str, Any]):
+        # Delivered synchronously; the real client calls back from its own thread
+        change = FakeDocumentChange(change_type, FakeDocumentSnapshot(doc_ref, dict(data), self._times.get(doc_ref.id)))
+        for watch in list(self._watches):
+            watch.callback([], [change], time.time())
+
+
+class FakeWriteBatch:
+    def __init__(self, client: "FakeFirestore"):
+        self._client = client
+        self._writes = []
+
+    def set(self, doc_ref, data, merge=False):
+        self._writes.append(lambda: doc_ref._set(data, merge))
+
+    def update(self, doc_ref, data, option=None):
+        self._writes.append(lambda: doc_ref._update(data, option))
+
+    def delete(self, doc_ref, option=None):
+        self._writes.append(lambda: doc_ref._delete(option))
+
+    def commit(self):
+        self._client._rpc()
+        with self._client._lock:
+            # All or nothing, like a real WriteBatch
+            saved = {name: ({doc_id: dict(data) for doc_id, data in col._docs.items()}, dict(col._times))
+                     for name, col in self._client._collections.items()}
+            try:
+                return [write() for write in self._writes]
+            except Exception:
+                for name, col in self._client._collections.items():
+                    col._docs, col._times = saved.get(name, ({}, {}))
+                raise
+
+
+class FakeFirestore:
+    """The top-level client: collections, batches and a round-trip counter."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self.round_trips = 0
+        self._clock = 0 # update_time source, strictly increasing
+        self._collections: Dict[str, FakeCollection] = {}
+        self._lock = threading.RLock()
+
+    def _rpc(self):
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def collection(self, name: str) -> FakeCollection:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = FakeCollection(self, name)
+            return self._collections[name]
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def get_all(self, references: List[FakeDocumentReference]):
+        self._rpc()
+        with self._lock:
+            snapshots = [doc_ref._snapshot() for doc_ref in references]
+        yield from snapshots
+
+    @staticmethod
+    def write_option(**kwargs) -> Dict[str, Any]:
+        return kwargs
+
+
+def install(latency_ms: float = 0.0) -> FakeFirestore:
+    """Register a fake `firebase_config` module; call before importing any router."""
+    db = FakeFirestore(latency_ms)
+    module = types.ModuleType("firebase_config")
+    module.FirebaseUnavailableError = type("FirebaseUnavailableError", (Exception,), {})
+    module.get_db = lambda: db
+    module.close = lambda: None
+    sys.modules["firebase_config"] = module
+    return db
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Firestore round trips and latency for rescheduling and cancelling sessions
+
+Runs the sessions router's update/delete handlers against the in-process Firestore
+fake with a fixed per-RPC latency and compares them with the previous
+read-before-write flows. Reschedules read the session once so the analytics rollups
+can be adjusted in the same batch as the write; the batch is conditioned on that
+read's update_time and replanned if the session changed. A delete takes the rollup
+fields and update_time from the repository's projection (fed here by the schedule
+index's watch) and commits once; `delete_unprojected` is the fallback for a session
+the process has not seen, which reads it first like the legacy delete.
+
+    python benchmarks/session_round_trips.py --latency-ms 20 --iterations 50
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fake_firestore  # noqa: E402
+
+
+def legacy_update(collection, session_id, update_data):
+    """get() for existence, update(), then get() again for the response"""
+    doc_ref = collection.document(session_id)
+    if not doc_ref.get().exists:
+        raise LookupError(session_id)
+    doc_ref.update(update_data)
+    return doc_ref.get().to_dict()
+
+
+def legacy_delete(collection, session_id):
+    """get() for existence, then delete()"""
+    doc_ref = collection.document(session_id)
+    if not doc_ref.get().exists:
+        raise LookupError(session_id)
+    doc_ref.delete()
+
+
+def run_case(db, fn, session_ids):
+    latencies = []
+    start_trips = db.round_trips
+    for session_id in session_ids:
+        start = time.perf_counter()
+        fn(session_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        "round_trips_per_call": (db.round_trips - start_trips) / len(session_ids),
+        "mean_ms": round(statistics.mean(latencies), 3),
+        "p95_ms": round(sorted(latencies)[int(len(latencies) * 0.95) - 1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="simulated latency per Firestore RPC")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    db = fake_firestore.install(latency_ms=args.latency_ms)
+    from models import SessionUpdate
+    from repositories import get_session_repository
+    from routers import sessions
+    from scheduling import get_schedule_index
+
+    repo = get_session_repository()
+    schedule = get_schedule_index() # warm before timing, like a running server
+
+    collection = db.collection("sessions")
+
+    # Every seeded session gets its own practitioner and room so reschedules never conflict
+    numbers = itertools.count()
+
+    def seed():
+        ids = []
+        for _ in range(args.iterations):
+            i = next(numbers)
+            _, doc_ref = collection.add({
+                "therapy": "Abhyanga", "date": "2025-01-01", "time": "10:00", "duration": "60 min",
+                "practitioner": f"Dr. {i}", "location": f"Room {i}", "status": "pending",
+                "sessionId": f"S{i}", "patientId": "patient-1",
+            })
+            ids.append(doc_ref.id)
+        return ids
+
+    update = {"date": "2025-01-02", "time": "11:00"}
+    results = {"latency_ms_per_rpc": args.latency_ms, "iterations": args.iterations}
+    results["update_legacy"] = run_case(db, lambda sid: legacy_update(collection, sid, update), seed())
+    results["update"] = run_case(db, lambda sid: sessions.update_session(sid, SessionUpdate(**update), return_mode="representation", repo=repo, schedule=schedule), seed())
+    results["update_minimal"] = run_case(db, lambda sid: sessions.update_session(sid, SessionUpdate(**update), return_mode="minimal", repo=repo, schedule=schedule), seed())
+    # Changes that cannot move a session between analytics buckets skip the read entirely
+    notes = {"notes": "Bring a towel"}
+    results["notes_minimal"] = run_case(db, lambda sid: sessions.update_session(sid, SessionUpdate(**notes), return_mode="minimal", repo=repo, schedule=schedule), seed())
+    results["delete_legacy"] = run_case(db, lambda sid: legacy_delete(collection, sid), seed())
+    results["delete"] = run_case(db, lambda sid: sessions.delete_session(sid, repo=repo, schedule=schedule), seed())
+
+    def delete_unprojected(sid):
+        repo._forget(sid)
+        sessions.delete_session(sid, repo=repo, schedule=schedule)
+    results["delete_unprojected"] = run_case(db, delete_unprojected, seed())
+
+    for name, row in results.items():
+        if isinstance(row, dict):
+            print(f"{name:<18} {row['round_trips_per_call']:>4.1f} round trips  mean {row['mean_ms']:>8.2f} ms  p95 {row['p95_ms']:>8.2f} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Stub OpenAI-compatible chat completions server, for benchmarks only
+Answers POST /v1/chat/completions (plain and stream=true) after a configurable delay, with
+a canned answer and a `usage` block, so the chatbot can be load tested without an API key
+or network. Runs uvicorn in a background thread of the benchmark process:
+
+    server = StubLLMServer(latency_ms=400, token_ms=15).start()
+    os.environ["MISTRAL_BASE_URL"] = server.base_url
+"""
+import asyncio
+import json
+import socket
+import threading
+import time
+import uuid
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+ANSWER = (
+    "Balance Vata with warmth, routine and grounding foods such as cooked grains, warm milk and ghee. "
+    "A daily self-massage with warm sesame oil (Abhyanga) calms the nervous system. "
+    "Please consult a qualified practitioner before starting any herbs."
+)
+
+
+def build_app(latency_ms: float, token_ms: float) -> Starlette:
+    tokens = ANSWER.split(" ")
+
+    async def completions(request: Request):
+        body = await request.json()
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = body.get("model", "stub")
+        await asyncio.sleep(latency_ms / 1000)
+
+        if not body.get("stream"):
+            await asyncio.sleep(token_ms * len(tokens) / 1000)
+            return JSONResponse({
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": ANSWER}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        async def chunks():
+            def chunk(delta, finish_reason=None, **extra):
+                payload = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}], **extra,
+                }
+                return f"data: {json.dumps(payload)}\n\n"
+
+            yield chunk({"role": "assistant", "content": ""})
+            for i, token in enumerate(tokens):
+                await asyncio.sleep(token_ms / 1000)
+                yield chunk({"content": token if i == 0 else " " + token})
+            yield chunk({}, "stop", usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    return Starlette(routes=[Route("/v1/chat/completions", completions, methods=["POST"])])
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class StubLLMServer:
+    def __init__(self, latency_ms: float = 400.0, token_ms: float = 0.0, port: int = 0):
+        self.port = port or free_port()
+        config = uvicorn.Config(build_app(latency_ms, token_ms), host="127.0.0.1", port=self.port, log_level="warning", backlog=4096)
+        self.server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self.server.run, name="stub-llm", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def start(self) -> "StubLLMServer":
+        self._thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self._thread.join(timeout=5)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Stub OpenAI-compatible LLM server")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=400.0, help="delay before the first token")
+    parser.add_argument("--token-ms", type=float, default=0.0, help="delay per streamed token")
+    args = parser.parse_args()
+    uvicorn.run(build_app(args.latency_ms, args.token_ms), host="127.0.0.1", port=args.port)
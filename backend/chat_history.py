@@ -0,0 +1,209 @@
+"""
+Chat history compaction - keeps the conversation part of every chatbot prompt within a token budget
+The most recent turns are sent as they are, up to CHAT_HISTORY_TOKEN_BUDGET minus room for a
+summary. Turns that no longer fit are folded into a rolling summary of the conversation, which
+is cached per conversation: each new turn only folds the turns that just fell out of the
+window into the previous summary instead of summarizing the whole chat again. Cached
+positions count from the start of the conversation, so they stay valid after a stored
+conversation drops its oldest turns.
+
+Folding leaves the window half full, so the summary is only extended every few turns. The
+summary is written by the LLM; when no slot is free or the call fails, an extractive summary
+(the opening of each folded turn) is used instead.
+
+Token counts are estimates (word pieces of up to 4 characters, plus a few tokens per message);
+they err on the high side for English, which keeps the budget safe without a tokenizer.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+import llm_client
+from llm_client import LLMSaturatedError
+from metrics import PROMPT_TOKENS, stage_timer
+from response_cache import CHATBOT_CACHE_BACKEND, CHATBOT_CACHE_REDIS_URL, InMemoryCache, RedisCache
+
+logger = logging.getLogger(__name__)
+
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", 1500))  # summary + recent turns per prompt
+CHAT_HISTORY_SUMMARY_TOKENS = int(os.getenv("CHAT_HISTORY_SUMMARY_TOKENS", 300))  # room kept for the summary
+CHAT_HISTORY_SUMMARIZER = os.getenv("CHAT_HISTORY_SUMMARIZER", "llm")  # llm | extractive
+CHAT_SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_SUMMARY_CACHE_MAX_ENTRIES", 5000))
+CHAT_SUMMARY_CACHE_TTL_SECONDS = float(os.getenv("CHAT_SUMMARY_CACHE_TTL_SECONDS", 24 * 3600))
+
+if CHAT_HISTORY_SUMMARIZER not in ("llm", "extractive"):
+    raise ValueError(f"Unknown CHAT_HISTORY_SUMMARIZER '{CHAT_HISTORY_SUMMARIZER}'; expected 'llm' or 'extractive'")
+if CHAT_HISTORY_SUMMARY_TOKENS >= CHAT_HISTORY_TOKEN_BUDGET:
+    raise ValueError("CHAT_HISTORY_SUMMARY_TOKENS must be smaller than CHAT_HISTORY_TOKEN_BUDGET")
+
+MESSAGE_OVERHEAD_TOKENS = 4  # role and separators
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+SUMMARY_PROMPT = (
+    "You summarize a conversation between a patient and an Ayurvedic assistant for the assistant's "
+    "memory. Keep the patient's dosha, symptoms, conditions, preferences and any advice already given. "
+    "Write plain sentences, no more than {words} words."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return sum(math.ceil(len(piece) / 4) for piece in _PIECES.findall(text))
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut `text` after the last whole piece that fits in max_tokens, the trailing ellipsis included"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    used = 0
+    for match in _PIECES.finditer(text):
+        used += math.ceil(len(match.group()) / 4)
+        if used > max_tokens - 1:
+            return text[:match.start()].rstrip() + " …"
+    return text
+
+
+def normalize_history(conversation_history: Optional[List[Dict[str, str]]]) -> List[Dict[str, str]]:
+    """Client history as OpenAI-style messages (the frontend sends role "model" for the bot)"""
+    return [
+        {"role": "assistant" if msg.get("role") in ("model", "assistant") else "user", "content": msg.get("content", "")}
+        for msg in conversation_history or []
+    ]
+
+
+def _digest(messages: List[Dict[str, str]]) -> str:
+    return hashlib.sha256(json.dumps(messages, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def conversation_key(history: List[Dict[str, str]]) -> str:
+    """
+    Requests carry no conversation ID, so a conversation is known by its first message.
+    Two chats that open the same way share a cache slot; the cached summary also records a
+    digest of the last turn it covers, so a mismatch only costs a fresh summary, never a wrong one.
+    """
+    return _digest(history[:1])
+
+
+def window_start(history: List[Dict[str, str]], start: int, max_tokens: int) -> int:
+    """Earliest index from which history[i:] fits in max_tokens, searching no earlier than `start`"""
+    used = 0
+    for i in range(len(history) - 1, start - 1, -1):
+        used += message_tokens(history[i])
+        if used > max_tokens:
+            return i + 1
+    return start
+
+
+# --- Summaries ---
+def extractive_summary(previous: str, folded: List[Dict[str, str]], max_tokens: int) -> str:
+    """Previous summary plus the first sentence of each folded turn, oldest dropped first"""
+    lines = [previous] if previous else []
+    for msg in folded:
+        first = re.split(r"(?<=[.!?])\s", msg["content"].strip(), maxsplit=1)[0]
+        lines.append(f"{'Patient' if msg['role'] == 'user' else 'Assistant'}: {truncate_to_tokens(first, 60)}")
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return truncate_to_tokens("\n".join(lines), max_tokens)
+
+
+async def llm_summary(previous: str, folded: List[Dict[str, str]], max_tokens: int) -> str:
+    transcript = "\n".join(f"{'Patient' if m['role'] == 'user' else 'Assistant'}: {m['content']}" for m in folded)
+    if previous:
+        transcript = f"Summary so far:\n{previous}\n\nLater turns:\n{transcript}"
+    messages = [
+        {"role": "system", "content": SUMMARY_PROMPT.format(words=int(max_tokens * 0.6))},
+        {"role": "user", "content": transcript},
+    ]
+    text = await llm_client.complete_chat(messages, temperature=0.2, max_tokens=max_tokens)
+    return truncate_to_tokens(text, max_tokens)
+
+
+async def summarize(previous: str, folded: List[Dict[str, str]]) -> str:
+    """Fold `folded` into `previous`; the summarizer only ever sees one budget's worth of turns"""
+    start = window_start(folded, 0, CHAT_HISTORY_TOKEN_BUDGET)
+    if start:
+        # Only on a cold start with a long history; the oldest turns get the extractive treatment
+        previous = extractive_summary(previous, folded[:start], CHAT_HISTORY_SUMMARY_TOKENS)
+        folded = folded[start:]
+    if CHAT_HISTORY_SUMMARIZER == "llm" and llm_client.client:
+        try:
+            with stage_timer("history_summary"):
+                return await llm_summary(previous, folded, CHAT_HISTORY_SUMMARY_TOKENS)
+        except LLMSaturatedError:
+            pass
+        except Exception as e:
+            logger.debug("History summary failed, using the extractive summary: %s", e)
+    return extractive_summary(previous, folded, CHAT_HISTORY_SUMMARY_TOKENS)
+
+
+def create_summary_cache():
+    # Summaries follow the response cache backend, so workers share them under Redis
+    if CHATBOT_CACHE_BACKEND == "redis":
+        return RedisCache(CHATBOT_CACHE_REDIS_URL, CHAT_SUMMARY_CACHE_TTL_SECONDS, prefix="ayursutra:summary:")
+    return InMemoryCache(CHAT_SUMMARY_CACHE_MAX_ENTRIES, CHAT_SUMMARY_CACHE_MAX_ENTRIES * 4096, CHAT_SUMMARY_CACHE_TTL_SECONDS)
+
+
+summary_cache = create_summary_cache()
+
+
+# --- Compaction ---
+class CompactHistory(NamedTuple):
+    summary: str                    # "" while the whole conversation still fits
+    recent: List[Dict[str, str]]    # the newest turns, sent verbatim
+    total_messages: int
+
+    def tokens(self) -> int:
+        return sum(message_tokens(m) for m in self.recent) + (estimate_tokens(self.summary) + MESSAGE_OVERHEAD_TOKENS if self.summary else 0)
+
+
+async def compact_history(conversation_history: Optional[List[Dict[str, str]]], key: Optional[str] = None, offset: int = 0) -> CompactHistory:
+    """
+    Split a conversation into a cached rolling summary and the recent turns that fit the budget.
+    `offset` is the number of turns already dropped from the front of conversation_history.
+    """
+    history = normalize_history(conversation_history)
+    if not history:
+        return CompactHistory("", [], 0)
+    if sum(message_tokens(m) for m in history) <= CHAT_HISTORY_TOKEN_BUDGET:
+        return CompactHistory("", history, len(history))
+
+    recent_budget = CHAT_HISTORY_TOKEN_BUDGET - CHAT_HISTORY_SUMMARY_TOKENS
+    key = key or conversation_key(history)
+    cached = await summary_cache.get(key)
+    folded, summary = 0, ""
+    if cached:
+        # Turns folded before the oldest one still here are covered by the summary already
+        end = cached["folded"] - offset
+        if 0 < end <= len(history) and cached["digest"] == _digest(history[end - 1:end]):
+            folded, summary = end, cached["summary"]
+
+    # The newest message is never folded; if it alone overflows the window it is cut down below
+    if window_start(history, folded, recent_budget) > folded and folded < len(history) - 1:
+        # The window overflowed: fold until it is half full, so the next few turns fit as they are
+        target = min(window_start(history, folded, recent_budget // 2), len(history) - 1)
+        summary = await summarize(summary, history[folded:target])
+        folded = target
+        await summary_cache.set(key, {"folded": offset + folded, "digest": _digest(history[folded - 1:folded]), "summary": summary})
+
+    recent = history[folded:]
+    if recent and message_tokens(recent[-1]) > recent_budget:
+        last = recent[-1]
+        recent = [{"role": last["role"], "content": truncate_to_tokens(last["content"], recent_budget - MESSAGE_OVERHEAD_TOKENS)}]
+    return CompactHistory(summary, recent, len(history))
+
+
+def log_prompt_size(messages: List[Dict[str, str]], history: CompactHistory):
+    tokens = sum(message_tokens(m) for m in messages)
+    PROMPT_TOKENS.observe(tokens)
+    # Per request, so debug only; the histogram is what to watch in production
+    logger.debug(
+        "Chat prompt: ~%d tokens (history ~%d: %d/%d messages%s)",
+        tokens, history.tokens(), len(history.recent), history.total_messages, ", summarized" if history.summary else "",
+    )
@@ -0,0 +1,220 @@
+"""
+Chatbot conversation store - server-side chat transcripts, so clients only send the new message
+Conversations live in a per-process LRU bounded by count and by serialized size. A conversation
+that sits idle longer than CONVERSATION_TTL_SECONDS is evicted. With CONVERSATION_STORE=sqlite
+every change is also written to CONVERSATION_SQLITE_PATH. A conversation evicted from memory
+is then reloaded on its next message, and several workers can share one file. Without
+persistence an evicted conversation is gone (404) and the client starts a new one.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+CONVERSATION_STORE = os.getenv("CONVERSATION_STORE", "memory")  # memory | sqlite
+CONVERSATION_SQLITE_PATH = os.getenv("CONVERSATION_SQLITE_PATH", "conversations.db")
+CONVERSATION_TTL_SECONDS = float(os.getenv("CONVERSATION_TTL_SECONDS", 24 * 3600))  # idle time before eviction
+CONVERSATION_MAX_COUNT = int(os.getenv("CONVERSATION_MAX_COUNT", 10000))  # conversations held in memory
+CONVERSATION_MAX_BYTES = int(os.getenv("CONVERSATION_MAX_BYTES", 64 * 1024 * 1024))
+CONVERSATION_MAX_TURNS = int(os.getenv("CONVERSATION_MAX_TURNS", 200))  # oldest turns dropped past this
+
+if CONVERSATION_STORE not in ("memory", "sqlite"):
+    raise ValueError(f"Unknown CONVERSATION_STORE '{CONVERSATION_STORE}'; expected 'memory' or 'sqlite'")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    updatedAt REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_updated ON conversations (updatedAt);
+"""
+
+
+def _size(conversation: Dict) -> int:
+    return len(json.dumps(conversation))
+
+
+class ConversationStore:
+    """
+    Conversations are dicts: {"id", "createdAt", "updatedAt", "turns": [{"role", "content"}], "dropped"},
+    where "dropped" counts the oldest turns trimmed past max_turns. Least recently used first in
+    memory, which is also longest idle first, so expiry only ever looks at the head. In SQLite,
+    idle time counts from the last change. Methods are blocking (SQLite); async routes call
+    them via a thread.
+    """
+
+    def __init__(self, max_count: int, max_bytes: int, ttl_seconds: float, max_turns: int, sqlite_path: Optional[str] = None):
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.max_turns = max_turns
+        self.current_bytes = 0
+        self.evictions = 0
+        self.expired = 0
+        # id -> (size_in_bytes, last_used, conversation); least recently used first
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._last_sweep = 0.0
+        if sqlite_path:
+            # Autocommit: single statements commit on their own, read-modify-writes use _transaction()
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False, isolation_level=None)
+            self._db.executescript(SCHEMA)
+
+    # --- Memory LRU (call with the lock held) ---
+    def _drop(self, conversation_id: str) -> None:
+        size, _, _ = self._items.pop(conversation_id)
+        self.current_bytes -= size
+
+    def _put(self, conversation: Dict, now: float) -> None:
+        if conversation["id"] in self._items:
+            self._drop(conversation["id"])
+        size = _size(conversation)
+        self._items[conversation["id"]] = (size, now, conversation)
+        self.current_bytes += size
+        while len(self._items) > 1 and (len(self._items) > self.max_count or self.current_bytes > self.max_bytes):
+            self._drop(next(iter(self._items)))
+            self.evictions += 1
+
+    def _expire(self, now: float) -> None:
+        while self._items:
+            conversation_id, (_, last_used, _) = next(iter(self._items.items()))
+            if last_used > now - self.ttl_seconds:
+                break
+            self._drop(conversation_id)
+            self.expired += 1
+        if self._db is not None and now - self._last_sweep > min(self.ttl_seconds, 60):
+            self._last_sweep = now
+            self._db.execute("DELETE FROM conversations WHERE updatedAt <= ?", (now - self.ttl_seconds,))
+
+    # --- Persistence ---
+    @contextmanager
+    def _transaction(self):
+        """
+        BEGIN IMMEDIATE takes the file's write lock before the read, so another worker cannot
+        write the conversation between this read and the write based on it
+        """
+        if self._db is None:
+            yield
+            return
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.rollback()
+            raise
+        self._db.commit()
+
+    def _current(self, conversation_id: str, now: float) -> Optional[Dict]:
+        """Latest version, from memory when that is still current (another worker may have written it)"""
+        item = self._items.get(conversation_id)
+        if self._db is None:
+            return item[2] if item is not None else None
+        row = self._db.execute(
+            "SELECT updatedAt FROM conversations WHERE id = ? AND updatedAt > ?", (conversation_id, now - self.ttl_seconds)
+        ).fetchone()
+        if row is None:
+            if item is not None:
+                self._drop(conversation_id)
+            return None
+        if item is not None and item[2]["updatedAt"] == row[0]:
+            return item[2]
+        data = self._db.execute("SELECT data FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+        return json.loads(data[0]) if data else None
+
+    def _save(self, conversation: Dict) -> None:
+        if self._db is None:
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO conversations (id, updatedAt, data) VALUES (?, ?, ?)",
+            (conversation["id"], conversation["updatedAt"], json.dumps(conversation)),
+        )
+
+    # --- API ---
+    def create(self) -> Dict:
+        now = time.time()
+        conversation = {"id": uuid.uuid4().hex, "createdAt": now, "updatedAt": now, "turns": [], "dropped": 0}
+        with self._lock:
+            self._expire(now)
+            self._put(conversation, now)
+            self._save(conversation)
+        return conversation
+
+    def get(self, conversation_id: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            conversation = self._current(conversation_id, now)
+            if conversation is not None:
+                self._put(conversation, now)
+            return conversation
+
+    def append(self, conversation_id: str, turns: List[Dict[str, str]]) -> Optional[Dict]:
+        """Add turns to a conversation; None if it does not exist (or expired)"""
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            with self._transaction():
+                current = self._current(conversation_id, now)
+                if current is None:
+                    return None
+                # A new dict, so callers holding the previous version never see it change
+                turns = current["turns"] + turns
+                dropped = max(0, len(turns) - self.max_turns)
+                conversation = {
+                    **current,
+                    # Strictly increasing, so _current() can tell a stale memory copy by updatedAt
+                    "updatedAt": max(now, current["updatedAt"] + 1e-6),
+                    "turns": turns[dropped:],
+                    "dropped": current.get("dropped", 0) + dropped,
+                }
+                self._save(conversation)
+            self._put(conversation, now)
+            return conversation
+
+    def delete(self, conversation_id: str) -> bool:
+        with self._lock:
+            found = conversation_id in self._items
+            if found:
+                self._drop(conversation_id)
+            if self._db is not None:
+                found = self._db.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,)).rowcount > 0 or found
+            return found
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._expire(time.time())
+            stats = {
+                "backend": "sqlite" if self._db is not None else "memory",
+                "conversations": len(self._items),
+                "turns": sum(len(conversation["turns"]) for _, _, conversation in self._items.values()),
+                "bytes": self.current_bytes,
+                "max_conversations": self.max_count,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "ttl_seconds": self.ttl_seconds,
+            }
+            if self._db is not None:
+                stats["persisted"] = self._db.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+            return stats
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+conversation_store = ConversationStore(
+    CONVERSATION_MAX_COUNT,
+    CONVERSATION_MAX_BYTES,
+    CONVERSATION_TTL_SECONDS,
+    CONVERSATION_MAX_TURNS,
+    sqlite_path=CONVERSATION_SQLITE_PATH if CONVERSATION_STORE == "sqlite" else None,
+)
@@ -1,6 +1,13 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
+"""
+Firebase Admin setup - built on first use, not at import
+get_db() initializes the Admin app and the Firestore client once per process (per worker)
+and raises FirebaseUnavailableError when no credentials are configured, so the API can
+start and serve everything that does not need Firestore without them.
+"""
 import os
+import threading
+import time
+
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -15,12 +22,29 @@ firebase_client_id = os.getenv("FIREBASE_CLIENT_ID")
 # Get the path to the credentials file from the environment variable (fallback)
 cred_path = os.getenv("FIREBASE_CREDENTIALS_PATH")
 
-# Initialize Firebase
-try:
+_lock = threading.Lock()
+_db = None
+
+
+class FirebaseUnavailableError(Exception):
+    """Firebase credentials are missing or the Admin SDK could not be initialized."""
+
+
+def _initialize_app():
+    import firebase_admin
+    from firebase_admin import credentials
+
+    try:
+        # Already initialized, by an earlier call whose client creation failed or before a close()
+        firebase_admin.get_app()
+        return
+    except ValueError:
+        pass
+
     if firebase_project_id and firebase_private_key and firebase_client_email:
         # Use environment variables to create credentials
         print("🔧 Initializing Firebase with environment variables...")
-        
+
         # Create credentials dict from environment variables
         firebase_config = {
             "type": "service_account",
@@ -34,27 +58,47 @@ try:
             "auth_provider_x509_cert_url": os.getenv("FIREBASE_AUTH_PROVIDER_X509_CERT_URL", "https://www.googleapis.com/oauth2/v1/certs"),
             "client_x509_cert_url": os.getenv("FIREBASE_CLIENT_X509_CERT_URL", f"https://www.googleapis.com/robot/v1/metadata/x509/{firebase_client_email}")
         }
-        
+
         cred = credentials.Certificate(firebase_config)
         firebase_admin.initialize_app(cred, {
             'projectId': firebase_project_id
         })
         print("✅ Firebase initialized with environment credentials successfully.")
-        
+
     elif cred_path and os.path.exists(cred_path):
         # Use real Firebase credentials file if available
         cred = credentials.Certificate(cred_path)
         firebase_admin.initialize_app(cred)
         print("✅ Firebase initialized with credentials file successfully.")
     else:
-        raise Exception("Firebase credentials are required. Please provide either environment variables (FIREBASE_PROJECT_ID, FIREBASE_PRIVATE_KEY, FIREBASE_CLIENT_EMAIL) or set FIREBASE_CREDENTIALS_PATH to a valid credentials file.")
-    
-    # Get a client to the Firestore database
-    db = firestore.client()
-    
-    # Create a reference to the 'sessions' collection
-    sessions_collection = db.collection('sessions')
-    
-except Exception as e:
-    print(f"❌ Firebase initialization failed: {e}")
-    raise e
\ No newline at end of file
+        raise FirebaseUnavailableError("Firebase credentials are required. Please provide either environment variables (FIREBASE_PROJECT_ID, FIREBASE_PRIVATE_KEY, FIREBASE_CLIENT_EMAIL) or set FIREBASE_CREDENTIALS_PATH to a valid credentials file.")
+
+
+def get_db():
+    """The process-wide Firestore client, created on the first call"""
+    global _db
+    with _lock:
+        if _db is None:
+            started = time.perf_counter()
+            try:
+                _initialize_app()
+                from firebase_admin import firestore
+                # Get a client to the Firestore database
+                _db = firestore.client()
+            except FirebaseUnavailableError as e:
+                print(f"❌ Firebase initialization failed: {e}")
+                raise
+            except Exception as e:
+                print(f"❌ Firebase initialization failed: {e}")
+                raise FirebaseUnavailableError(str(e)) from e
+            print(f"⏱️  Firebase ready in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return _db
+
+
+def close():
+    """Close the Firestore client's channels, if one was ever created"""
+    global _db
+    with _lock:
+        if _db is not None:
+            _db.close()
+            _db = None
@@ -0,0 +1,127 @@
+"""
+HTTP caching helpers - ETags, conditional GETs and read-through payload caches
+"""
+import hashlib
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from sse import SSE_MEDIA_TYPE
+
+
+def compute_etag(body: bytes) -> str:
+    """Strong ETag from a content hash of the exact response bytes"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in candidates)
+
+
+class CachedPayload:
+    """
+    Read-through cache for one serialized response body and its ETag.
+    The loader runs on the first request after expiry or invalidation; concurrent
+    requests wait for that single load instead of all hitting the database.
+    """
+
+    def __init__(self, loader: Callable[[], bytes], ttl_seconds: float):
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self._body: Optional[bytes] = None
+        self._etag: Optional[str] = None
+        self._expires_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self) -> Tuple[bytes, str]:
+        body, etag, expires_at = self._body, self._etag, self._expires_at
+        if body is not None and time.monotonic() < expires_at:
+            return body, etag
+        with self._lock:
+            if self._body is None or time.monotonic() >= self._expires_at:
+                generation = self._generation
+                body = self.loader()
+                # An invalidation that raced with the load leaves the entry expired
+                self._body, self._etag = body, compute_etag(body)
+                self._expires_at = time.monotonic() + self.ttl_seconds if generation == self._generation else 0.0
+            return self._body, self._etag
+
+    def invalidate(self):
+        self._generation += 1
+        self._expires_at = 0.0
+
+
+class ConditionalGetMiddleware:
+    """
+    ASGI middleware that gives GET responses under the configured path prefixes
+    a strong ETag and a Cache-Control policy, and answers a matching If-None-Match
+    with 304 and no body. Routes may set their own ETag (e.g. a cached one) to skip
+    hashing; streamed responses (SSE) and non-200 responses pass through untouched.
+    """
+
+    def __init__(self, app, cache_control: Dict[str, str]):
+        self.app = app
+        # Longest prefix wins, so "/sessions/bulk" can override "/sessions"
+        self.policies = sorted(cache_control.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def _policy(self, path: str) -> Optional[str]:
+        for prefix, cache_control in self.policies:
+            if path == prefix or path.startswith(prefix.rstrip("/") + "/"):
+                return cache_control
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+        cache_control = self._policy(scope["path"])
+        if cache_control is None:
+            return await self.app(scope, receive, send)
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start_message = None
+        passthrough = False
+        chunks = []
+
+        async def buffered_send(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if message["status"] != 200 or headers.get("content-type", "").startswith(SSE_MEDIA_TYPE):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(chunks)
+            headers = MutableHeaders(raw=start_message["headers"])
+            etag = headers.get("etag") or compute_etag(body)
+            headers["etag"] = etag
+            if "cache-control" not in headers:
+                headers["cache-control"] = cache_control
+            if etag_matches(if_none_match, etag):
+                for name in ("content-length", "content-type"):
+                    if name in headers:
+                        del headers[name]
+                await send({**start_message, "status": 304})
+                await send({"type": "http.response.body", "body": b""})
+            else:
+                await send(start_message)
+                await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, buffered_send)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Offline indexer: build the chatbot's knowledge index file from a directory of sources
+
+Reads every .txt, .md/.markdown and .jsonl file under the source directory (recursively),
+splits long texts into chunks of about --chunk-words words and writes one compact index
+file (vocabulary, postings, document lengths and offsets, entries) that the API memory-maps
+at startup (KNOWLEDGE_INDEX_PATH). Re-run it and restart the workers to pick up changes.
+
+    python index_knowledge.py knowledge/ --out knowledge.idx
+
+JSONL lines look like the entries in routers/chatbot.py:
+    {"id": "vata-dosha-1", "content": "...", "metadata": {"source": "...", "category": "..."}}
+Markdown sections take their heading as the category; plain text uses the file name.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from array import array
+from collections import Counter
+from typing import Dict, Iterator, List, Tuple
+
+from retrieval import preprocess_text, write_index
+
+SOURCE_EXTENSIONS = {".txt", ".md", ".markdown", ".jsonl"}
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+
+
+def chunk_text(text: str, chunk_words: int) -> List[str]:
+    """Pack whole paragraphs into chunks of up to chunk_words words; longer paragraphs are split"""
+    chunks, current, count = [], [], 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        words = paragraph.split()
+        if not words:
+            continue
+        if count and count + len(words) > chunk_words:
+            chunks.append("\n\n".join(current))
+            current, count = [], 0
+        while len(words) > chunk_words:
+            chunks.append(" ".join(words[:chunk_words]))
+            words = words[chunk_words:]
+        current.append(" ".join(words))
+        count += len(words)
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def source_name(relative_path: str) -> str:
+    stem = os.path.splitext(os.path.basename(relative_path))[0]
+    return re.sub(r"[_\-]+", " ", stem).strip().title() or relative_path
+
+
+def chunked_entries(entry_id: str, content: str, metadata: Dict, chunk_words: int) -> Iterator[Dict]:
+    chunks = chunk_text(content, chunk_words)
+    for number, chunk in enumerate(chunks):
+        yield {"id": entry_id if len(chunks) == 1 else f"{entry_id}#{number + 1}", "content": chunk, "metadata": metadata}
+
+
+def read_jsonl(path: str, relative_path: str, chunk_words: int) -> Iterator[Dict]:
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            content = record.get("content") or record.get("text") or ""
+            # The chatbot cites metadata.source and groups context by metadata.category
+            metadata = {
+                "source": record.get("source", source_name(relative_path)),
+                "category": record.get("category", "General"),
+                **(record.get("metadata") or {}),
+            }
+            yield from chunked_entries(str(record.get("id") or f"{relative_path}:{line_number}"), content, metadata, chunk_words)
+
+
+def read_markdown(path: str, relative_path: str, chunk_words: int) -> Iterator[Dict]:
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    source = source_name(relative_path)
+    heading, body, section = source, [], 0
+
+    def flush():
+        text = "\n".join(body).strip()
+        if text:
+            yield from chunked_entries(f"{relative_path}#s{section}", text, {"source": source, "category": heading}, chunk_words)
+
+    for line in lines:
+        match = _HEADING.match(line)
+        if match:
+            yield from flush()
+            heading, body, section = match.group(2) or source, [], section + 1
+        else:
+            body.append(line)
+    yield from flush()
+
+
+def read_text(path: str, relative_path: str, chunk_words: int) -> Iterator[Dict]:
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    source = source_name(relative_path)
+    yield from chunked_entries(relative_path, text, {"source": source, "category": source}, chunk_words)
+
+
+def source_files(root: str) -> List[str]:
+    found = []
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in SOURCE_EXTENSIONS:
+                found.append(os.path.join(directory, name))
+    return found
+
+
+def read_entries(path: str, root: str, chunk_words: int) -> Iterator[Dict]:
+    relative_path = os.path.relpath(path, root).replace(os.sep, "/")
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".jsonl":
+        return read_jsonl(path, relative_path, chunk_words)
+    if extension in (".md", ".markdown"):
+        return read_markdown(path, relative_path, chunk_words)
+    return read_text(path, relative_path, chunk_words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source_dir", help="directory of .txt, .md and .jsonl sources")
+    parser.add_argument("--out", default="knowledge.idx", help="index file to write (replaced atomically)")
+    parser.add_argument("--chunk-words", type=int, default=200, help="target words per entry")
+    args = parser.parse_args()
+
+    files = source_files(args.source_dir)
+    if not files:
+        sys.exit(f"❌ No .txt, .md or .jsonl files under {args.source_dir}")
+
+    started = time.perf_counter()
+    postings: Dict[str, Tuple[array, array]] = {}
+    doc_ids: List[str] = []
+    doc_lengths: List[int] = []
+    offsets = [0]
+    seen = set()
+    with tempfile.TemporaryFile() as blobs:
+        for path in files:
+            for entry in read_entries(path, args.source_dir, args.chunk_words):
+                if entry["id"] in seen:
+                    sys.exit(f"❌ Duplicate entry id {entry['id']!r} in {path}")
+                seen.add(entry["id"])
+                doc_idx = len(doc_ids)
+                doc_ids.append(entry["id"])
+                terms = Counter(preprocess_text(entry["content"]))
+                doc_lengths.append(sum(terms.values()))
+                for term, tf in terms.items():
+                    docs, tfs = postings.setdefault(term, (array("I"), array("H")))
+                    docs.append(doc_idx)
+                    tfs.append(min(tf, 0xFFFF))
+                blobs.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+                offsets.append(blobs.tell())
+
+        info = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "tokenizer": "retrieval.preprocess_text",
+            "chunk_words": args.chunk_words,
+            "sources": [os.path.relpath(path, args.source_dir).replace(os.sep, "/") for path in files],
+        }
+        # Written next to the target and renamed, so running servers never map a half-written file
+        partial = f"{args.out}.partial"
+        write_index(partial, doc_ids, doc_lengths, postings, blobs, offsets, info)
+        os.replace(partial, args.out)
+
+    size_mb = os.path.getsize(args.out) / 2**20
+    print(f"✅ Indexed {len(doc_lengths)} entries ({len(postings)} terms) from {len(files)} files "
+          f"into {args.out} ({size_mb:.2f} MB) in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Live knowledge base - incremental updates over the retrieval index without a rebuild
+A snapshot is the base index (BM25Index or the memory-mapped MappedBM25Index) plus a small
+overlay: entries added or replaced since startup, with their own postings, and tombstones
+for base entries that were replaced or removed. Corpus statistics (entry count, total length,
+per-term document frequencies) are kept in step, so scores match a full rebuild.
+
+Snapshots are never modified. A change copies only the overlay parts it touches, builds a new
+snapshot and swaps it in with a single reference assignment: a query reads
+`knowledge_base.snapshot` once and needs no lock. Writers are serialized among themselves.
+
+Changes come from the admin endpoints in routers/chatbot.py or from watching the source
+directory (KNOWLEDGE_WATCH_DIR). Both apply to the process they run in; with several workers
+use the watch, which every worker runs, and rebuild the index file for the next deploy.
+
+Every query also walks the overlay and skips tombstones, so once overlay entries plus
+tombstones pass KNOWLEDGE_OVERLAY_MAX the live entries are compacted into a new in-memory
+base index (a memory-mapped base is then no longer used; rebuild the index file to get it back).
+"""
+import hashlib
+import heapq
+import json
+import os
+import threading
+from collections import Counter
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from retrieval import BM25Index, bm25_idf
+
+KNOWLEDGE_OVERLAY_MAX = int(os.getenv("KNOWLEDGE_OVERLAY_MAX", 5000)) # overlay entries + tombstones before compaction; 0 = never
+
+DocKey = Tuple[int, int] # (0, base doc index) or (1, overlay sequence number)
+
+
+class OverlayEntry(NamedTuple):
+    key: DocKey
+    entry: Dict
+    terms: Counter
+    length: int
+
+
+class KnowledgeSnapshot:
+    """One immutable version of the knowledge base"""
+
+    def __init__(self, base, version: int = 0, overlay: Optional[Dict[str, OverlayEntry]] = None,
+                 overlay_postings: Optional[Dict[str, Tuple[Tuple[DocKey, int], ...]]] = None,
+                 removed: FrozenSet[int] = frozenset(), removed_df: Optional[Dict[str, int]] = None,
+                 removed_length: int = 0, next_key: int = 0):
+        self.base = base
+        self.version = version
+        self.overlay = overlay or {} # entry ID -> overlay entry
+        self.overlay_postings = overlay_postings or {} # term -> ((doc key, tf), ...)
+        self.removed = removed # tombstoned base doc indexes
+        self.removed_df = removed_df or {} # term -> tombstoned base docs containing it
+        self.removed_length = removed_length
+        self.next_key = next_key
+        self._by_key = {item.key: item for item in self.overlay.values()}
+        self.num_docs = len(base) - len(removed) + len(self.overlay)
+        self.total_length = base.total_length - removed_length + sum(item.length for item in self.overlay.values())
+        self.avg_doc_length = self.total_length / self.num_docs if self.num_docs else 0.0
+
+    def __len__(self) -> int:
+        return self.num_docs
+
+    # --- Lookups ---
+    def base_index(self, entry_id: str) -> Optional[int]:
+        """Doc index of a live (not tombstoned) base entry"""
+        doc_idx = self.base.doc_index(entry_id)
+        return None if doc_idx is None or doc_idx in self.removed else doc_idx
+
+    def get(self, entry_id: str) -> Optional[Dict]:
+        if entry_id in self.overlay:
+            return self.overlay[entry_id].entry
+        doc_idx = self.base_index(entry_id)
+        return None if doc_idx is None else self.base.entry(doc_idx)
+
+    def entry(self, key: DocKey) -> Dict:
+        return self.base.entry(key[1]) if key[0] == 0 else self._by_key[key].entry
+
+    def first(self, count: int) -> List[Dict]:
+        """Up to `count` entries in index order; the fallback when nothing matches a query"""
+        found = []
+        for doc_idx in range(len(self.base)):
+            if len(found) == count:
+                return found
+            if doc_idx not in self.removed:
+                found.append(self.base.entry(doc_idx))
+        return found + [item.entry for item in sorted(self.overlay.values(), key=lambda item: item.key)][:count - len(found)]
+
+    def live_entries(self) -> List[Dict]:
+        """Every entry in index order: base entries not tombstoned, then the overlay as it was applied"""
+        entries = [self.base.entry(doc_idx) for doc_idx in range(len(self.base)) if doc_idx not in self.removed]
+        return entries + [item.entry for item in sorted(self.overlay.values(), key=lambda item: item.key)]
+
+    # --- Scoring (same BM25 as retrieval.BM25Index) ---
+    def score(self, query: str) -> Dict[DocKey, float]:
+        base = self.base
+        scores: Dict[DocKey, float] = {}
+        for term, qtf in Counter(base.tokenizer(query)).items():
+            overlay_postings = self.overlay_postings.get(term, ())
+            doc_freq = base.term_doc_freq(term) - self.removed_df.get(term, 0) + len(overlay_postings)
+            if doc_freq <= 0:
+                continue
+            idf = bm25_idf(self.num_docs, doc_freq)
+            for doc_idx, tf in base.term_postings(term):
+                if doc_idx not in self.removed:
+                    self._add(scores, (0, doc_idx), idf, tf, base.doc_length(doc_idx), qtf)
+            for key, tf in overlay_postings:
+                self._add(scores, key, idf, tf, self._by_key[key].length, qtf)
+        return scores
+
+    def _add(self, scores: Dict[DocKey, float], key: DocKey, idf: float, tf: int, length: int, qtf: int):
+        k1, b = self.base.k1, self.base.b
+        norm = k1 * (1 - b + b * (length / self.avg_doc_length)) if self.avg_doc_length else k1
+        scores[key] = scores.get(key, 0.0) + qtf * idf * (tf * (k1 + 1)) / (tf + norm)
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[float, Dict]]:
+        """Up to top_k (score, entry) pairs, best first; ties go to the earlier entry"""
+        best = heapq.nsmallest(top_k, self.score(query).items(), key=lambda item: (-item[1], item[0]))
+        return [(score, self.entry(key)) for key, score in best]
+
+    # --- Copy-on-write changes ---
+    def _without(self, entry_id: str, overlay: Dict, overlay_postings: Dict, state: Dict) -> bool:
+        """Drop an entry from copies of the overlay structures; False if it does not exist"""
+        if entry_id in overlay:
+            item = overlay.pop(entry_id)
+            for term in item.terms:
+                remaining = tuple(posting for posting in overlay_postings[term] if posting[0] != item.key)
+                if remaining:
+                    overlay_postings[term] = remaining
+                else:
+                    del overlay_postings[term]
+            return True
+        doc_idx = self.base_index(entry_id)
+        if doc_idx is None:
+            return False
+        terms = Counter(self.base.tokenizer(self.base.entry(doc_idx)["content"]))
+        state["removed"] = state["removed"] | {doc_idx}
+        removed_df = state["removed_df"]
+        for term in terms:
+            removed_df[term] = removed_df.get(term, 0) + 1
+        state["removed_length"] += self.base.doc_length(doc_idx)
+        return True
+
+    def _derive(self, upserts: List[Dict], removals: List[str]) -> Tuple["KnowledgeSnapshot", List[str]]:
+        overlay, overlay_postings = dict(self.overlay), dict(self.overlay_postings)
+        state = {"removed": self.removed, "removed_df": dict(self.removed_df), "removed_length": self.removed_length}
+        missing = [entry_id for entry_id in removals if not self._without(entry_id, overlay, overlay_postings, state)]
+        next_key = self.next_key
+        for entry in upserts:
+            self._without(entry["id"], overlay, overlay_postings, state)
+            terms = Counter(self.base.tokenizer(entry["content"]))
+            item = OverlayEntry((1, next_key), entry, terms, sum(terms.values()))
+            next_key += 1
+            overlay[entry["id"]] = item
+            for term, tf in terms.items():
+                overlay_postings[term] = overlay_postings.get(term, ()) + ((item.key, tf),)
+        snapshot = KnowledgeSnapshot(
+            self.base, self.version + 1, overlay, overlay_postings,
+            state["removed"], state["removed_df"], state["removed_length"], next_key,
+        )
+        return snapshot, missing
+
+
+class KnowledgeBase:
+    """Holds the current snapshot; readers use `.snapshot`, writers go through apply()"""
+
+    def __init__(self, base, overlay_max: int = KNOWLEDGE_OVERLAY_MAX):
+        self.snapshot = KnowledgeSnapshot(base)
+        self.overlay_max = overlay_max
+        self.compactions = 0
+        self._write_lock = threading.Lock()
+
+    def apply(self, upserts: List[Dict] = (), removals: List[str] = ()) -> List[str]:
+        """Add or replace `upserts` and remove `removals` in one new version; returns the IDs that did not exist"""
+        removals = list(dict.fromkeys(removals)) # a repeated ID is removed once, not reported missing
+        with self._write_lock:
+            snapshot, missing = self.snapshot._derive(list(upserts), removals)
+            if len(missing) < len(removals) or upserts:
+                if self.overlay_max and len(snapshot.overlay) + len(snapshot.removed) > self.overlay_max:
+                    snapshot = self._compact(snapshot)
+                self.snapshot = snapshot # the atomic switch
+            return missing
+
+    def _compact(self, snapshot: KnowledgeSnapshot) -> KnowledgeSnapshot:
+        """Same entries and version, with an empty overlay over a freshly built base"""
+        base = snapshot.base
+        rebuilt = BM25Index(snapshot.live_entries(), tokenizer=base.tokenizer, k1=base.k1, b=base.b)
+        self.compactions += 1
+        print(f"Knowledge base v{snapshot.version}: compacted {len(snapshot.overlay)} overlay entries and "
+              f"{len(snapshot.removed)} removals into an in-memory index; rebuild the index file to map it again")
+        return KnowledgeSnapshot(rebuilt, snapshot.version)
+
+    def upsert(self, entry: Dict) -> int:
+        self.apply(upserts=[entry])
+        return self.snapshot.version
+
+    def remove(self, entry_id: str) -> bool:
+        return not self.apply(removals=[entry_id])
+
+    def stats(self) -> Dict:
+        snapshot = self.snapshot
+        return {
+            "version": snapshot.version,
+            "entries": len(snapshot),
+            "base_entries": len(snapshot.base),
+            "overlay_entries": len(snapshot.overlay),
+            "removed_base_entries": len(snapshot.removed),
+            "compactions": self.compactions,
+        }
+
+
+# --- File watch ---
+def _fingerprint(entry: Dict) -> str:
+    return hashlib.sha1(json.dumps(entry, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class SourceWatcher:
+    """
+    Polls a source directory (the one index_knowledge.py reads) and applies what changed:
+    entries of added or modified files are upserted when their content differs, entries that
+    disappeared are removed. The files as they are when the watch starts are taken to be the
+    ones the index was built from.
+    """
+
+    def __init__(self, knowledge_base: KnowledgeBase, directory: str, read_file: Callable[[str], List[Dict]],
+                 list_files: Callable[[str], List[str]], interval_seconds: float):
+        self.knowledge_base = knowledge_base
+        self.directory = directory
+        self.read_file = read_file
+        self.list_files = list_files
+        self.interval_seconds = interval_seconds
+        self._stopped = threading.Event()
+        self._files: Dict[str, Tuple[float, int]] = {} # path -> (mtime, size)
+        self._entries: Dict[str, Dict[str, str]] = {} # path -> {entry ID: fingerprint}
+
+    def _stat(self) -> Dict[str, Tuple[float, int]]:
+        found = {}
+        for path in self.list_files(self.directory):
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            found[path] = (info.st_mtime, info.st_size)
+        return found
+
+    def _read(self, path: str) -> Dict[str, Dict]:
+        return {entry["id"]: entry for entry in self.read_file(path)}
+
+    def start(self) -> Callable[[], None]:
+        self._files = self._stat()
+        for path in self._files:
+            self._entries[path] = {entry_id: _fingerprint(entry) for entry_id, entry in self._read(path).items()}
+        threading.Thread(target=self._run, name="knowledge-watch", daemon=True).start()
+        return self._stopped.set
+
+    def _run(self):
+        while not self._stopped.wait(self.interval_seconds):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"WARNING: knowledge watch failed: {e}")
+
+    def poll(self) -> Tuple[int, int]:
+        current = self._stat()
+        changed = [path for path, stamp in current.items() if self._files.get(path) != stamp]
+        deleted = [path for path in self._files if path not in current]
+        if not changed and not deleted:
+            return 0, 0
+        upserts, removals, entries = [], [], {}
+        for path in changed:
+            try:
+                fresh = self._read(path)
+            except (OSError, ValueError) as e:
+                # Half-written or invalid: keep the old state and retry on the next change
+                print(f"WARNING: skipping {path}: {e}")
+                current[path] = self._files.get(path)
+                continue
+            previous = self._entries.get(path, {})
+            entries[path] = {entry_id: _fingerprint(entry) for entry_id, entry in fresh.items()}
+            upserts += [entry for entry_id, entry in fresh.items() if previous.get(entry_id) != entries[path][entry_id]]
+            removals += [entry_id for entry_id in previous if entry_id not in fresh]
+        for path in deleted:
+            removals += list(self._entries.pop(path, {}))
+        # An entry that moved to another file is upserted there, not removed
+        moved = {entry["id"] for entry in upserts}
+        removals = [entry_id for entry_id in removals if entry_id not in moved]
+        if upserts or removals:
+            self.knowledge_base.apply(upserts, removals)
+            print(f"Knowledge base v{self.knowledge_base.snapshot.version}: {len(upserts)} updated, {len(removals)} removed")
+        self._entries.update(entries)
+        self._files = {path: stamp for path, stamp in current.items() if stamp is not None}
+        return len(upserts), len(removals)
@@ -0,0 +1,215 @@
+"""
+Shared async LLM client - Mistral via the OpenAI-compatible API
+One pooled HTTP client per worker, a cap on in-flight calls and a per-call deadline,
+so a slow completion never blocks the event loop or queues up without limit.
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List
+
+import httpx
+from openai import AsyncOpenAI
+from dotenv import load_dotenv
+
+from metrics import LLM_ERRORS, STAGE_LATENCY, record_llm_usage, stage_timer
+
+# Load environment variables
+load_dotenv()
+
+MISTRAL_API_KEY = os.environ.get("MISTRAL_API_KEY")
+MISTRAL_BASE_URL = os.getenv("MISTRAL_BASE_URL", "https://api.mistral.ai/v1")
+LLM_MODEL = os.getenv("LLM_MODEL", "mistral-small")
+
+# --- Tuning knobs ---
+LLM_MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", 16))         # concurrent completions per worker
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 30))  # total deadline per call
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", 5))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", 60))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 1))
+LLM_RETRY_AFTER_SECONDS = int(os.getenv("LLM_RETRY_AFTER_SECONDS", 2))
+LLM_DRAIN_SECONDS = float(os.getenv("LLM_DRAIN_SECONDS", LLM_TIMEOUT_SECONDS))  # shutdown wait for open calls
+
+
+class LLMSaturatedError(Exception):
+    """Raised when every LLM slot is busy; callers should shed load instead of waiting."""
+
+
+if MISTRAL_API_KEY:
+    # Keep-alive pool sized to the in-flight cap, so every slot can reuse a warm connection
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_INFLIGHT,
+            max_keepalive_connections=LLM_MAX_INFLIGHT,
+            keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+        ),
+        timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS),
+    )
+    client = AsyncOpenAI(
+        api_key=MISTRAL_API_KEY,
+        base_url=MISTRAL_BASE_URL,
+        http_client=http_client,
+        max_retries=LLM_MAX_RETRIES,
+    )
+else:
+    http_client = None
+    client = None
+    print("WARNING: MISTRAL_API_KEY environment variable not found.")
+
+_slots = asyncio.Semaphore(LLM_MAX_INFLIGHT)
+_in_flight = 0
+
+
+def in_flight() -> int:
+    """Number of LLM calls currently holding a slot in this worker."""
+    return _in_flight
+
+
+async def _acquire_slot():
+    global _in_flight
+    if _slots.locked():
+        LLM_ERRORS.labels(reason="saturated").inc()
+        raise LLMSaturatedError(f"All {LLM_MAX_INFLIGHT} LLM slots are busy")
+    # Does not suspend when a slot is free, so nothing can take it between the check and here
+    await _slots.acquire()
+    _in_flight += 1
+
+
+def _count_error(error: BaseException):
+    if isinstance(error, asyncio.TimeoutError):
+        LLM_ERRORS.labels(reason="timeout").inc()
+    elif isinstance(error, Exception):
+        LLM_ERRORS.labels(reason="api_error").inc()
+
+
+def _release_slot():
+    global _in_flight
+    _in_flight -= 1
+    _slots.release()
+
+
+@asynccontextmanager
+async def llm_slot():
+    """Claim an LLM slot or fail fast with LLMSaturatedError - never queue."""
+    await _acquire_slot()
+    try:
+        yield
+    finally:
+        _release_slot()
+
+
+async def complete_chat(messages: List[Dict[str, str]], temperature: float = 0.6, max_tokens: int = 500) -> str:
+    """Run one chat completion inside a slot, bounded by LLM_TIMEOUT_SECONDS end to end."""
+    async with llm_slot():
+        try:
+            with stage_timer("llm"):
+                resp = await asyncio.wait_for(
+                    client.chat.completions.create(
+                        model=LLM_MODEL,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                    ),
+                    timeout=LLM_TIMEOUT_SECONDS,
+                )
+        except Exception as e:
+            _count_error(e)
+            raise
+    record_llm_usage(getattr(resp, "usage", None))
+    return resp.choices[0].message.content.strip()
+
+
+class DeltaStream:
+    """
+    Async iterator of a streamed completion's text deltas that holds an LLM slot until
+    aclose(). Closing is idempotent, so the caller can close it from every exit path,
+    including the ones where iteration never started.
+    """
+
+    def __init__(self, stream, started: float, deadline: float):
+        self._stream = stream
+        self._started = started
+        self._deadline = deadline
+        self._iterator = None
+        self._closed = False
+
+    def __aiter__(self):
+        if self._iterator is None:
+            self._iterator = self._deltas()
+        return self._iterator
+
+    async def _deltas(self):
+        loop = asyncio.get_running_loop()
+        chunks = self._stream.__aiter__()
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=max(self._deadline - loop.time(), 0))
+                except StopAsyncIteration:
+                    break
+                # Providers that report usage on a stream do so on the last chunk
+                record_llm_usage(getattr(chunk, "usage", None))
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            _count_error(e)
+            raise
+        finally:
+            await self._finish()
+
+    async def _finish(self):
+        if self._closed:
+            return
+        self._closed = True
+        _release_slot()
+        # The stage covers the whole stream, from the request to the last delta
+        STAGE_LATENCY.labels(stage="llm").observe(asyncio.get_running_loop().time() - self._started)
+        await self._stream.close()
+
+    async def aclose(self):
+        if self._iterator is not None:
+            await self._iterator.aclose() # its finally runs _finish() if it had started
+        await self._finish()
+
+
+async def stream_chat(messages: List[Dict[str, str]], temperature: float = 0.6, max_tokens: int = 500) -> DeltaStream:
+    """Start a streamed completion and return its deltas as a DeltaStream.
+
+    The slot is claimed before this returns (so saturation surfaces as LLMSaturatedError
+    while the caller can still send an error status) and released when the stream is
+    exhausted or closed; the caller must aclose() it on every path. The whole stream
+    shares one LLM_TIMEOUT_SECONDS deadline.
+    """
+    await _acquire_slot()
+    started = asyncio.get_running_loop().time()
+    try:
+        stream = await asyncio.wait_for(
+            client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+            ),
+            timeout=LLM_TIMEOUT_SECONDS,
+        )
+    except BaseException as e:
+        _count_error(e)
+        _release_slot()
+        raise
+    return DeltaStream(stream, started, started + LLM_TIMEOUT_SECONDS)
+
+
+async def drain(timeout: float = LLM_DRAIN_SECONDS) -> int:
+    """Wait up to `timeout` seconds for in-flight calls to finish; returns how many are still open."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while _in_flight and loop.time() < deadline:
+        await asyncio.sleep(0.05)
+    return _in_flight
+
+
+async def close():
+    """Release pooled connections; called from the app lifespan on shutdown."""
+    if client is not None:
+        await client.close()
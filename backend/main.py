@@ -1,12 +1,67 @@
-from fastapi import FastAPI
+import time
+
+_started = time.perf_counter() # startup phases are timed from here
+
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from routers import sessions, practitioners, chatbot
+from fastapi.responses import JSONResponse
+from routers import sessions, practitioners, chatbot, analytics
+from http_cache import ConditionalGetMiddleware
+from metrics import MetricsMiddleware, metrics_response
+from profiling import PROFILING_ENABLED, ProfilingMiddleware
+from conversation_store import conversation_store
+from repositories import StorageUnavailableError, close_storage, get_practitioner_repository, get_session_repository
+import llm_client
+import session_feed
+import session_watch
+
+_imported = time.perf_counter()
+
+def _preload_storage():
+    # Optional warm-up so the first request does not pay for the storage client setup
+    try:
+        get_session_repository()
+        get_practitioner_repository()
+    except StorageUnavailableError as e:
+        print(f"WARNING: storage unavailable, storage routes will return 503: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup and shutdown hooks for shared resources"""
+    # Startup: storage clients are built lazily by their dependencies unless preloading is asked for
+    phases = {"imports": _imported - _started, "app setup": _configured - _imported}
+    if os.getenv("STORAGE_PRELOAD", "false").lower() == "true":
+        preload_started = time.perf_counter()
+        await asyncio.to_thread(_preload_storage)
+        phases["storage preload"] = time.perf_counter() - preload_started
+    # Knowledge source watch (KNOWLEDGE_WATCH_DIR), if configured
+    stop_knowledge_watch = chatbot.start_knowledge_watch()
+    print("Startup timing: " + ", ".join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in phases.items()))
+    yield
+    if stop_knowledge_watch:
+        stop_knowledge_watch()
+    # Shutdown: let chatbot calls that are still running finish, then release the pooled LLM connections
+    abandoned = await llm_client.drain()
+    if abandoned:
+        print(f"WARNING: shutting down with {abandoned} chatbot call(s) still in flight")
+    await llm_client.close()
+    # Stop the shared session change watch (feed and schedule index), if anything started it
+    if session_feed.get_session_feed.cache_info().currsize:
+        session_feed.get_session_feed().close()
+    session_watch.close_session_watch()
+    # Close the Firestore client or SQLite connection, if one was opened
+    close_storage()
+    conversation_store.close()
 
 # Initialize the FastAPI app
 app = FastAPI(
     title="AyurSutra API",
     description="Backend API for managing Panchakarma therapy sessions.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # --- CORS (Cross-Origin Resource Sharing) Middleware ---
@@ -38,19 +93,54 @@ else:
     ]
     allow_credentials = False
 
+# --- Conditional GETs ---
+# Strong ETags on list responses; pollers that re-fetch unchanged data get a 304 with no body.
+# Patient sessions must not sit in shared caches; the roster is not user-specific.
+# Registered before CORS so the CORS headers are also added to 304 responses.
+app.add_middleware(
+    ConditionalGetMiddleware,
+    cache_control={
+        "/sessions": "private, no-cache",
+        "/practitioners": "public, no-cache",
+        "/analytics": "private, no-cache",
+    },
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=allow_credentials,
     allow_methods=["*"], # Allows all methods (GET, POST, etc.)
     allow_headers=["*"], # Allows all headers
+    expose_headers=["X-Next-Cursor", "ETag"], # Pagination cursor and cache validators
 )
 
+# --- Profiling (opt-in) ---
+# X-Profile: <PROFILING_TOKEN> returns a request's profile; PROFILING_SAMPLE_RATE records a share of traffic
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+# --- Metrics ---
+# Outermost, so request latency includes every other middleware
+app.add_middleware(MetricsMiddleware)
+
 # --- Include Routers ---
 # This links the endpoints from routers/sessions.py to the main app
 app.include_router(sessions.router)
 app.include_router(practitioners.router)
 app.include_router(chatbot.router)
+app.include_router(analytics.router)
+
+# --- Storage errors ---
+# Missing Firebase credentials only take the storage-backed routes down, not the process
+@app.exception_handler(StorageUnavailableError)
+async def storage_unavailable_handler(request: Request, exc: StorageUnavailableError):
+    return JSONResponse(status_code=503, content={"detail": "Storage is unavailable"})
+
+# --- Prometheus scrape endpoint ---
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    return metrics_response()
 
 # --- Root Endpoint ---
 @app.get("/", tags=["Root"])
@@ -58,4 +148,6 @@ def read_root():
     """
     A simple root endpoint to confirm the API is running.
     """
-    return {"message": "Welcome to the AyurSutra Backend API!"}
\ No newline at end of file
+    return {"message": "Welcome to the AyurSutra Backend API!"}
+
+_configured = time.perf_counter()
@@ -0,0 +1,108 @@
+"""
+Prometheus metrics - request latency, in-flight requests and hot-path stage timers
+Served at GET /metrics. With several workers (run.py production mode) set
+PROMETHEUS_MULTIPROC_DIR to an empty, writable directory so the endpoint aggregates
+every worker instead of reporting whichever one answered the scrape.
+"""
+import os
+import time
+from typing import Callable, Dict, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+from starlette.responses import Response
+from starlette.routing import Match
+
+# Seconds; API calls are mostly tens of milliseconds, LLM calls run to LLM_TIMEOUT_SECONDS
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route template and status",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests being served, including open event streams",
+    multiprocess_mode="livesum",
+)
+STAGE_LATENCY = Histogram(
+    "stage_duration_seconds", "Time spent in one stage of a request",
+    ["stage"], buckets=LATENCY_BUCKETS,
+)
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported by the LLM API", ["kind"]) # prompt | completion
+PROMPT_TOKENS = Histogram(
+    "llm_prompt_tokens", "Estimated tokens per chatbot prompt, after history compaction",
+    buckets=(250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 16000),
+)
+LLM_ERRORS = Counter("llm_errors_total", "Failed LLM calls", ["reason"]) # saturated | timeout | api_error
+
+
+def stage_timer(stage: str):
+    """Time a block or a function into stage_duration_seconds, e.g. `with stage_timer("retrieval"):`"""
+    return STAGE_LATENCY.labels(stage=stage).time()
+
+
+def record_llm_usage(usage) -> None:
+    """Count tokens from an OpenAI-style `usage` object; missing usage is ignored"""
+    if usage is None:
+        return
+    LLM_TOKENS.labels(kind="prompt").inc(getattr(usage, "prompt_tokens", 0) or 0)
+    LLM_TOKENS.labels(kind="completion").inc(getattr(usage, "completion_tokens", 0) or 0)
+
+
+def metrics_response() -> Response:
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that times every HTTP request into http_request_duration_seconds.
+    Requests are labelled with their route template ("/sessions/{patient_id}"), never the
+    raw path, so patient IDs do not create new series; unmatched paths share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._templates: Dict[Callable, str] = {}
+
+    def _route(self, scope) -> str:
+        # Routing stores the matched endpoint in the scope; map it back to its template once
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        template = self._templates.get(endpoint)
+        if template is None:
+            template = "unmatched"
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is endpoint and route.matches(scope)[0] == Match.FULL:
+                    template = route.path
+                    break
+            self._templates[endpoint] = template
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status: Optional[int] = None
+
+        async def timed_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            REQUEST_LATENCY.labels(
+                method=scope["method"], route=self._route(scope), status=str(status or 500)
+            ).observe(time.perf_counter() - started)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+One-shot migration: backfill startsAt and durationMinutes on existing sessions
+
+Reads every session's date/time/duration strings, derives the typed fields and writes the
+ones that are missing or stale in batched writes (up to 500 per commit). Safe to re-run;
+sessions that are already up to date are skipped. Uses the configured STORAGE_BACKEND.
+
+    python migrate_session_times.py --dry-run
+    python migrate_session_times.py
+"""
+import argparse
+
+from repositories import BATCH_LIMIT, BatchWrite, get_session_repository
+from session_time import normalized_fields
+
+SOURCE_FIELDS = ["date", "time", "duration", "startsAt", "durationMinutes"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+    parser.add_argument("--batch-size", type=int, default=BATCH_LIMIT, help=f"writes per batch (max {BATCH_LIMIT})")
+    args = parser.parse_args()
+
+    repo = get_session_repository()
+    batch_size = max(1, min(args.batch_size, BATCH_LIMIT))
+    scanned = up_to_date = unparseable = written = failed = 0
+    pending = []
+
+    def flush():
+        nonlocal written, failed
+        for result in repo.write_batch(pending):
+            if result.error is None:
+                written += 1
+            else:
+                failed += 1
+                print(f"❌ {result.id}: {result.error}")
+        pending.clear()
+
+    for session in repo.stream_all(fields=SOURCE_FIELDS):
+        scanned += 1
+        derived = normalized_fields(session)
+        if derived["startsAt"] is None:
+            unparseable += 1
+            print(f"⚠️  {session['id']}: cannot parse date={session.get('date')!r} time={session.get('time')!r}")
+        changes = {field: value for field, value in derived.items() if value is not None and session.get(field) != value}
+        if not changes:
+            up_to_date += 1
+            continue
+        if args.dry_run:
+            written += 1
+            continue
+        pending.append(BatchWrite("update", session["id"], changes))
+        if len(pending) >= batch_size:
+            flush()
+    if pending:
+        flush()
+
+    action = "would update" if args.dry_run else "updated"
+    print(f"✅ Scanned {scanned} sessions: {action} {written}, up to date {up_to_date}, "
+          f"unparseable start {unparseable}, failed {failed}")
+
+
+if __name__ == "__main__":
+    main()
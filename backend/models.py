@@ -1,5 +1,7 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, model_validator
+from typing import Any, Dict, Literal, Optional, List
+
+from session_time import normalized_fields
 
 # This is the base model with fields common to both creation and retrieval
 class SessionBase(BaseModel):
@@ -14,6 +16,17 @@ class SessionBase(BaseModel):
     preparation: Optional[List[str]] = None
     notes: Optional[str] = None
     patientId: str # To associate the session with a patient
+    # Derived from date/time/duration on every validation; indexable and sortable
+    startsAt: Optional[str] = None # "YYYY-MM-DDTHH:MM", clinic-local
+    durationMinutes: Optional[int] = None
+
+    @model_validator(mode="after")
+    def normalize_schedule(self):
+        # Unparseable legacy strings keep whatever typed values were given
+        for field, value in normalized_fields(self.__dict__).items():
+            if value is not None:
+                setattr(self, field, value)
+        return self
 
 # Model for creating a new session (all fields required)
 class SessionCreate(SessionBase):
@@ -35,6 +48,59 @@ class SessionUpdate(BaseModel):
 class Session(SessionBase):
     id: str # The unique ID from Firestore
 
+# Model for list responses, where a `fields=` projection may leave out anything but the ID
+class SessionSummary(BaseModel):
+    id: str
+    therapy: Optional[str] = None
+    date: Optional[str] = None
+    time: Optional[str] = None
+    duration: Optional[str] = None
+    practitioner: Optional[str] = None
+    location: Optional[str] = None
+    status: Optional[str] = None
+    sessionId: Optional[str] = None
+    preparation: Optional[List[str]] = None
+    notes: Optional[str] = None
+    patientId: Optional[str] = None
+    startsAt: Optional[str] = None
+    durationMinutes: Optional[int] = None
+
+# Models for POST /sessions/bulk. `data` is validated per item against
+# SessionCreate (create) or SessionUpdate (update) so one bad item doesn't sink the request.
+class SessionBulkOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[str] = None # Required for update and delete
+    data: Optional[Dict[str, Any]] = None
+
+class SessionBulkRequest(BaseModel):
+    operations: List[SessionBulkOperation]
+
+class SessionBulkResult(BaseModel):
+    index: int
+    op: str
+    id: Optional[str] = None
+    status: int # HTTP-style status for this item
+    error: Optional[str] = None
+
+# Analytics rollup bucket, e.g. one therapy or one day
+class RollupBucket(BaseModel):
+    key: str
+    total: int
+    statuses: Dict[str, int] # status distribution
+    completionRate: float # completed / total
+
+# Free/busy view of one practitioner's day; times are YYYY-MM-DDTHH:MM
+class TimeWindow(BaseModel):
+    start: str
+    end: str
+    sessionId: Optional[str] = None
+
+class Availability(BaseModel):
+    practitionerId: str
+    date: str
+    busy: List[TimeWindow]
+    free: List[TimeWindow]
+
 class Practitioner(BaseModel):
     id: str
     name: str
@@ -0,0 +1,296 @@
+"""
+On-demand request profiling - off unless PROFILING_ENABLED=true
+With profiling enabled:
+  * a request carrying `X-Profile: <PROFILING_TOKEN>` is profiled and answered with the
+    profile instead of its normal body (the real status is in X-Profiled-Status);
+  * PROFILING_SAMPLE_RATE (0.0-1.0) profiles that fraction of all traffic in the background.
+Every profile is also written to PROFILING_DIR. The default sampling profiler writes
+collapsed stacks (.folded: flamegraph.pl, speedscope, inferno); PROFILER=cprofile writes
+deterministic .pstats instead (snakeviz, flameprof).
+
+The sampler reads every thread's stack, because sync routes run in the threadpool rather
+than on the event loop; stacks of other requests served at the same time show up too.
+
+Server-Sent Event streams are not profiled: they stay open until the client leaves, so
+there is no end to wait for. They are served normally with `X-Profile-Skipped: event-stream`.
+"""
+import asyncio
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from sse import SSE_MEDIA_TYPE
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "") # header profiling is off without one
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", 0.0))
+PROFILING_DIR = os.getenv("PROFILING_DIR", "profiles")
+PROFILING_KEEP = int(os.getenv("PROFILING_KEEP", 500)) # newest profile files kept on disk
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", 5))
+PROFILER = os.getenv("PROFILER", "sampling") # sampling | cprofile
+
+if PROFILER not in ("sampling", "cprofile"):
+    raise ValueError(f"Unknown PROFILER '{PROFILER}'; expected 'sampling' or 'cprofile'")
+
+PROFILE_HEADER = "x-profile"
+
+
+class ProfilerBusyError(Exception):
+    """cProfile can only trace one request at a time."""
+
+
+# --- Sampling profiler ---
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_idle(frame) -> bool:
+    # A thread blocked in threading/queue waits (an idle pool worker, a poller between polls)
+    return os.path.basename(frame.f_code.co_filename) in ("threading.py", "queue.py")
+
+
+class StackSampler:
+    """
+    One daemon thread that snapshots every thread's stack each PROFILING_INTERVAL_MS while
+    at least one profile is recording, and adds the folded stacks to each of them.
+    """
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._active: List[Counter] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> Counter:
+        samples = Counter()
+        with self._lock:
+            self._active.append(samples)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+                self._thread.start()
+            self._wakeup.notify()
+        return samples
+
+    def stop(self, samples: Counter) -> Counter:
+        with self._lock:
+            self._active.remove(samples)
+        return samples
+
+    def _sample(self) -> Counter:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own = threading.get_ident()
+        stacks = Counter()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own or _is_idle(frame):
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(thread_id, f"thread-{thread_id}"))
+            stacks[";".join(reversed(labels))] += 1
+        return stacks
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._active:
+                    self._wakeup.wait()
+            stacks = self._sample()
+            with self._lock:
+                for samples in self._active:
+                    samples.update(stacks)
+            time.sleep(self.interval_seconds)
+
+
+_sampler = StackSampler(PROFILING_INTERVAL_MS / 1000)
+_cprofile_lock = threading.Lock()
+
+
+class Profile:
+    """One request's profile; `report()` renders it in the configured output format"""
+
+    def __init__(self):
+        self._samples: Optional[Counter] = None
+        self._cprofile: Optional[cProfile.Profile] = None
+        self.stopped = False
+
+    def start(self):
+        if PROFILER == "cprofile":
+            # Tracing is per thread and exclusive, so one request at a time, event loop only
+            if not _cprofile_lock.acquire(blocking=False):
+                raise ProfilerBusyError("Another request is being profiled")
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        else:
+            self._samples = _sampler.start()
+
+    def stop(self):
+        if self.stopped:
+            return
+        self.stopped = True
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            _cprofile_lock.release()
+        else:
+            _sampler.stop(self._samples)
+
+    @property
+    def extension(self) -> str:
+        return "pstats" if self._cprofile is not None else "folded"
+
+    def report(self) -> str:
+        """Human-readable form returned to a header-authorized caller"""
+        if self._cprofile is not None:
+            out = io.StringIO()
+            pstats.Stats(self._cprofile, stream=out).sort_stats("cumulative").print_stats(60)
+            return out.getvalue()
+        return self.folded()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self._samples.items()))
+
+    def save(self, method: str, path: str, duration_ms: float) -> str:
+        os.makedirs(PROFILING_DIR, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", path).strip("-") or "root"
+        filename = os.path.join(PROFILING_DIR, f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}-{method}-{slug[:80]}-{duration_ms:.0f}ms.{self.extension}")
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(filename)
+        else:
+            with open(filename, "w") as f:
+                f.write(self.folded())
+        _prune(PROFILING_DIR, PROFILING_KEEP)
+        return filename
+
+
+def _prune(directory: str, keep: int):
+    files = sorted(
+        (entry for entry in os.scandir(directory) if entry.is_file()),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in files[:max(len(files) - keep, 0)]:
+        os.remove(entry.path)
+
+
+def _is_event_stream(message) -> bool:
+    return (message["type"] == "http.response.start"
+            and Headers(raw=message["headers"]).get("content-type", "").startswith(SSE_MEDIA_TYPE))
+
+
+def _skip_profile(profile: Profile, message):
+    """Stop profiling a response that turned out to be an event stream, and say so on it"""
+    profile.stop()
+    MutableHeaders(scope=message).append("X-Profile-Skipped", "event-stream")
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware for header-authorized and sampled request profiles.
+    Only added to the app when PROFILING_ENABLED is set, so it costs nothing otherwise.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _requested(self, scope) -> bool:
+        if not PROFILING_TOKEN:
+            return False
+        supplied = Headers(scope=scope).get(PROFILE_HEADER, "")
+        return bool(supplied) and hmac.compare_digest(supplied, PROFILING_TOKEN)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if self._requested(scope):
+            return await self._profile_to_response(scope, receive, send)
+        if PROFILING_SAMPLE_RATE and random.random() < PROFILING_SAMPLE_RATE:
+            return await self._profile_to_disk(scope, receive, send)
+        return await self.app(scope, receive, send)
+
+    async def _profile_to_disk(self, scope, receive, send):
+        profile = Profile()
+        try:
+            profile.start()
+        except ProfilerBusyError:
+            return await self.app(scope, receive, send)
+        streaming = False
+
+        async def send_unless_stream(message):
+            nonlocal streaming
+            if _is_event_stream(message):
+                streaming = True
+                _skip_profile(profile, message)
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_unless_stream)
+        finally:
+            profile.stop()
+            if not streaming:
+                duration_ms = (time.perf_counter() - started) * 1000
+                try:
+                    await asyncio.to_thread(profile.save, scope["method"], scope["path"], duration_ms)
+                except OSError as e:
+                    print(f"WARNING: could not write profile: {e}")
+
+    async def _profile_to_response(self, scope, receive, send):
+        profile = Profile()
+        try:
+            profile.start()
+        except ProfilerBusyError as e:
+            return await _send_text(send, 503, str(e), [(b"retry-after", b"1")])
+
+        status = 500
+        streaming = False
+
+        async def discard(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if _is_event_stream(message):
+                    # The body would never end, so there is nothing to replace; pass it through
+                    streaming = True
+                    _skip_profile(profile, message)
+            if streaming:
+                await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            profile.stop()
+        if streaming:
+            return
+        duration_ms = (time.perf_counter() - started) * 1000
+        filename = await asyncio.to_thread(profile.save, scope["method"], scope["path"], duration_ms)
+        await _send_text(send, 200, profile.report(), [
+            (b"x-profiled-status", str(status).encode()),
+            (b"x-profiled-duration-ms", f"{duration_ms:.1f}".encode()),
+            (b"x-profile-file", os.path.basename(filename).encode()),
+            (b"cache-control", b"no-store"),
+        ])
+
+
+async def _send_text(send, status: int, text: str, headers):
+    body = text.encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"text/plain; charset=utf-8"), (b"content-length", str(len(body)).encode())] + headers,
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,69 @@
+"""
+Storage backend selection
+STORAGE_BACKEND=firestore (default) uses Firebase; STORAGE_BACKEND=sqlite uses a local
+SQLite file at SQLITE_PATH (":memory:" for an in-memory store). Backends are built on
+first use, so importing the routers never touches Firebase; when it cannot be built the
+factories raise StorageUnavailableError (served as a 503) instead of failing the process.
+"""
+import os
+import sys
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+from repositories.base import (
+    BATCH_LIMIT, BatchResult, BatchWrite, InvalidCursorError, NotFoundError,
+    RESYNC, PractitionerRepository, SessionChange, SessionRepository, StorageUnavailableError,
+    WriteConflictError, date_range
+)
+
+# Load environment variables
+load_dotenv()
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firestore")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "ayursutra.db")
+
+if STORAGE_BACKEND not in ("firestore", "sqlite"):
+    raise ValueError(f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}'; expected 'firestore' or 'sqlite'")
+
+
+@lru_cache(maxsize=None)
+def _sqlite_database():
+    from repositories.sqlite import SQLiteDatabase
+    return SQLiteDatabase(SQLITE_PATH)
+
+
+def _firestore_db():
+    import firebase_config
+    try:
+        return firebase_config.get_db()
+    except firebase_config.FirebaseUnavailableError as e:
+        raise StorageUnavailableError(str(e)) from e
+
+
+@lru_cache(maxsize=None)
+def get_session_repository() -> SessionRepository:
+    if STORAGE_BACKEND == "sqlite":
+        from repositories.sqlite import SQLiteSessionRepository
+        return SQLiteSessionRepository(_sqlite_database())
+    from repositories.firestore import FirestoreSessionRepository
+    db = _firestore_db()
+    return FirestoreSessionRepository(db, db.collection("sessions"))
+
+
+@lru_cache(maxsize=None)
+def get_practitioner_repository() -> PractitionerRepository:
+    if STORAGE_BACKEND == "sqlite":
+        from repositories.sqlite import SQLitePractitionerRepository
+        return SQLitePractitionerRepository(_sqlite_database())
+    from repositories.firestore import FirestorePractitionerRepository
+    return FirestorePractitionerRepository(_firestore_db())
+
+
+def close_storage():
+    """Release whatever backend connections were opened; called from the app lifespan on shutdown."""
+    if STORAGE_BACKEND == "sqlite":
+        if _sqlite_database.cache_info().currsize:
+            _sqlite_database().close()
+    elif "firebase_config" in sys.modules:
+        sys.modules["firebase_config"].close()
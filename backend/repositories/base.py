@@ -0,0 +1,145 @@
+"""
+Storage interfaces shared by every backend
+Routers only talk to these classes; the concrete backend (Firestore or SQLite) is
+chosen by configuration in repositories/__init__.py.
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# Max writes committed together; matches Firestore's WriteBatch limit so every
+# backend has the same chunk-level atomicity for bulk requests.
+BATCH_LIMIT = 500
+
+
+def date_range(order_by: Optional[str], date_from: Optional[str], date_to: Optional[str]) -> Tuple[str, Optional[str], Optional[str]]:
+    """
+    The field a list query sorts and range-filters on, with its bounds. startsAt values start
+    with their YYYY-MM-DD date, so an inclusive day bound is extended to the end of that day.
+    """
+    if order_by == "startsAt":
+        return "startsAt", date_from, date_to + "T\uf8ff" if date_to else None
+    return "date", date_from, date_to
+
+
+class NotFoundError(Exception):
+    """The document to update or delete does not exist."""
+
+
+class WriteConflictError(Exception):
+    """The session kept changing between the read a write was planned from and its commit."""
+
+
+class InvalidCursorError(Exception):
+    """A pagination cursor does not refer to an existing document."""
+
+
+class StorageUnavailableError(Exception):
+    """The configured backend cannot be reached or is not configured (e.g. no Firebase credentials)."""
+
+
+class BatchWrite(NamedTuple):
+    op: str # "create" | "update" | "delete"
+    id: Optional[str] # None for creates; the backend assigns one
+    data: Optional[Dict[str, Any]]
+
+
+class BatchResult(NamedTuple):
+    id: Optional[str]
+    error: Optional[Exception] # None when the write was committed
+
+
+class SessionChange(NamedTuple):
+    type: str # "added" | "modified" | "removed" | "resync"
+    id: str
+    data: Dict[str, Any] # the document after the change; the last known contents for "removed"
+
+
+# Sent by a watch that missed changes; consumers drop what they derived and re-read the sessions
+RESYNC = SessionChange("resync", "", {})
+
+
+class SessionRepository(ABC):
+    """
+    Sessions storage. Documents are plain dicts that include their `id`.
+    Every write also applies its analytics.session_deltas to the rollup buckets, atomically
+    with the session write itself.
+    """
+
+    @abstractmethod
+    def create(self, data: Dict[str, Any]) -> str:
+        """Store a new session and return its ID."""
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def list_for_patient(
+        self,
+        patient_id: str,
+        limit: Optional[int] = None,
+        start_after: Optional[str] = None,
+        status: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        order_by: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Return one page of a patient's sessions and the cursor for the next page (or None).
+        order_by is "date" or "startsAt"; date_from/date_to apply to the same field.
+        """
+
+    @abstractmethod
+    def stream_all(self, fields: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Every session, optionally only `fields` (plus `id`); for warm-ups and maintenance jobs."""
+
+    @abstractmethod
+    def update(self, session_id: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Merge `data` into an existing session; raises NotFoundError if it is missing.
+        Returns the updated document when the backend had to read it anyway, else None.
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Remove a session; raises NotFoundError if it is missing."""
+
+    @abstractmethod
+    def write_batch(self, writes: List[BatchWrite]) -> List[BatchResult]:
+        """Apply writes in atomic chunks of BATCH_LIMIT; a failed chunk fails all of its items."""
+
+    @abstractmethod
+    def list_rollups(
+        self,
+        dimension: str,
+        key_from: Optional[str] = None,
+        key_to: Optional[str] = None,
+    ) -> List[Tuple[str, Dict[str, int]]]:
+        """(bucket key, status counts) for one analytics dimension, ordered by key."""
+
+    @abstractmethod
+    def rebuild_rollups(self) -> int:
+        """Recompute every rollup bucket from the sessions; returns the number of sessions."""
+
+    @abstractmethod
+    def watch(self, callback: Callable[[List[SessionChange]], None]) -> Callable[[], None]:
+        """
+        Call `callback` with each batch of changes made after this call, from a background
+        thread. One watch covers the whole collection; returns a function that stops it.
+        A batch of [RESYNC] means changes were missed and the sessions must be re-read.
+        """
+
+
+class PractitionerRepository(ABC):
+    @abstractmethod
+    def list_all(self) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def save(self, practitioner_id: str, data: Dict[str, Any]) -> None:
+        """Create or replace a practitioner (used for seeding local backends)."""
+
+    @abstractmethod
+    def add_change_listener(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Call `callback` whenever the roster changes; returns a function that unsubscribes."""
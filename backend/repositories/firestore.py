@@ -0,0 +1,356 @@
+"""
+Firestore storage backend
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+from google.api_core.exceptions import FailedPrecondition, NotFound
+from google.cloud.firestore import Increment
+
+from analytics import ROLLUP_FIELDS, Deltas, merge_deltas, session_deltas, touches_rollups
+
+from repositories.base import (
+    BATCH_LIMIT, BatchResult, BatchWrite, InvalidCursorError, NotFoundError,
+    PractitionerRepository, SessionChange, SessionRepository, WriteConflictError, date_range
+)
+
+# Writes planned from a read are conditioned on that read's update_time; when another writer
+# changed the session in between, the write is planned again from a fresh read this many times
+WRITE_CONFLICT_RETRIES = 5
+# Sessions whose rollup fields and update_time this process has seen, so a delete can commit
+# its decrements without reading the session first
+KNOWN_SESSIONS_MAX = int(os.getenv("FIRESTORE_KNOWN_SESSIONS", "10000"))
+
+
+class FirestoreSessionRepository(SessionRepository):
+    """
+    Rollup buckets live in the `session_rollups` collection, one document per bucket:
+    {dimension, key, total, statuses: {status: count}}, bumped with Increment transforms
+    in the same WriteBatch as the session write.
+
+    The rollup fields and update_time of sessions written, read or watched here are kept in
+    a bounded projection. A delete of a session in it is one commit conditioned on that
+    update_time; if the session changed elsewhere since, the commit fails and the delete
+    falls back to reading it.
+    """
+
+    def __init__(self, db, collection):
+        self.db = db
+        self.collection = collection
+        self.rollups = db.collection('session_rollups')
+        self._known: "OrderedDict[str, Tuple[Dict[str, Any], Any]]" = OrderedDict()
+        self._known_lock = threading.Lock()
+
+    # --- Rollup projection ---
+    def _remember(self, session_id: str, data: Dict[str, Any], update_time) -> None:
+        if update_time is None:
+            return
+        fields = {field: data[field] for field in ROLLUP_FIELDS if field in data}
+        with self._known_lock:
+            self._known[session_id] = (fields, update_time)
+            self._known.move_to_end(session_id)
+            while len(self._known) > KNOWN_SESSIONS_MAX:
+                self._known.popitem(last=False)
+
+    def _remember_snapshot(self, snapshot) -> None:
+        self._remember(snapshot.id, snapshot.to_dict() or {}, snapshot.update_time)
+
+    def _forget(self, session_id: str) -> None:
+        with self._known_lock:
+            self._known.pop(session_id, None)
+
+    def _recall(self, session_id: str):
+        with self._known_lock:
+            return self._known.get(session_id)
+
+    def _unchanged_since(self, snapshot):
+        return self.db.write_option(last_update_time=snapshot.update_time)
+
+    def _rollup_ref(self, dimension: str, key: str):
+        return self.rollups.document(f"{dimension}:{quote(key, safe='')}")
+
+    def _add_rollup_writes(self, batch, deltas: Deltas) -> None:
+        for (dimension, key), statuses in deltas.items():
+            batch.set(self._rollup_ref(dimension, key), {
+                "dimension": dimension,
+                "key": key,
+                "total": Increment(sum(statuses.values())),
+                "statuses": {status: Increment(n) for status, n in statuses.items()},
+            }, merge=True)
+
+    def create(self, data: Dict[str, Any]) -> str:
+        doc_ref = self.collection.document()
+        batch = self.db.batch()
+        batch.set(doc_ref, data)
+        self._add_rollup_writes(batch, session_deltas(None, data))
+        results = batch.commit()
+        self._remember(doc_ref.id, data, results[0].update_time)
+        return doc_ref.id
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        doc = self.collection.document(session_id).get()
+        if not doc.exists:
+            self._forget(session_id)
+            return None
+        self._remember_snapshot(doc)
+        return {"id": doc.id, **doc.to_dict()}
+
+    def list_for_patient(self, patient_id, limit=None, start_after=None, status=None,
+                         date_from=None, date_to=None, order_by=None, fields=None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        query = self.collection.where('patientId', '==', patient_id)
+        if status:
+            query = query.where('status', '==', status)
+        sort_field, low, high = date_range(order_by, date_from, date_to)
+        if low:
+            query = query.where(sort_field, '>=', low)
+        if high:
+            query = query.where(sort_field, '<=', high)
+        # Firestore requires the first sort to be on the range-filtered field
+        if order_by or low or high:
+            query = query.order_by(sort_field)
+        if fields:
+            query = query.select(fields)
+        if start_after:
+            cursor_doc = self.collection.document(start_after).get()
+            if not cursor_doc.exists:
+                raise InvalidCursorError(start_after)
+            query = query.start_after(cursor_doc)
+        if limit:
+            # One extra document tells us whether there is another page
+            query = query.limit(limit + 1)
+
+        sessions = []
+        for doc in query.stream():
+            if not fields:
+                self._remember_snapshot(doc)
+            sessions.append({"id": doc.id, **doc.to_dict()})
+        if limit and len(sessions) > limit:
+            sessions = sessions[:limit]
+            return sessions, sessions[-1]["id"]
+        return sessions, None
+
+    def stream_all(self, fields=None) -> Iterator[Dict[str, Any]]:
+        query = self.collection.select(fields) if fields else self.collection
+        for doc in query.stream():
+            yield {"id": doc.id, **doc.to_dict()}
+
+    def update(self, session_id: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        doc_ref = self.collection.document(session_id)
+        if not touches_rollups(data):
+            # update() itself fails with NOT_FOUND, so no existence read is needed
+            # Its projected update_time is now stale; pairing the new one with the projected
+            # fields could hide another writer's change, so leave it to the next read or watch
+            self._forget(session_id)
+            try:
+                doc_ref.update(data)
+            except NotFound:
+                raise NotFoundError(session_id)
+            return None
+
+        # Moving a session between buckets needs its previous values; the read also
+        # gives the caller the updated document without a second get()
+        for _ in range(WRITE_CONFLICT_RETRIES):
+            snapshot = doc_ref.get()
+            if not snapshot.exists:
+                raise NotFoundError(session_id)
+            before = snapshot.to_dict()
+            after = {**before, **data}
+            batch = self.db.batch()
+            batch.update(doc_ref, data, option=self._unchanged_since(snapshot))
+            self._add_rollup_writes(batch, session_deltas(before, after))
+            try:
+                results = batch.commit()
+            except NotFound:
+                raise NotFoundError(session_id)
+            except FailedPrecondition:
+                continue # changed or deleted since the read; the deltas are stale
+            self._remember(session_id, after, results[0].update_time)
+            return {"id": session_id, **after}
+        raise WriteConflictError(session_id)
+
+    def delete(self, session_id: str) -> None:
+        # The buckets to decrement come from the document being deleted; every session counts
+        # in the "all" bucket. A session in the projection is deleted in one commit
+        doc_ref = self.collection.document(session_id)
+        known = self._recall(session_id)
+        if known is not None:
+            before, update_time = known
+            batch = self.db.batch()
+            batch.delete(doc_ref, option=self.db.write_option(last_update_time=update_time))
+            self._add_rollup_writes(batch, session_deltas(before, None))
+            try:
+                batch.commit()
+                self._forget(session_id)
+                return
+            except FailedPrecondition:
+                self._forget(session_id) # changed or deleted elsewhere; read it below
+
+        # Otherwise read it first: one round trip more
+        for _ in range(WRITE_CONFLICT_RETRIES):
+            snapshot = doc_ref.get()
+            if not snapshot.exists:
+                raise NotFoundError(session_id)
+            batch = self.db.batch()
+            batch.delete(doc_ref, option=self._unchanged_since(snapshot))
+            self._add_rollup_writes(batch, session_deltas(snapshot.to_dict(), None))
+            try:
+                batch.commit()
+            except FailedPrecondition:
+                continue # changed or deleted since the read; the next read tells which
+            self._forget(session_id)
+            return
+        raise WriteConflictError(session_id)
+
+    def write_batch(self, writes: List[BatchWrite]) -> List[BatchResult]:
+        return self._write_batch(writes, attempt=1)
+
+    def _write_batch(self, writes: List[BatchWrite], attempt: int) -> List[BatchResult]:
+        # Previous values of every session that can change buckets, in one round trip
+        needs_before = [w.id for w in writes if w.op == "delete" or (w.op == "update" and touches_rollups(w.data))]
+        known, read_at = {}, {}
+        if needs_before:
+            refs = [self.collection.document(session_id) for session_id in needs_before]
+            for snapshot in self.db.get_all(refs):
+                if snapshot.exists:
+                    known[snapshot.id] = snapshot.to_dict()
+                    read_at[snapshot.id] = snapshot
+
+        results = []
+        chunk, deltas = [], {}
+        for write in writes:
+            doc_ref = self.collection.document(write.id) if write.id else self.collection.document()
+            before = known.get(doc_ref.id)
+            if write.op == "create":
+                after = write.data
+            elif write.op == "update":
+                after = {**before, **write.data} if before is not None else None
+            else:
+                after = None
+            write_deltas = session_deltas(before, after) if write.op == "create" or before is not None else {}
+            if write.op != "create" and before is not None:
+                known[doc_ref.id] = after
+
+            # Session writes plus one write per touched bucket must fit in one WriteBatch
+            new_buckets = len(set(write_deltas) - set(deltas))
+            if chunk and len(chunk) + 1 + len(deltas) + new_buckets > BATCH_LIMIT:
+                results.extend(self._commit_chunk(chunk, deltas, attempt))
+                chunk, deltas = [], {}
+
+            if write.op == "delete" and before is None:
+                # A delete of a session that is not there fails its chunk with NOT_FOUND, like an
+                # update (and like the SQLite backend), instead of succeeding as a no-op
+                option = self.db.write_option(exists=True)
+            elif doc_ref.id in read_at and all(ref.id != doc_ref.id for _, ref, _ in chunk):
+                # The first write of a session in a chunk carries the read's update_time; later
+                # ones in the same (atomic) chunk were planned from it
+                option = self._unchanged_since(read_at[doc_ref.id])
+            else:
+                option = None
+            chunk.append((write, doc_ref, option))
+            merge_deltas(deltas, write_deltas)
+        if chunk:
+            results.extend(self._commit_chunk(chunk, deltas, attempt))
+        return results
+
+    def _commit_chunk(self, chunk, deltas: Deltas, attempt: int) -> List[BatchResult]:
+        batch = self.db.batch()
+        for write, doc_ref, option in chunk:
+            if write.op == "create":
+                batch.set(doc_ref, write.data)
+            elif write.op == "update":
+                batch.update(doc_ref, write.data, option=option)
+            else:
+                batch.delete(doc_ref, option=option)
+        self._add_rollup_writes(batch, deltas)
+        doc_ids = [doc_ref.id for _, doc_ref, _ in chunk]
+        for doc_id in doc_ids:
+            self._forget(doc_id) # batch results are not projected; the next read or watch event is
+        try:
+            batch.commit()
+            return [BatchResult(doc_id, None) for doc_id in doc_ids]
+        except FailedPrecondition as e:
+            # A session changed since it was read (or in an earlier chunk of this request):
+            # nothing in the chunk was written, so plan its writes again from a fresh read
+            if attempt < WRITE_CONFLICT_RETRIES:
+                return self._write_batch([write for write, _, _ in chunk], attempt + 1)
+            return [BatchResult(doc_id, WriteConflictError(str(e))) for doc_id in doc_ids]
+        except Exception as e:
+            # An update or delete of a missing document aborts the whole chunk with NOT_FOUND
+            error = NotFoundError(str(e)) if isinstance(e, NotFound) else e
+            return [BatchResult(doc_id, error) for doc_id in doc_ids]
+
+    def list_rollups(self, dimension, key_from=None, key_to=None) -> List[Tuple[str, Dict[str, int]]]:
+        # Ranges on key need the composite index (dimension ASC, key ASC)
+        query = self.rollups.where('dimension', '==', dimension)
+        if key_from:
+            query = query.where('key', '>=', key_from)
+        if key_to:
+            query = query.where('key', '<=', key_to)
+        buckets = []
+        for doc in query.order_by('key').stream():
+            statuses = {status: n for status, n in (doc.get('statuses') or {}).items() if n}
+            if statuses:
+                buckets.append((doc.get('key'), statuses))
+        return buckets
+
+    def rebuild_rollups(self) -> int:
+        # Not atomic with concurrent writes; run it while the API is idle
+        deltas, count = {}, 0
+        for session in self.stream_all(fields=sorted(ROLLUP_FIELDS)):
+            merge_deltas(deltas, session_deltas(None, session))
+            count += 1
+        stale = [doc.reference for doc in self.rollups.stream()]
+        for start in range(0, len(stale), BATCH_LIMIT):
+            batch = self.db.batch()
+            for doc_ref in stale[start:start + BATCH_LIMIT]:
+                batch.delete(doc_ref)
+            batch.commit()
+        buckets = list(deltas.items())
+        for start in range(0, len(buckets), BATCH_LIMIT):
+            batch = self.db.batch()
+            for (dimension, key), statuses in buckets[start:start + BATCH_LIMIT]:
+                batch.set(self._rollup_ref(dimension, key), {
+                    "dimension": dimension, "key": key, "total": sum(statuses.values()), "statuses": statuses,
+                })
+            batch.commit()
+        return count
+
+    def watch(self, callback: Callable[[List[SessionChange]], None]) -> Callable[[], None]:
+        # The first snapshot lists every existing document as ADDED; only later ones are changes
+        initial = [True]
+
+        def on_snapshot(snapshots, changes, read_time):
+            for change in changes:
+                if change.type.name == "REMOVED":
+                    self._forget(change.document.id)
+                else:
+                    self._remember_snapshot(change.document)
+            if initial[0]:
+                initial[0] = False
+                return
+            callback([
+                SessionChange(change.type.name.lower(), change.document.id, change.document.to_dict() or {})
+                for change in changes
+            ])
+
+        watch = self.collection.on_snapshot(on_snapshot)
+        return watch.unsubscribe
+
+
+class FirestorePractitionerRepository(PractitionerRepository):
+    def __init__(self, db):
+        self.collection = db.collection('practitioners')
+
+    def list_all(self) -> List[Dict[str, Any]]:
+        return [{"id": doc.id, **doc.to_dict()} for doc in self.collection.stream()]
+
+    def save(self, practitioner_id: str, data: Dict[str, Any]) -> None:
+        self.collection.document(practitioner_id).set(data)
+
+    def add_change_listener(self, callback: Callable[[], None]) -> Callable[[], None]:
+        # One snapshot listener; after the initial snapshot it only reads changed documents
+        watch = self.collection.on_snapshot(lambda snapshots, changes, read_time: callback())
+        return watch.unsubscribe
@@ -0,0 +1,355 @@
+"""
+SQLite storage backend - local engine for benchmarking, development and on-prem clinics
+Each session is stored as a JSON document, with the queried fields (patientId, date,
+status) copied into indexed columns. Use the path ":memory:" for a throwaway in-memory store.
+"""
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from analytics import Deltas, merge_deltas, session_deltas
+from repositories.base import (
+    BATCH_LIMIT, RESYNC, BatchResult, BatchWrite, InvalidCursorError, NotFoundError,
+    PractitionerRepository, SessionChange, SessionRepository, date_range
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    patientId TEXT NOT NULL,
+    date TEXT NOT NULL DEFAULT '',
+    status TEXT,
+    data TEXT NOT NULL,
+    startsAt TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_patient_date ON sessions (patientId, date, id);
+CREATE INDEX IF NOT EXISTS idx_sessions_patient_status_date ON sessions (patientId, status, date, id);
+CREATE INDEX IF NOT EXISTS idx_sessions_date ON sessions (date);
+CREATE INDEX IF NOT EXISTS idx_sessions_status ON sessions (status);
+
+-- Change log filled by triggers, so writes from any process reach the change feed poller
+CREATE TABLE IF NOT EXISTS session_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS trg_sessions_added AFTER INSERT ON sessions BEGIN
+    INSERT INTO session_changes (type, id, data) VALUES ('added', NEW.id, NEW.data);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_sessions_modified AFTER UPDATE ON sessions BEGIN
+    INSERT INTO session_changes (type, id, data) VALUES ('modified', NEW.id, NEW.data);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_sessions_removed AFTER DELETE ON sessions BEGIN
+    INSERT INTO session_changes (type, id, data) VALUES ('removed', OLD.id, OLD.data);
+END;
+
+-- Analytics rollups: one row per (dimension, bucket key, status)
+CREATE TABLE IF NOT EXISTS session_rollups (
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (dimension, key, status)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS practitioners (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+
+# How often a watch polls the change log, and how many log rows are kept behind the newest
+SQLITE_POLL_SECONDS = float(os.getenv("SQLITE_POLL_SECONDS", 1.0))
+SQLITE_CHANGE_LOG_KEEP = int(os.getenv("SQLITE_CHANGE_LOG_KEEP", 10000))
+
+
+def new_id() -> str:
+    """20-character ID, the same shape as Firestore's auto IDs"""
+    return uuid.uuid4().hex[:20]
+
+
+class SQLiteDatabase:
+    """One connection shared by the repositories, serialised with a lock."""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.lock = threading.RLock()
+        with self.lock:
+            if path != ":memory:":
+                self.conn.execute("PRAGMA journal_mode=WAL")
+                self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+            # Databases created before typed session times gain the column (backfilled by
+            # migrate_session_times.py) before its index is built
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(sessions)")}
+            if "startsAt" not in columns:
+                self.conn.execute("ALTER TABLE sessions ADD COLUMN startsAt TEXT NOT NULL DEFAULT ''")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_patient_starts ON sessions (patientId, startsAt, id)")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class SQLiteSessionRepository(SessionRepository):
+    def __init__(self, database: SQLiteDatabase):
+        self.database = database
+        with self.database.lock:
+            # Databases created before rollups existed get their buckets built once
+            has_sessions = self.database.conn.execute("SELECT 1 FROM sessions LIMIT 1").fetchone()
+            has_rollups = self.database.conn.execute("SELECT 1 FROM session_rollups LIMIT 1").fetchone()
+        if has_sessions and not has_rollups:
+            self.rebuild_rollups()
+
+    @staticmethod
+    def _row(data: Dict[str, Any]) -> Tuple:
+        # A missing date is stored as '' so it sorts first and the (patientId, date, id) index stays usable
+        return (data.get("patientId"), data.get("date") or "", data.get("status"), data.get("startsAt") or "", json.dumps(data))
+
+    @contextmanager
+    def _transaction(self):
+        with self.database.lock:
+            self.database.conn.execute("BEGIN")
+            try:
+                yield
+                self._trim_change_log()
+                self.database.conn.execute("COMMIT")
+            except BaseException:
+                self.database.conn.execute("ROLLBACK")
+                raise
+
+    def _apply_rollups(self, deltas: Deltas):
+        self.database.conn.executemany(
+            "INSERT INTO session_rollups (dimension, key, status, count) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (dimension, key, status) DO UPDATE SET count = count + excluded.count",
+            [(dimension, key, status, n) for (dimension, key), statuses in deltas.items() for status, n in statuses.items()]
+        )
+
+    def _trim_change_log(self):
+        # Every write trims, so the log stays bounded whether or not anything polls it; the
+        # window left behind is what pollers in other processes can still catch up on
+        self.database.conn.execute(
+            "DELETE FROM session_changes WHERE seq <= (SELECT IFNULL(MAX(seq), 0) FROM session_changes) - ?",
+            (SQLITE_CHANGE_LOG_KEEP,)
+        )
+
+    # The helpers below run inside a transaction and return the rollup deltas of the write
+
+    def _insert(self, session_id: str, data: Dict[str, Any]) -> Deltas:
+        self.database.conn.execute(
+            "INSERT INTO sessions (patientId, date, status, startsAt, data, id) VALUES (?, ?, ?, ?, ?, ?)",
+            self._row(data) + (session_id,)
+        )
+        return session_deltas(None, data)
+
+    def _update(self, session_id: str, data: Dict[str, Any]) -> Tuple[Dict[str, Any], Deltas]:
+        row = self.database.conn.execute("SELECT data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            raise NotFoundError(session_id)
+        before = json.loads(row[0])
+        merged = {**before, **data}
+        self.database.conn.execute(
+            "UPDATE sessions SET patientId = ?, date = ?, status = ?, startsAt = ?, data = ? WHERE id = ?",
+            self._row(merged) + (session_id,)
+        )
+        return merged, session_deltas(before, merged)
+
+    def _delete(self, session_id: str) -> Deltas:
+        row = self.database.conn.execute("SELECT data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            raise NotFoundError(session_id)
+        self.database.conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+        return session_deltas(json.loads(row[0]), None)
+
+    def create(self, data: Dict[str, Any]) -> str:
+        session_id = new_id()
+        with self._transaction():
+            self._apply_rollups(self._insert(session_id, data))
+        return session_id
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self.database.lock:
+            row = self.database.conn.execute("SELECT data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return {"id": session_id, **json.loads(row[0])} if row else None
+
+    def list_for_patient(self, patient_id, limit=None, start_after=None, status=None,
+                         date_from=None, date_to=None, order_by=None, fields=None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        clauses, params = ["patientId = ?"], [patient_id]
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        # sort_field is a fixed column name ("date" or "startsAt"), never user input
+        sort_field, low, high = date_range(order_by, date_from, date_to)
+        if low:
+            clauses.append(f"{sort_field} >= ?")
+            params.append(low)
+        if high:
+            clauses.append(f"{sort_field} <= ?")
+            params.append(high)
+        sorted_by_field = bool(order_by or low or high)
+
+        with self.database.lock:
+            if start_after:
+                cursor = self.database.conn.execute(f"SELECT {sort_field} FROM sessions WHERE id = ?", (start_after,)).fetchone()
+                if cursor is None:
+                    raise InvalidCursorError(start_after)
+                if sorted_by_field:
+                    clauses.append(f"({sort_field}, id) > (?, ?)")
+                    params.extend([cursor[0], start_after])
+                else:
+                    clauses.append("id > ?")
+                    params.append(start_after)
+
+            sql = f"SELECT id, data FROM sessions WHERE {' AND '.join(clauses)}"
+            sql += f" ORDER BY {sort_field}, id" if sorted_by_field else " ORDER BY id"
+            if limit:
+                # One extra row tells us whether there is another page
+                sql += " LIMIT ?"
+                params.append(limit + 1)
+            rows = self.database.conn.execute(sql, params).fetchall()
+
+        sessions = []
+        for session_id, raw in rows:
+            data = json.loads(raw)
+            if fields:
+                data = {field: data[field] for field in fields if field in data}
+            sessions.append({"id": session_id, **data})
+        if limit and len(sessions) > limit:
+            sessions = sessions[:limit]
+            return sessions, sessions[-1]["id"]
+        return sessions, None
+
+    def stream_all(self, fields=None) -> Iterator[Dict[str, Any]]:
+        with self.database.lock:
+            rows = self.database.conn.execute("SELECT id, data FROM sessions").fetchall()
+        for session_id, raw in rows:
+            data = json.loads(raw)
+            if fields:
+                data = {field: data[field] for field in fields if field in data}
+            yield {"id": session_id, **data}
+
+    def update(self, session_id: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        with self._transaction():
+            merged, deltas = self._update(session_id, data)
+            self._apply_rollups(deltas)
+        return {"id": session_id, **merged}
+
+    def delete(self, session_id: str) -> None:
+        with self._transaction():
+            self._apply_rollups(self._delete(session_id))
+
+    def write_batch(self, writes: List[BatchWrite]) -> List[BatchResult]:
+        results = []
+        for start in range(0, len(writes), BATCH_LIMIT):
+            chunk = writes[start:start + BATCH_LIMIT]
+            doc_ids = [write.id or new_id() for write in chunk]
+            try:
+                with self._transaction():
+                    deltas = {}
+                    for write, doc_id in zip(chunk, doc_ids):
+                        if write.op == "create":
+                            merge_deltas(deltas, self._insert(doc_id, write.data))
+                        elif write.op == "update":
+                            merge_deltas(deltas, self._update(doc_id, write.data)[1])
+                        else:
+                            merge_deltas(deltas, self._delete(doc_id))
+                    self._apply_rollups(deltas)
+                results.extend(BatchResult(doc_id, None) for doc_id in doc_ids)
+            except Exception as e:
+                results.extend(BatchResult(doc_id, e) for doc_id in doc_ids)
+        return results
+
+    def list_rollups(self, dimension, key_from=None, key_to=None) -> List[Tuple[str, Dict[str, int]]]:
+        clauses, params = ["dimension = ?", "count != 0"], [dimension]
+        if key_from:
+            clauses.append("key >= ?")
+            params.append(key_from)
+        if key_to:
+            clauses.append("key <= ?")
+            params.append(key_to)
+        with self.database.lock:
+            rows = self.database.conn.execute(
+                f"SELECT key, status, count FROM session_rollups WHERE {' AND '.join(clauses)} ORDER BY key", params
+            ).fetchall()
+        buckets: Dict[str, Dict[str, int]] = {}
+        for key, status, count in rows:
+            buckets.setdefault(key, {})[status] = count
+        return list(buckets.items())
+
+    def rebuild_rollups(self) -> int:
+        with self._transaction():
+            rows = self.database.conn.execute("SELECT data FROM sessions").fetchall()
+            deltas = {}
+            for (raw,) in rows:
+                merge_deltas(deltas, session_deltas(None, json.loads(raw)))
+            self.database.conn.execute("DELETE FROM session_rollups")
+            self._apply_rollups(deltas)
+        return len(rows)
+
+    def _latest_change(self) -> int:
+        with self.database.lock:
+            return self.database.conn.execute("SELECT IFNULL(MAX(seq), 0) FROM session_changes").fetchone()[0]
+
+    def _changes_since(self, seq: int) -> List[Tuple[int, str, str, str]]:
+        with self.database.lock:
+            return self.database.conn.execute(
+                "SELECT seq, type, id, data FROM session_changes WHERE seq > ? ORDER BY seq", (seq,)
+            ).fetchall()
+
+    def watch(self, callback: Callable[[List[SessionChange]], None]) -> Callable[[], None]:
+        # A single poller thread per watch; one indexed range read per interval when idle
+        stopped = threading.Event()
+        last_seq = self._latest_change()
+
+        def poll():
+            nonlocal last_seq
+            while not stopped.wait(SQLITE_POLL_SECONDS):
+                try:
+                    rows = self._changes_since(last_seq)
+                except sqlite3.Error as e:
+                    print(f"WARNING: session change poll failed: {e}")
+                    continue
+                if not rows:
+                    continue
+                # seq has no holes, so a jump means the log was trimmed past this poller
+                missed = rows[0][0] != last_seq + 1
+                last_seq = rows[-1][0]
+                if missed:
+                    print("WARNING: session change log trimmed past this watch, resyncing")
+                    callback([RESYNC])
+                else:
+                    callback([SessionChange(change_type, session_id, json.loads(raw)) for _, change_type, session_id, raw in rows])
+
+        threading.Thread(target=poll, name="sqlite-session-watch", daemon=True).start()
+        return stopped.set
+
+
+class SQLitePractitionerRepository(PractitionerRepository):
+    def __init__(self, database: SQLiteDatabase):
+        self.database = database
+        self._listeners: List[Callable[[], None]] = []
+
+    def list_all(self) -> List[Dict[str, Any]]:
+        with self.database.lock:
+            rows = self.database.conn.execute("SELECT id, data FROM practitioners ORDER BY id").fetchall()
+        return [{"id": practitioner_id, **json.loads(raw)} for practitioner_id, raw in rows]
+
+    def save(self, practitioner_id: str, data: Dict[str, Any]) -> None:
+        with self.database.lock:
+            self.database.conn.execute(
+                "INSERT OR REPLACE INTO practitioners (id, data) VALUES (?, ?)",
+                (practitioner_id, json.dumps(data))
+            )
+        for listener in list(self._listeners):
+            listener()
+
+    def add_change_listener(self, callback: Callable[[], None]) -> Callable[[], None]:
+        # Only sees writes made through this process; other writers are covered by cache TTLs
+        self._listeners.append(callback)
+        return lambda: self._listeners.remove(callback)
@@ -0,0 +1,204 @@
+"""
+Chatbot response cache - skips retrieval-identical LLM calls for repeated questions
+Keys combine the normalized query, the retrieved knowledge IDs and (optionally) a hash
+of the conversation history. The in-process LRU/TTL backend is the default; a Redis
+backend can be selected so several workers share one cache.
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+CHATBOT_CACHE_BACKEND = os.getenv("CHATBOT_CACHE_BACKEND", "memory")  # memory | redis | none
+CHATBOT_CACHE_TTL_SECONDS = float(os.getenv("CHATBOT_CACHE_TTL_SECONDS", 3600))
+CHATBOT_CACHE_MAX_ENTRIES = int(os.getenv("CHATBOT_CACHE_MAX_ENTRIES", 1000))
+CHATBOT_CACHE_MAX_BYTES = int(os.getenv("CHATBOT_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+CHATBOT_CACHE_INCLUDE_HISTORY = os.getenv("CHATBOT_CACHE_INCLUDE_HISTORY", "true").lower() == "true"
+CHATBOT_CACHE_REDIS_URL = os.getenv("CHATBOT_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+
+def make_cache_key(normalized_query: str, knowledge_ids: List[str], conversation_history: Optional[List[Dict[str, str]]] = None) -> str:
+    """Stable key for a question; history only participates when CHATBOT_CACHE_INCLUDE_HISTORY is on."""
+    history = conversation_history if (CHATBOT_CACHE_INCLUDE_HISTORY and conversation_history) else []
+    payload = json.dumps([normalized_query, sorted(knowledge_ids), history], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CacheBackend(ABC):
+    """Interface every response cache backend implements. Values are JSON-serializable dicts."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Dict) -> None:
+        ...
+
+    @abstractmethod
+    async def clear(self) -> None:
+        ...
+
+    def _record(self, value: Optional[Dict]) -> Optional[Dict]:
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class NullCache(CacheBackend):
+    """Caching disabled - every lookup is a miss."""
+
+    async def get(self, key: str) -> Optional[Dict]:
+        return self._record(None)
+
+    async def set(self, key: str, value: Dict) -> None:
+        return None
+
+    async def clear(self) -> None:
+        return None
+
+
+class InMemoryCache(CacheBackend):
+    """Per-process LRU cache with TTL expiry, bounded by entry count and by serialized size."""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+        self.current_bytes = 0
+        # key -> (expires_at, size_in_bytes, value); oldest first
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _drop(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    async def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and item[0] <= time.monotonic():
+                self._drop(key)
+                item = None
+            if item is not None:
+                self._entries.move_to_end(key)
+            return self._record(item[2] if item is not None else None)
+
+    async def set(self, key: str, value: Dict) -> None:
+        size = len(json.dumps(value))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, size, value)
+            self.current_bytes += size
+            while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    async def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        stats.update({
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "ttl_seconds": self.ttl_seconds,
+        })
+        return stats
+
+
+class RedisCache(CacheBackend):
+    """
+    Shared cache for multi-worker deployments; Redis enforces TTL and (via maxmemory) the bound.
+    The cache is an optimization: while Redis is unreachable, lookups are misses and stores are
+    skipped, so requests fall through to the LLM instead of failing.
+    """
+
+    def __init__(self, url: str, ttl_seconds: float, prefix: str = "ayursutra:chat:"):
+        super().__init__()
+        import redis.asyncio as redis  # optional dependency, only needed for this backend
+        from redis.exceptions import RedisError
+
+        self.redis = redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self.errors = 0
+        self._failing = False
+        self._redis_errors = (RedisError, OSError)
+
+    def _failed(self, action: str, error: Exception) -> None:
+        self.errors += 1
+        if not self._failing: # once per outage, not once per request
+            self._failing = True
+            print(f"Redis cache {action} failed, serving without it: {error}")
+
+    async def get(self, key: str) -> Optional[Dict]:
+        try:
+            raw = await self.redis.get(self.prefix + key)
+            value = json.loads(raw) if raw is not None else None
+        except (*self._redis_errors, ValueError) as e:
+            self._failed("get", e)
+            value = None
+        else:
+            self._failing = False
+        return self._record(value)
+
+    async def set(self, key: str, value: Dict) -> None:
+        # EX takes whole seconds and must be positive; round up so short TTLs still cache
+        ttl = max(1, math.ceil(self.ttl_seconds))
+        try:
+            await self.redis.set(self.prefix + key, json.dumps(value), ex=ttl)
+        except self._redis_errors as e:
+            self._failed("set", e)
+
+    async def clear(self) -> None:
+        async for key in self.redis.scan_iter(match=self.prefix + "*"):
+            await self.redis.delete(key)
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        stats["ttl_seconds"] = self.ttl_seconds
+        stats["errors"] = self.errors
+        return stats
+
+
+def create_cache() -> CacheBackend:
+    """Build the backend selected by CHATBOT_CACHE_BACKEND."""
+    if CHATBOT_CACHE_BACKEND == "none":
+        return NullCache()
+    if CHATBOT_CACHE_BACKEND == "redis":
+        return RedisCache(CHATBOT_CACHE_REDIS_URL, CHATBOT_CACHE_TTL_SECONDS)
+    return InMemoryCache(CHATBOT_CACHE_MAX_ENTRIES, CHATBOT_CACHE_MAX_BYTES, CHATBOT_CACHE_TTL_SECONDS)
+
+
+response_cache = create_cache()
@@ -0,0 +1,309 @@
+"""
+Knowledge retrieval engine - BM25 over an inverted index
+The corpus is tokenized once when the index is built; queries only touch the
+postings lists of their own terms instead of re-scanning every entry.
+
+BM25Index holds a small corpus in memory. MappedBM25Index serves the same queries from
+a prebuilt index file (see index_knowledge.py) through a read-only memory map: nothing is
+decoded up front, only the postings of a query's terms and the returned entries are
+touched, and every worker process shares the file's pages through the OS page cache.
+"""
+import heapq
+import json
+import math
+import mmap
+import re
+import struct
+import sys
+from array import array
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+STOP_WORDS = {'the', 'a', 'an', 'is', 'in', 'on', 'of', 'for', 'to', 'and', 'with', 'was', 'are'}
+
+
+def preprocess_text(text: str) -> List[str]:
+    """Lowercased word tokens without stop words or very short words; used for corpus and queries alike"""
+    return [w for w in re.findall(r'\b\w+\b', text.lower()) if w not in STOP_WORDS and len(w) > 2]
+
+
+def bm25_idf(num_docs: int, doc_freq: int) -> float:
+    # Lucene's smoothed BM25 IDF: the +1 keeps it positive, so very common terms still count a little
+    return math.log(1 + (num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+
+class BM25Index:
+    """Inverted index with precomputed document lengths and IDF, scored with Okapi BM25."""
+
+    def __init__(self, entries: List[Dict], tokenizer: Callable[[str], List[str]], k1: float = 1.5, b: float = 0.75):
+        self.entries = list(entries)
+        self.tokenizer = tokenizer
+        self.k1 = k1
+        self.b = b
+
+        # term -> [(doc index, term frequency), ...]
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_lengths: List[int] = []
+        for doc_idx, entry in enumerate(self.entries):
+            terms = Counter(tokenizer(entry["content"]))
+            self.doc_lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                self.postings.setdefault(term, []).append((doc_idx, tf))
+
+        num_docs = len(self.entries)
+        self.total_length = sum(self.doc_lengths)
+        self.avg_doc_length = (self.total_length / num_docs) if num_docs else 0.0
+        self.ids: Dict[str, int] = {entry["id"]: doc_idx for doc_idx, entry in enumerate(self.entries)}
+        self.idf: Dict[str, float] = {term: bm25_idf(num_docs, len(plist)) for term, plist in self.postings.items()}
+        # Length normalisation depends only on the document, so it is folded in once here
+        self.length_norms: List[float] = [
+            k1 * (1 - b + b * (length / self.avg_doc_length)) if self.avg_doc_length else k1
+            for length in self.doc_lengths
+        ]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def entry(self, doc_idx: int) -> Dict:
+        return self.entries[doc_idx]
+
+    # Raw statistics, read by knowledge_base.KnowledgeSnapshot to score across base and overlay
+    def doc_index(self, entry_id: str) -> Optional[int]:
+        return self.ids.get(entry_id)
+
+    def doc_length(self, doc_idx: int) -> int:
+        return self.doc_lengths[doc_idx]
+
+    def term_postings(self, term: str) -> Iterable[Tuple[int, int]]:
+        return self.postings.get(term, ())
+
+    def term_doc_freq(self, term: str) -> int:
+        return len(self.postings.get(term, ()))
+
+    def score(self, query: str) -> Dict[int, float]:
+        """Accumulate BM25 scores for every document sharing at least one term with the query."""
+        scores: Dict[int, float] = {}
+        for term, qtf in Counter(self.tokenizer(query)).items():
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf[term]
+            for doc_idx, tf in plist:
+                contribution = idf * (tf * (self.k1 + 1)) / (tf + self.length_norms[doc_idx])
+                scores[doc_idx] = scores.get(doc_idx, 0.0) + qtf * contribution
+        return scores
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[float, Dict]]:
+        """Return up to top_k (score, entry) pairs, best first. Documents with no matching term are skipped."""
+        scores = self.score(query)
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(score, self.entries[doc_idx]) for doc_idx, score in best]
+
+
+# --- Index file ---
+# Little-endian. A fixed header, then 8-byte aligned sections:
+#   info            JSON: build settings and source list
+#   term_offsets    u64[n_terms + 1]  byte offsets of each term in `terms`
+#   terms           UTF-8 terms, sorted, concatenated
+#   postings_index  u64[n_terms + 1]  start of each term's postings
+#   postings_docs   u32 doc index per posting, ascending within a term
+#   postings_tfs    u16 term frequency per posting (capped at 65535)
+#   doc_lengths     u32[n_docs]       token count per entry
+#   doc_offsets     u64[n_docs + 1]   byte offsets of each entry in `docs`
+#   docs            one JSON object {"id", "content", "metadata"} per entry
+#   id_offsets      u64[n_docs + 1]   byte offsets of each entry ID in `ids`
+#   ids             UTF-8 entry IDs, sorted, concatenated
+#   id_docs         u32[n_docs]       doc index of each sorted ID
+INDEX_MAGIC = b"AYKIDX\x00\x01"
+INDEX_VERSION = 2
+SECTIONS = (
+    "info", "term_offsets", "terms", "postings_index", "postings_docs", "postings_tfs",
+    "doc_lengths", "doc_offsets", "docs", "id_offsets", "ids", "id_docs",
+)
+_HEADER = struct.Struct("<8sIIIIQ" + "QQ" * len(SECTIONS))
+
+
+class IndexFormatError(Exception):
+    """The file is not a knowledge index this version can read."""
+
+
+def _typed(values: Iterable[int], typecode: str) -> bytes:
+    data = array(typecode, values)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data.tobytes()
+
+
+def _offsets(blobs: List[bytes]) -> List[int]:
+    offsets, position = [0], 0
+    for blob in blobs:
+        position += len(blob)
+        offsets.append(position)
+    return offsets
+
+
+def write_index(path: str, doc_ids: List[str], doc_lengths: List[int], postings: Dict[str, Tuple[array, array]], docs_file, docs_offsets: List[int], info: Dict):
+    """
+    Write an index file. `postings` maps each term to (array('I') of doc indexes,
+    array('H') of term frequencies); `docs_file` is a binary file already holding the entry
+    JSON blobs at `docs_offsets` (len(doc_lengths) + 1 offsets), copied in chunks.
+    """
+    terms = sorted(postings)
+    encoded = [term.encode("utf-8") for term in terms]
+    id_order = sorted(range(len(doc_ids)), key=lambda doc_idx: doc_ids[doc_idx].encode("utf-8"))
+    encoded_ids = [doc_ids[doc_idx].encode("utf-8") for doc_idx in id_order]
+    postings_index, position = [0], 0
+    for term in terms:
+        position += len(postings[term][0])
+        postings_index.append(position)
+
+    def postings_bytes(part: int):
+        for term in terms:
+            values = postings[term][part]
+            if sys.byteorder == "big":
+                values = array(values.typecode, values)
+                values.byteswap()
+            yield values.tobytes()
+
+    sections = {
+        "info": [json.dumps({**info, "total_length": sum(doc_lengths)}).encode("utf-8")],
+        "term_offsets": [_typed(_offsets(encoded), "Q")],
+        "terms": encoded,
+        "postings_index": [_typed(postings_index, "Q")],
+        "postings_docs": postings_bytes(0),
+        "postings_tfs": postings_bytes(1),
+        "doc_lengths": [_typed(doc_lengths, "I")],
+        "doc_offsets": [_typed(docs_offsets, "Q")],
+        "docs": None, # streamed from docs_file
+        "id_offsets": [_typed(_offsets(encoded_ids), "Q")],
+        "ids": encoded_ids,
+        "id_docs": [_typed(id_order, "I")],
+    }
+    with open(path, "wb") as out:
+        out.write(b"\0" * _HEADER.size)
+        layout = []
+        for name in SECTIONS:
+            out.write(b"\0" * (-out.tell() % 8))
+            start = out.tell()
+            if name == "docs":
+                docs_file.seek(0)
+                while True:
+                    chunk = docs_file.read(1 << 20)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+            else:
+                for chunk in sections[name]:
+                    out.write(chunk)
+            layout += [start, out.tell() - start]
+        out.seek(0)
+        out.write(_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(doc_lengths), len(terms), 0, sum(doc_lengths), *layout))
+
+
+class MappedBM25Index:
+    """BM25 over an index file opened with mmap; scores match BM25Index on the same corpus."""
+
+    def __init__(self, path: str, tokenizer: Callable[[str], List[str]], k1: float = 1.5, b: float = 0.75):
+        if sys.byteorder != "little":
+            raise IndexFormatError("Index files can only be mapped on little-endian hosts")
+        self.path = path
+        self.tokenizer = tokenizer
+        self.k1 = k1
+        self.b = b
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < _HEADER.size:
+            raise IndexFormatError(f"{path} is too short to be a knowledge index")
+        magic, version, self.num_docs, self.num_terms, _, total_length, *layout = _HEADER.unpack_from(self._map)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise IndexFormatError(f"{path} is not a version {INDEX_VERSION} knowledge index")
+        self._view = view = memoryview(self._map)
+        self._sections = {name: view[layout[2 * i]:layout[2 * i] + layout[2 * i + 1]] for i, name in enumerate(SECTIONS)}
+        self.info = json.loads(bytes(self._sections["info"]))
+        self._term_offsets = self._sections["term_offsets"].cast("Q")
+        self._terms = self._sections["terms"]
+        self._postings_index = self._sections["postings_index"].cast("Q")
+        self._postings_docs = self._sections["postings_docs"].cast("I")
+        self._postings_tfs = self._sections["postings_tfs"].cast("H")
+        self._doc_lengths = self._sections["doc_lengths"].cast("I")
+        self._doc_offsets = self._sections["doc_offsets"].cast("Q")
+        self._docs = self._sections["docs"]
+        self._id_offsets = self._sections["id_offsets"].cast("Q")
+        self._ids = self._sections["ids"]
+        self._id_docs = self._sections["id_docs"].cast("I")
+        self.total_length = total_length
+        self.avg_doc_length = total_length / self.num_docs if self.num_docs else 0.0
+
+    def __len__(self) -> int:
+        return self.num_docs
+
+    @staticmethod
+    def _find(offsets: memoryview, blob: memoryview, count: int, value: str) -> Optional[int]:
+        """Binary search of a sorted string table"""
+        key = value.encode("utf-8")
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if bytes(blob[offsets[middle]:offsets[middle + 1]]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < count and bytes(blob[offsets[low]:offsets[low + 1]]) == key:
+            return low
+        return None
+
+    def term_id(self, term: str) -> Optional[int]:
+        return self._find(self._term_offsets, self._terms, self.num_terms, term)
+
+    def doc_freq(self, term_id: int) -> int:
+        return self._postings_index[term_id + 1] - self._postings_index[term_id]
+
+    def doc_index(self, entry_id: str) -> Optional[int]:
+        position = self._find(self._id_offsets, self._ids, self.num_docs, entry_id)
+        return None if position is None else self._id_docs[position]
+
+    def doc_length(self, doc_idx: int) -> int:
+        return self._doc_lengths[doc_idx]
+
+    def term_postings(self, term: str) -> Iterable[Tuple[int, int]]:
+        term_id = self.term_id(term)
+        if term_id is None:
+            return ()
+        start, end = self._postings_index[term_id], self._postings_index[term_id + 1]
+        return zip(self._postings_docs[start:end], self._postings_tfs[start:end])
+
+    def term_doc_freq(self, term: str) -> int:
+        term_id = self.term_id(term)
+        return 0 if term_id is None else self.doc_freq(term_id)
+
+    def length_norm(self, doc_idx: int) -> float:
+        if not self.avg_doc_length:
+            return self.k1
+        return self.k1 * (1 - self.b + self.b * (self._doc_lengths[doc_idx] / self.avg_doc_length))
+
+    def score(self, query: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        for term, qtf in Counter(self.tokenizer(query)).items():
+            term_id = self.term_id(term)
+            if term_id is None:
+                continue
+            idf = bm25_idf(self.num_docs, self.doc_freq(term_id))
+            start, end = self._postings_index[term_id], self._postings_index[term_id + 1]
+            for doc_idx, tf in zip(self._postings_docs[start:end], self._postings_tfs[start:end]):
+                contribution = idf * (tf * (self.k1 + 1)) / (tf + self.length_norm(doc_idx))
+                scores[doc_idx] = scores.get(doc_idx, 0.0) + qtf * contribution
+        return scores
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[float, Dict]]:
+        scores = self.score(query)
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(score, self.entry(doc_idx)) for doc_idx, score in best]
+
+    def entry(self, doc_idx: int) -> Dict:
+        return json.loads(bytes(self._docs[self._doc_offsets[doc_idx]:self._doc_offsets[doc_idx + 1]]))
+
+    def close(self):
+        for view in (self._term_offsets, self._postings_index, self._postings_docs, self._postings_tfs, self._doc_lengths, self._doc_offsets,
+                     self._id_offsets, self._id_docs, *self._sections.values(), self._view):
+            view.release()
+        self._map.close()
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import List, Literal, Optional
+
+from analytics import bucket_summary
+from models import RollupBucket
+from repositories import SessionRepository, get_session_repository
+
+router = APIRouter(
+    prefix="/analytics",
+    tags=["Analytics"]
+)
+
+# Rollups are maintained by the storage layer on every session write, so each endpoint
+# reads one document (or row group) per bucket instead of scanning sessions.
+
+# --- Endpoint for Overall Totals, Status Distribution and Completion Rate ---
+@router.get("/summary", response_model=RollupBucket)
+def get_summary(repo: SessionRepository = Depends(get_session_repository)):
+    try:
+        buckets = repo.list_rollups("all")
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    statuses = buckets[0][1] if buckets else {}
+    return bucket_summary("all", statuses)
+
+# --- Endpoint for Sessions per Therapy, Practitioner or Day ---
+@router.get("/sessions/{dimension}", response_model=List[RollupBucket])
+def get_session_rollups(
+    dimension: Literal["therapy", "practitioner", "day"],
+    key_from: Optional[str] = Query(None, description="First bucket key (inclusive), e.g. a YYYY-MM-DD day"),
+    key_to: Optional[str] = Query(None, description="Last bucket key (inclusive)"),
+    repo: SessionRepository = Depends(get_session_repository)
+):
+    """
+    One bucket per therapy, practitioner or day, with its status distribution and completion rate.
+    Days come back in date order; therapies and practitioners busiest first.
+    """
+    try:
+        buckets = [bucket_summary(key, statuses) for key, statuses in repo.list_rollups(dimension, key_from, key_to)]
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    if dimension != "day":
+        buckets.sort(key=lambda bucket: bucket["total"], reverse=True)
+    return buckets
@@ -3,26 +3,27 @@ AyurvedaBot API Router - AI-powered Ayurvedic chatbot integration
 Uses Mistral AI via OpenAI API wrapper with a comprehensive Ayurvedic knowledge base
 """
 import os
-import re
+import hmac
+import asyncio
+import hashlib
 import datetime
-from collections import Counter
-from typing import List, Dict, Optional
+from typing import Any, Awaitable, Callable, List, Dict, Optional
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from openai import OpenAI
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
-
-# --- Configure OpenAI client to use Mistral API ---
-MISTRAL_API_KEY = os.environ.get("MISTRAL_API_KEY")
-if MISTRAL_API_KEY:
-    client = OpenAI(api_key=MISTRAL_API_KEY, base_url="https://api.mistral.ai/v1")
-else:
-    client = None
-    print("WARNING: MISTRAL_API_KEY environment variable not found.")
+import llm_client
+from chat_history import CompactHistory, compact_history, log_prompt_size
+from conversation_store import conversation_store
+from llm_client import LLMSaturatedError
+from metrics import stage_timer
+from response_cache import make_cache_key, response_cache
+from retrieval import BM25Index, IndexFormatError, MappedBM25Index, preprocess_text
+from sse import SSE_MEDIA_TYPE, sse_event
+from knowledge_base import KnowledgeBase, SourceWatcher
+import index_knowledge
 
 # --- FastAPI router ---
 router = APIRouter(prefix="/chatbot", tags=["Chatbot"])
@@ -30,7 +31,17 @@ router = APIRouter(prefix="/chatbot", tags=["Chatbot"])
 # --- Pydantic models ---
 class ChatRequest(BaseModel):
     message: str
-    conversation_history: Optional[List[Dict[str, str]]] = []
+    conversation_history: Optional[List[Dict[str, str]]] = [] # stateless clients; see /chatbot/conversations
+
+class ConversationMessage(BaseModel):
+    message: str
+
+class Conversation(BaseModel):
+    id: str
+    createdAt: float
+    updatedAt: float
+    turns: List[Dict[str, str]] = []
+    dropped: int = 0 # oldest turns no longer stored (CONVERSATION_MAX_TURNS)
 
 class ChatResponse(BaseModel):
     response: str
@@ -38,6 +49,15 @@ class ChatResponse(BaseModel):
     formatted_html: Optional[str] = None
     plain_text: Optional[str] = None
 
+class KnowledgeEntryUpdate(BaseModel):
+    content: str
+    metadata: Optional[Dict[str, Any]] = None # source and category default to "Admin" / "General"
+
+class KnowledgeEntry(BaseModel):
+    id: str
+    content: str
+    metadata: Dict[str, Any]
+
 # --- Ayurvedic Knowledge Base ---
 AYURVEDIC_KNOWLEDGE = [
     {
@@ -57,21 +77,54 @@ AYURVEDIC_KNOWLEDGE = [
     }
 ]
 
-# --- Helper Functions ---
-def preprocess_text(text: str) -> List[str]:
-    stop_words = {'the', 'a', 'an', 'is', 'in', 'on', 'of', 'for', 'to', 'and', 'with', 'was', 'are'}
-    return [w for w in re.findall(r'\b\w+\b', text.lower()) if w not in stop_words and len(w) > 2]
+# --- Knowledge index ---
+# A prebuilt index file (python index_knowledge.py knowledge/) is memory-mapped, so startup
+# and per-worker memory do not grow with the corpus; without one, the entries above are
+# tokenized in memory at import. Each query then only walks its own postings lists.
+KNOWLEDGE_INDEX_PATH = os.getenv("KNOWLEDGE_INDEX_PATH", "knowledge.idx")
+
+def load_knowledge_index():
+    if os.path.exists(KNOWLEDGE_INDEX_PATH):
+        try:
+            index = MappedBM25Index(KNOWLEDGE_INDEX_PATH, tokenizer=preprocess_text)
+            print(f"Knowledge index mapped from {KNOWLEDGE_INDEX_PATH} ({len(index)} entries)")
+            return index
+        except (IndexFormatError, OSError, ValueError) as e:
+            print(f"WARNING: cannot map {KNOWLEDGE_INDEX_PATH}, using the built-in entries: {e}")
+    return BM25Index(AYURVEDIC_KNOWLEDGE, tokenizer=preprocess_text)
+
+# Entries can be added, replaced or removed at runtime (admin endpoints below, or the
+# source directory watch); each change publishes a new snapshot that queries pick up
+knowledge_base = KnowledgeBase(load_knowledge_index())
+
+KNOWLEDGE_ADMIN_TOKEN = os.getenv("KNOWLEDGE_ADMIN_TOKEN", "") # admin endpoints are off without one
+KNOWLEDGE_WATCH_DIR = os.getenv("KNOWLEDGE_WATCH_DIR", "") # e.g. "knowledge"
+KNOWLEDGE_WATCH_SECONDS = float(os.getenv("KNOWLEDGE_WATCH_SECONDS", 2))
+
+def start_knowledge_watch() -> Optional[Callable[[], None]]:
+    """Apply edits under KNOWLEDGE_WATCH_DIR as they happen; returns a stop function. Called from the app lifespan."""
+    if not KNOWLEDGE_WATCH_DIR:
+        return None
+    # Chunk like the build did, so unchanged sources map to the same entries
+    chunk_words = getattr(knowledge_base.snapshot.base, "info", {}).get("chunk_words", 200)
+    watcher = SourceWatcher(
+        knowledge_base,
+        KNOWLEDGE_WATCH_DIR,
+        read_file=lambda path: list(index_knowledge.read_entries(path, KNOWLEDGE_WATCH_DIR, chunk_words)),
+        list_files=index_knowledge.source_files,
+        interval_seconds=KNOWLEDGE_WATCH_SECONDS,
+    )
+    stop = watcher.start()
+    print(f"Watching {KNOWLEDGE_WATCH_DIR} for knowledge changes every {KNOWLEDGE_WATCH_SECONDS:g}s")
+    return stop
 
+# --- Helper Functions ---
+@stage_timer("retrieval")
 def find_relevant_knowledge(query: str, top_k: int = 3) -> List[Dict]:
-    query_vector = Counter(preprocess_text(query))
-    scored = []
-    for entry in AYURVEDIC_KNOWLEDGE:
-        text_vector = Counter(preprocess_text(entry["content"]))
-        score = sum((query_vector & text_vector).values())
-        scored.append((score, entry))
-    scored.sort(reverse=True, key=lambda x: x[0])
-    return [entry for score, entry in scored[:top_k] if score > 0] or AYURVEDIC_KNOWLEDGE[:top_k]
+    snapshot = knowledge_base.snapshot # one consistent version for the whole query
+    return [entry for score, entry in snapshot.search(query, top_k)] or snapshot.first(top_k)
 
+@stage_timer("html_format")
 def format_ayurvedic_response_html(response_text: str, user_query: str, sources: Optional[List[Dict]] = None) -> str:
     """Generate Ayurvedic-themed HTML response safely"""
     safe_text = response_text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
@@ -103,40 +156,69 @@ def format_ayurvedic_response_html(response_text: str, user_query: str, sources:
     return html
 
 # --- Core AI Generation using Mistral ---
-def generate_ai_response(query: str, relevant_knowledge: List[Dict], conversation_history: Optional[List[Dict[str,str]]] = None) -> Dict[str,str]:
-    if not client:
-        return {"formatted_html":"API key not configured.","plain_text":"API key not configured."}
+FALLBACK_TEXT = "Sorry, could not process your request. Please try again."
 
+def build_messages(query: str, relevant_knowledge: List[Dict], history: CompactHistory) -> List[Dict[str,str]]:
     messages = [{"role":"system","content":"You are an expert Ayurvedic practitioner. Answer precisely using the provided context. Mention diet, lifestyle, herbs, and dosha balance. Highlight when medical advice is needed."}]
-    if conversation_history:
-        for msg in conversation_history:
-            role = "assistant" if msg.get("role")=="model" else "user"
-            messages.append({"role":role,"content":msg.get("content","")})
+    if history.summary:
+        messages.append({"role":"system","content":f"Summary of the earlier conversation:\n{history.summary}"})
+    messages.extend(history.recent)
     context_text = "\n\n".join([f"**{k['metadata']['category']}**: {k['content']}" for k in relevant_knowledge])
     messages.append({"role":"user","content":f"CONTEXT:\n{context_text}\n\nQUESTION: {query}"})
+    return messages
+
+async def prepare_messages(query: str, relevant_knowledge: List[Dict], conversation_history: Optional[List[Dict[str,str]]] = None, history_key: Optional[str] = None, history_offset: int = 0) -> List[Dict[str,str]]:
+    """Prompt with the history compacted to CHAT_HISTORY_TOKEN_BUDGET, so its size stays bounded however long the chat"""
+    history = await compact_history(conversation_history, key=history_key, offset=history_offset)
+    messages = build_messages(query, relevant_knowledge, history)
+    log_prompt_size(messages, history)
+    return messages
+
+def response_cache_key(query: str, relevant_knowledge: List[Dict], conversation_history: Optional[List[Dict[str,str]]] = None) -> str:
+    # Entry content is part of the key, so answers built on an entry that was edited since are not reused
+    knowledge_keys = [f"{k['id']}:{hashlib.sha1(k['content'].encode('utf-8')).hexdigest()[:12]}" for k in relevant_knowledge]
+    return make_cache_key(" ".join(preprocess_text(query)), knowledge_keys, conversation_history)
+
+async def generate_ai_response(query: str, relevant_knowledge: List[Dict], conversation_history: Optional[List[Dict[str,str]]] = None, cache_key: Optional[str] = None, history_key: Optional[str] = None, history_offset: int = 0) -> Dict[str,str]:
+    if not llm_client.client:
+        return {"formatted_html":"API key not configured.","plain_text":"API key not configured."}
 
     try:
-        resp = client.chat.completions.create(
-            model="mistral-small",
-            messages=messages,
-            temperature=0.6,
-            max_tokens=500
-        )
-        text = resp.choices[0].message.content.strip()
+        messages = await prepare_messages(query, relevant_knowledge, conversation_history, history_key=history_key, history_offset=history_offset)
+        text = await llm_client.complete_chat(messages, temperature=0.6, max_tokens=500)
+        if cache_key:
+            # Only real answers are cached; the HTML is cheap to rebuild and carries today's date
+            await response_cache.set(cache_key, {"plain_text": text})
         html = format_ayurvedic_response_html(text, query, relevant_knowledge)
         return {"formatted_html":html,"plain_text":text}
+    except LLMSaturatedError:
+        raise
     except Exception as e:
         print(f"[ERROR] AI generation failed: {e}")
-        fallback = "Sorry, could not process your request. Please try again."
-        return {"formatted_html":format_ayurvedic_response_html(fallback, query, []),"plain_text":fallback}
+        return {"formatted_html":format_ayurvedic_response_html(FALLBACK_TEXT, query, []),"plain_text":FALLBACK_TEXT}
+
+def service_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="AI service is busy. Please try again shortly.",
+        headers={"Retry-After": str(llm_client.LLM_RETRY_AFTER_SECONDS)}
+    )
 
 # --- API Routes ---
-@router.post("/chat", response_model=ChatResponse)
-async def chat_with_ayurbot(request: ChatRequest):
-    if not client:
-        raise HTTPException(status_code=503, detail="AI service unavailable. API key not configured.")
-    relevant = find_relevant_knowledge(request.message)
-    ai_resp = generate_ai_response(request.message, relevant, request.conversation_history)
+async def chat_reply(message: str, conversation_history: Optional[List[Dict[str,str]]], history_key: Optional[str] = None, history_offset: int = 0) -> ChatResponse:
+    relevant = find_relevant_knowledge(message)
+    cache_key = response_cache_key(message, relevant, conversation_history)
+    cached = await response_cache.get(cache_key)
+    if cached:
+        ai_resp = {
+            "plain_text": cached["plain_text"],
+            "formatted_html": format_ayurvedic_response_html(cached["plain_text"], message, relevant)
+        }
+    else:
+        try:
+            ai_resp = await generate_ai_response(message, relevant, conversation_history, cache_key=cache_key, history_key=history_key, history_offset=history_offset)
+        except LLMSaturatedError:
+            raise service_busy()
     sources = list({entry["metadata"]["source"] for entry in relevant})
     return ChatResponse(
         response=ai_resp["plain_text"],
@@ -145,6 +227,171 @@ async def chat_with_ayurbot(request: ChatRequest):
         plain_text=ai_resp["plain_text"]
     )
 
+async def stream_reply(message: str, conversation_history: Optional[List[Dict[str,str]]], history_key: Optional[str] = None, history_offset: int = 0,
+                       on_answer: Optional[Callable[[str], Awaitable[None]]] = None) -> StreamingResponse:
+    relevant = find_relevant_knowledge(message)
+    sources = list({entry["metadata"]["source"] for entry in relevant})
+    cache_key = response_cache_key(message, relevant, conversation_history)
+    cached = await response_cache.get(cache_key)
+    deltas = None
+    if not cached:
+        try:
+            messages = await prepare_messages(message, relevant, conversation_history, history_key=history_key, history_offset=history_offset)
+            # Claimed before the response starts, so saturation is still a plain 503
+            deltas = await llm_client.stream_chat(messages, temperature=0.6, max_tokens=500)
+        except LLMSaturatedError:
+            raise service_busy()
+        except Exception as e:
+            print(f"[ERROR] AI streaming failed to start: {e}")
+
+    async def events():
+        if cached:
+            # Cache hit: the whole answer goes out as a single token
+            text = cached["plain_text"]
+            yield sse_event("sources", {"sources": sources})
+            yield sse_event("token", {"text": text})
+            if on_answer:
+                await on_answer(text)
+            yield sse_event("done", {"plain_text": text, "formatted_html": format_ayurvedic_response_html(text, message, relevant)})
+            return
+        if deltas is None:
+            yield sse_event("sources", {"sources": sources})
+            yield sse_event("error", {"detail": FALLBACK_TEXT})
+            yield sse_event("done", {"plain_text": FALLBACK_TEXT, "formatted_html": format_ayurvedic_response_html(FALLBACK_TEXT, message, [])})
+            return
+        parts = []
+        answered = False
+        try:
+            yield sse_event("sources", {"sources": sources})
+            async for delta in deltas:
+                parts.append(delta)
+                yield sse_event("token", {"text": delta})
+            text = "".join(parts).strip()
+            await response_cache.set(cache_key, {"plain_text": text})
+            html = format_ayurvedic_response_html(text, message, relevant)
+            answered = True
+        except Exception as e:
+            print(f"[ERROR] AI streaming failed: {e}")
+            yield sse_event("error", {"detail": FALLBACK_TEXT})
+            text = FALLBACK_TEXT
+            html = format_ayurvedic_response_html(FALLBACK_TEXT, message, [])
+        finally:
+            # Releases the LLM slot even if the client disconnects mid-stream
+            await deltas.aclose()
+        if answered and on_answer:
+            # Stored before `done`, so a follow-up sent right after it already sees this turn
+            await on_answer(text)
+        yield sse_event("done", {"plain_text": text, "formatted_html": html})
+
+    return StreamingResponse(
+        events(),
+        media_type=SSE_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # events() never runs its finally if the client leaves before the first frame;
+        # closing again after a normal finish is a no-op
+        background=BackgroundTask(deltas.aclose) if deltas is not None else None,
+    )
+
+def require_llm():
+    if not llm_client.client:
+        raise HTTPException(status_code=503, detail="AI service unavailable. API key not configured.")
+
+@router.post("/chat", response_model=ChatResponse, dependencies=[Depends(require_llm)])
+async def chat_with_ayurbot(request: ChatRequest):
+    return await chat_reply(request.message, request.conversation_history)
+
+@router.post("/chat/stream", dependencies=[Depends(require_llm)])
+async def stream_chat_with_ayurbot(request: ChatRequest):
+    """
+    Stream the answer as Server-Sent Events:
+    `sources` first, then one `token` event per model delta, then `done` with the
+    assembled `plain_text` and `formatted_html` (or `error` followed by a fallback `done`).
+    """
+    return await stream_reply(request.message, request.conversation_history)
+
+# --- Conversations ---
+# The transcript is kept on the server (conversation_store.py): clients create a conversation
+# once, then send only each new message. Its ID also keys the history summary (chat_history.py),
+# whose positions are offset by the turns the store has dropped.
+async def load_conversation(conversation_id: str) -> Dict:
+    conversation = await asyncio.to_thread(conversation_store.get, conversation_id)
+    if conversation is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found or expired")
+    return conversation
+
+def turn_recorder(conversation_id: str, message: str) -> Callable[[str], Awaitable[None]]:
+    """Appends the question and its answer once the answer is complete; failed answers are not kept"""
+    async def record(text: str):
+        turns = [{"role": "user", "content": message}, {"role": "assistant", "content": text}]
+        await asyncio.to_thread(conversation_store.append, conversation_id, turns)
+    return record
+
+@router.post("/conversations", response_model=Conversation, status_code=status.HTTP_201_CREATED)
+async def create_conversation():
+    return await asyncio.to_thread(conversation_store.create)
+
+@router.get("/conversations/{conversation_id}", response_model=Conversation)
+async def get_conversation(conversation_id: str):
+    return await load_conversation(conversation_id)
+
+@router.delete("/conversations/{conversation_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_conversation(conversation_id: str):
+    if not await asyncio.to_thread(conversation_store.delete, conversation_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found or expired")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@router.post("/conversations/{conversation_id}/messages", response_model=ChatResponse, dependencies=[Depends(require_llm)])
+async def send_conversation_message(conversation_id: str, request: ConversationMessage):
+    conversation = await load_conversation(conversation_id)
+    response = await chat_reply(request.message, conversation["turns"], history_key=conversation_id,
+                                history_offset=conversation.get("dropped", 0))
+    if response.plain_text != FALLBACK_TEXT:
+        await turn_recorder(conversation_id, request.message)(response.plain_text)
+    return response
+
+@router.post("/conversations/{conversation_id}/messages/stream", dependencies=[Depends(require_llm)])
+async def stream_conversation_message(conversation_id: str, request: ConversationMessage):
+    """Same events as /chat/stream; the turn is stored just before `done`"""
+    conversation = await load_conversation(conversation_id)
+    return await stream_reply(request.message, conversation["turns"], history_key=conversation_id,
+                              history_offset=conversation.get("dropped", 0), on_answer=turn_recorder(conversation_id, request.message))
+
 @router.get("/health")
 async def chatbot_health():
-    return {"status":"healthy","knowledge_base_entries":len(AYURVEDIC_KNOWLEDGE),"api_key_configured":bool(client)}
+    return {
+        "status":"healthy",
+        "knowledge_base_entries":len(knowledge_base.snapshot),
+        "knowledge_index_version":knowledge_base.snapshot.version,
+        "api_key_configured":bool(llm_client.client),
+        "llm_in_flight":llm_client.in_flight(),
+        "llm_max_in_flight":llm_client.LLM_MAX_INFLIGHT,
+        "response_cache":response_cache.stats(),
+        "conversations":conversation_store.stats()
+    }
+
+# --- Knowledge admin ---
+# Changes apply to the worker that serves the request; with several workers, edit the
+# sources under KNOWLEDGE_WATCH_DIR instead so every worker picks them up.
+def require_knowledge_admin(x_admin_token: str = Header("")):
+    if not KNOWLEDGE_ADMIN_TOKEN or not hmac.compare_digest(x_admin_token, KNOWLEDGE_ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Knowledge admin token required")
+
+@router.get("/knowledge/{entry_id}", response_model=KnowledgeEntry, dependencies=[Depends(require_knowledge_admin)])
+async def get_knowledge_entry(entry_id: str):
+    entry = knowledge_base.snapshot.get(entry_id)
+    if entry is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Knowledge entry not found")
+    return entry
+
+@router.put("/knowledge/{entry_id}", dependencies=[Depends(require_knowledge_admin)])
+def put_knowledge_entry(entry_id: str, update: KnowledgeEntryUpdate):
+    """Add or replace one entry; only its postings and the corpus statistics are updated"""
+    metadata = {"source": "Admin", "category": "General", **(update.metadata or {})}
+    knowledge_base.upsert({"id": entry_id, "content": update.content, "metadata": metadata})
+    return knowledge_base.stats()
+
+@router.delete("/knowledge/{entry_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(require_knowledge_admin)])
+def delete_knowledge_entry(entry_id: str):
+    if not knowledge_base.remove(entry_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Knowledge entry not found")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
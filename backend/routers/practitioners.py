@@ -1,31 +1,103 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from firebase_config import db 
-from models import Practitioner
+import json
+import os
+from functools import lru_cache
+
+from datetime import date as Date
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from typing import List, Tuple
+from http_cache import CachedPayload
+from models import Availability, Practitioner
+from repositories import PractitionerRepository, StorageUnavailableError, get_practitioner_repository
+from scheduling import MINUTES_PER_DAY, ScheduleIndex, format_minutes, get_schedule_index, parse_start
 
 router = APIRouter(
     prefix="/practitioners",
     tags=["Practitioners"]
 )
 
-@router.get("/", response_model=List[Practitioner])
-def get_all_practitioners():
+# The roster changes a few times a day; the TTL only bounds staleness if a change event is missed
+PRACTITIONERS_CACHE_TTL_SECONDS = float(os.getenv("PRACTITIONERS_CACHE_TTL_SECONDS", 300))
+
+def load_practitioners_json(repo: PractitionerRepository) -> bytes:
     """
-    Retrieve all documents from the 'practitioners' collection.
+    Retrieve all documents from the 'practitioners' collection, serialized once for the cache.
     """
+    practitioners = []
+    for practitioner_data in repo.list_all():
+        practitioners.append(Practitioner(
+            id=practitioner_data['id'],
+            name=practitioner_data.get('name'),
+            userType=practitioner_data.get('userType', 'practitioner')
+        ).dict())
+    return json.dumps(practitioners, separators=(",", ":")).encode("utf-8")
+
+@lru_cache(maxsize=None)
+def get_practitioners_cache() -> CachedPayload:
+    repo = get_practitioner_repository()
+    cache = CachedPayload(lambda: load_practitioners_json(repo), PRACTITIONERS_CACHE_TTL_SECONDS)
     try:
-        practitioners = []
-        # Query the dedicated 'practitioners' collection directly
-        docs = db.collection('practitioners').stream()
-        
-        for doc in docs:
-            practitioner_data = doc.to_dict()
-            practitioners.append(Practitioner(
-                id=doc.id, 
-                name=practitioner_data.get('name'), 
-                userType=practitioner_data.get('userType', 'practitioner')
-            ))
-        
-        return practitioners
+        repo.add_change_listener(cache.invalidate)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        print(f"WARNING: practitioner change listener unavailable, relying on TTL: {e}")
+    return cache
+
+def read_roster(cache: CachedPayload) -> Tuple[bytes, str]:
+    """The cached roster JSON and its ETag, loading it if needed"""
+    try:
+        return cache.get()
+    except StorageUnavailableError:
+        raise # served as a 503 by the app's handler, like every other storage route
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/", response_model=List[Practitioner])
+def get_all_practitioners(cache: CachedPayload = Depends(get_practitioners_cache)):
+    """
+    Retrieve all practitioners. Served from the read-through cache as pre-serialized JSON.
+    The cached ETag is reused by ConditionalGetMiddleware, which answers If-None-Match with 304.
+    """
+    body, etag = read_roster(cache)
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+@router.get("/{practitioner_id}/availability", response_model=Availability, response_model_exclude_none=True)
+def get_availability(
+    practitioner_id: str,
+    date: Date = Query(..., description="Day to check, YYYY-MM-DD"),
+    duration: int = Query(60, ge=5, le=MINUTES_PER_DAY, description="Minimum free window in minutes"),
+    day_start: str = Query("09:00", description="Opening time, HH:MM"),
+    day_end: str = Query("18:00", description="Closing time, HH:MM"),
+    cache: CachedPayload = Depends(get_practitioners_cache),
+    schedule: ScheduleIndex = Depends(get_schedule_index)
+):
+    """
+    Booked sessions and free windows of at least `duration` minutes for one practitioner and day,
+    answered from the in-memory schedule index.
+    """
+    opens, closes = parse_start(date, day_start), parse_start(date, day_end)
+    if opens is None or closes is None or closes <= opens:
+        raise HTTPException(status_code=400, detail="day_start and day_end must be HH:MM with day_start < day_end")
+
+    # Sessions name the practitioner, so match on the roster name as well as the ID
+    body, _ = read_roster(cache)
+    practitioner = next((p for p in json.loads(body) if p["id"] == practitioner_id), None)
+    if practitioner is None:
+        raise HTTPException(status_code=404, detail="Practitioner not found")
+    names = {practitioner_id, practitioner.get("name") or ""}
+    resources = [("practitioner", name.strip().casefold()) for name in names if name.strip()]
+
+    busy = schedule.busy(resources, opens, closes)
+    free, cursor = [], opens
+    for start, end, _ in busy:
+        if start - cursor >= duration:
+            free.append((cursor, start))
+        cursor = max(cursor, end)
+    if closes - cursor >= duration:
+        free.append((cursor, closes))
+
+    return {
+        "practitionerId": practitioner_id,
+        "date": date.isoformat(),
+        "busy": [{"start": format_minutes(start), "end": format_minutes(end), "sessionId": session_id} for start, end, session_id in busy],
+        "free": [{"start": format_minutes(start), "end": format_minutes(end)} for start, end in free],
+    }
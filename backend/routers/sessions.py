@@ -1,10 +1,26 @@
-from fastapi import APIRouter, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from typing import List, Literal, Optional
+from pydantic import ValidationError
 
 # --- CORRECTED IMPORTS ---
 # Use .. to go up one directory to find the files
-from models import Session, SessionCreate, SessionUpdate
-from firebase_config import sessions_collection
+from models import (
+    Session, SessionBase, SessionBulkRequest, SessionBulkResult, SessionCreate,
+    SessionSummary, SessionUpdate
+)
+from repositories import (
+    BatchWrite, InvalidCursorError, NotFoundError, SessionRepository, WriteConflictError,
+    get_session_repository
+)
+from scheduling import (
+    ScheduleConflictError, ScheduleIndex, conflict_detail, get_schedule_index, session_resources,
+    touches_schedule
+)
+from session_feed import SessionFeed, get_session_feed
+from sse import SSE_MEDIA_TYPE
+from session_time import normalized_fields, touches_time
+from metrics import stage_timer
 
 # Create a router object
 router = APIRouter(
@@ -13,59 +29,262 @@ router = APIRouter(
 )
 
 # --- Endpoint to Create a New Session ---
+# Rejected with 409 if the practitioner or the room is already booked for an overlapping time.
 @router.post("/", response_model=Session, status_code=status.HTTP_201_CREATED)
-def create_session(session_data: SessionCreate):
+def create_session(
+    session_data: SessionCreate,
+    repo: SessionRepository = Depends(get_session_repository),
+    schedule: ScheduleIndex = Depends(get_schedule_index)
+):
     try:
         data = session_data.dict()
-        update_time, doc_ref = sessions_collection.add(data)
-        return Session(id=doc_ref.id, **data)
+        with schedule.reserve(data):
+            with stage_timer("storage_write"):
+                session_id = repo.create(data)
+            schedule.upsert(session_id, data)
+        return Session(id=session_id, **data)
+    except ScheduleConflictError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=conflict_detail(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
+# --- Endpoint to Create, Update or Delete Many Sessions at Once ---
+BULK_MAX_OPERATIONS = 2000
+
+@router.post("/bulk", response_model=List[SessionBulkResult])
+def bulk_sessions(
+    request: SessionBulkRequest,
+    repo: SessionRepository = Depends(get_session_repository),
+    schedule: ScheduleIndex = Depends(get_schedule_index)
+):
+    """
+    Apply a list of create/update/delete operations using batched writes.
+    Each chunk of up to 500 writes commits atomically; a failed chunk marks all of its
+    items as failed and does not affect the others. Results come back in request order.
+    Items that would double-book a practitioner or room, against stored sessions or earlier
+    items of the same request, fail with 409. Every practitioner and room the request books
+    stays locked from that check until the writes are committed and indexed.
+    """
+    if len(request.operations) > BULK_MAX_OPERATIONS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {BULK_MAX_OPERATIONS} operations per request")
+
+    results = [None] * len(request.operations)
+    validated = [] # (index, write, session as booked or None) for every item that passed validation
+    for index, operation in enumerate(request.operations):
+        try:
+            booked = None
+            if operation.op == "create":
+                data = SessionCreate(**(operation.data or {})).dict()
+                booked = data
+            elif not operation.id:
+                raise ValueError(f"'id' is required for {operation.op}")
+            elif operation.op == "update":
+                data = SessionUpdate(**(operation.data or {})).dict(exclude_unset=True)
+                if not data:
+                    raise ValueError("No update data provided")
+                if touches_schedule(data):
+                    # As for a single update: the index holds the current slot, unindexed sessions are read
+                    current = schedule.current(operation.id)
+                    if current is None:
+                        with stage_timer("storage_read"):
+                            current = repo.get(operation.id)
+                    if current is None:
+                        raise NotFoundError(operation.id)
+                    if touches_time(data):
+                        data.update(normalized_fields({**current, **data}))
+                    booked = {**current, **data}
+            else:
+                data = None
+            validated.append((index, BatchWrite(operation.op, operation.id if operation.op != "create" else None, data), booked))
+        except (ValidationError, ValueError) as e:
+            results[index] = SessionBulkResult(index=index, op=operation.op, id=operation.id, status=status.HTTP_422_UNPROCESSABLE_ENTITY, error=str(e))
+        except NotFoundError:
+            results[index] = SessionBulkResult(index=index, op=operation.op, id=operation.id, status=status.HTTP_404_NOT_FOUND, error="Session not found")
+
+    outcome = {
+        "create": status.HTTP_201_CREATED,
+        "update": status.HTTP_200_OK,
+        "delete": status.HTTP_204_NO_CONTENT,
+    }
+    resources = [resource for _, _, booked in validated if booked is not None for resource in session_resources(booked)]
+    with schedule.hold(resources):
+        indexes, writes = [], []
+        pending = ScheduleIndex() # slots taken by earlier items of this request
+        for index, write, booked in validated:
+            if booked is not None:
+                try:
+                    check_bulk_schedule(schedule, pending, write.id or f"#{index}", booked)
+                except ScheduleConflictError as e:
+                    results[index] = SessionBulkResult(index=index, op=write.op, id=write.id, status=status.HTTP_409_CONFLICT, error=conflict_detail(e)["message"])
+                    continue
+            indexes.append(index)
+            writes.append(write)
+
+        with stage_timer("storage_write"):
+            written = repo.write_batch(writes)
+        for index, write, result in zip(indexes, writes, written):
+            if result.error is None:
+                results[index] = SessionBulkResult(index=index, op=write.op, id=result.id, status=outcome[write.op])
+                if write.op == "delete":
+                    schedule.remove(result.id)
+                elif write.op == "create" or touches_schedule(write.data):
+                    current = schedule.current(result.id) or {}
+                    schedule.upsert(result.id, {**current, **write.data})
+            else:
+                # An update or delete of a missing document aborts its whole chunk
+                if isinstance(result.error, NotFoundError):
+                    code = status.HTTP_404_NOT_FOUND
+                elif isinstance(result.error, WriteConflictError):
+                    code = status.HTTP_409_CONFLICT
+                else:
+                    code = status.HTTP_500_INTERNAL_SERVER_ERROR
+                results[index] = SessionBulkResult(index=index, op=write.op, id=result.id, status=code, error=f"Batch aborted: {result.error}")
+
+    return results
+
+def check_bulk_schedule(schedule: ScheduleIndex, pending: ScheduleIndex, key: str, session: dict):
+    """Conflicts with stored sessions or with earlier items of the same bulk request"""
+    conflicts = schedule.conflicts(session, exclude_id=key) + pending.conflicts(session, exclude_id=key)
+    if conflicts:
+        raise ScheduleConflictError(conflicts)
+    pending.upsert(key, session)
+
 # --- Endpoint to Get All Sessions for a Patient ---
-@router.get("/{patient_id}", response_model=List[Session])
-def get_all_sessions(patient_id: str):
+# Paging, filters and projection are pushed down into the storage query. The cursor for
+# the next page (the last returned document ID) is sent in the X-Next-Cursor header.
+@router.get("/{patient_id}", response_model=List[SessionSummary], response_model_exclude_unset=True)
+def get_all_sessions(
+    patient_id: str,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Maximum number of sessions to return"),
+    start_after: Optional[str] = Query(None, description="Cursor from a previous page's X-Next-Cursor header"),
+    status_filter: Optional[str] = Query(None, alias="status", description="Only sessions with this status"),
+    date_from: Optional[str] = Query(None, description="Earliest date (inclusive), YYYY-MM-DD"),
+    date_to: Optional[str] = Query(None, description="Latest date (inclusive), YYYY-MM-DD"),
+    order_by: Optional[Literal["date", "startsAt"]] = Query(None, description="Sort field; startsAt orders by day and time (date_from/date_to then apply to it)"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. therapy,date,time,status"),
+    repo: SessionRepository = Depends(get_session_repository)
+):
+    projection = None
+    if fields:
+        projection = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = set(projection) - set(SessionBase.model_fields)
+        if unknown:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+
     try:
-        sessions = []
-        docs = sessions_collection.where('patientId', '==', patient_id).stream()
-        for doc in docs:
-            session_data = doc.to_dict()
-            sessions.append(Session(id=doc.id, **session_data))
-        return sessions
+        with stage_timer("storage_query"):
+            sessions, next_cursor = repo.list_for_patient(
+                patient_id,
+                limit=limit,
+                start_after=start_after,
+                status=status_filter,
+                date_from=date_from,
+                date_to=date_to,
+                order_by=order_by,
+                fields=projection
+            )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        if projection:
+            return sessions
+        return [Session(**session_data).dict() for session_data in sessions]
+    except InvalidCursorError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
+# --- Endpoint to Follow a Patient's Sessions in Real Time ---
+# Server-Sent Events: added/modified/removed frames as sessions change. All clients share
+# one storage watch; a client that falls too far behind, or is connected when the watch misses
+# changes, gets a "resync" frame and should refetch.
+@router.get("/{patient_id}/events")
+async def session_events(patient_id: str, feed: SessionFeed = Depends(get_session_feed)):
+    async def events():
+        # Subscribed inside the stream so the finally block always runs for it
+        subscription = feed.subscribe(patient_id)
+        try:
+            async for frame in subscription.events():
+                yield frame
+        finally:
+            feed.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type=SSE_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # --- Endpoint to Update (Reschedule) a Session ---
-@router.put("/{session_id}", response_model=Session)
-def update_session(session_id: str, session_update: SessionUpdate):
+# The storage update fails on a missing document, so no existence read is needed unless the
+# change moves the session between analytics buckets; the document read then is reused for
+# the response. `?return=minimal` skips re-reading the document and answers 204.
+# Moving a session onto a slot where its practitioner or room is booked is rejected with 409.
+@router.put("/{session_id}", response_model=Session, responses={204: {"description": "Updated (return=minimal)"}})
+def update_session(
+    session_id: str,
+    session_update: SessionUpdate,
+    return_mode: Literal["representation", "minimal"] = Query("representation", alias="return"),
+    repo: SessionRepository = Depends(get_session_repository),
+    schedule: ScheduleIndex = Depends(get_schedule_index)
+):
+    update_data = session_update.dict(exclude_unset=True)
+    if not update_data:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No update data provided")
+
     try:
-        doc_ref = sessions_collection.document(session_id)
-        if not doc_ref.get().exists:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
-        
-        update_data = session_update.dict(exclude_unset=True)
-        if not update_data:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No update data provided")
-            
-        doc_ref.update(update_data)
-        updated_doc = doc_ref.get()
-        return Session(id=updated_doc.id, **updated_doc.to_dict())
+        if touches_schedule(update_data):
+            # The index already holds the current slot; only unindexed sessions need a read
+            current = schedule.current(session_id)
+            if current is None:
+                with stage_timer("storage_read"):
+                    current = repo.get(session_id)
+            if current is None:
+                raise NotFoundError(session_id)
+            if touches_time(update_data):
+                # Keep the typed startsAt/durationMinutes in step with the strings
+                update_data.update(normalized_fields({**current, **update_data}))
+            rescheduled = {**current, **update_data}
+            with schedule.reserve(rescheduled, session_id):
+                with stage_timer("storage_write"):
+                    updated = repo.update(session_id, update_data)
+                schedule.upsert(session_id, rescheduled)
+        else:
+            with stage_timer("storage_write"):
+                updated = repo.update(session_id, update_data)
+        if return_mode == "minimal":
+            return Response(status_code=status.HTTP_204_NO_CONTENT, headers={"Preference-Applied": "return=minimal"})
+        if updated is None:
+            with stage_timer("storage_read"):
+                updated = repo.get(session_id)
+        return Session(**updated)
+    except NotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+    except ScheduleConflictError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=conflict_detail(e))
+    except WriteConflictError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Session is being changed concurrently; retry")
     except Exception as e:
-        if isinstance(e, HTTPException):
-            raise e
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 # --- Endpoint to Delete (Cancel) a Session ---
+# The delete and the decrements of the session's analytics buckets commit together. The
+# storage layer takes the buckets from the sessions it has already seen, and only reads the
+# session first when it has not seen it or it changed elsewhere since.
 @router.delete("/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_session(session_id: str):
+def delete_session(
+    session_id: str,
+    repo: SessionRepository = Depends(get_session_repository),
+    schedule: ScheduleIndex = Depends(get_schedule_index)
+):
     try:
-        doc_ref = sessions_collection.document(session_id)
-        if not doc_ref.get().exists:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
-            
-        doc_ref.delete()
+        with stage_timer("storage_write"):
+            repo.delete(session_id)
+        schedule.remove(session_id)
         return
+    except NotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+    except WriteConflictError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Session is being changed concurrently; retry")
     except Exception as e:
-        if isinstance(e, HTTPException):
-            raise e
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
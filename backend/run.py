@@ -1,22 +1,68 @@
 #!/usr/bin/env python3
 """
 Entry point to run the FastAPI backend server
+
+Development (the default) runs one auto-reloading process. ENVIRONMENT=production runs
+WEB_CONCURRENCY workers (default: one per CPU) on uvloop/httptools when they are installed.
+Workers are spawned fresh and import main:app themselves, so Firebase and the LLM client
+pool are created once inside each worker and never inherited from this parent process.
+With more than one worker, chatbot conversations default to the SQLite store so that every
+worker sees them (CONVERSATION_STORE=memory opts out).
 """
-import uvicorn
+import importlib.util
 import os
 
+import uvicorn
+
+# --- Production tuning ---
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+KEEPALIVE_SECONDS = int(os.getenv("KEEPALIVE_SECONDS", 5))     # idle keep-alive per connection
+BACKLOG = int(os.getenv("BACKLOG", 2048))                      # pending connections per socket
+LIMIT_CONCURRENCY = int(os.getenv("LIMIT_CONCURRENCY", 0)) or None  # per worker; 503 beyond it
+GRACEFUL_SHUTDOWN_SECONDS = int(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", 30))
+
+
+def installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def production_options() -> dict:
+    loop = "uvloop" if installed("uvloop") else "asyncio"
+    http = "httptools" if installed("httptools") else "h11"
+    workers = max(1, WEB_CONCURRENCY)
+    if workers > 1:
+        # Set before the workers are spawned, so they all inherit it
+        os.environ.setdefault("CONVERSATION_STORE", "sqlite")
+    print(f"🚀 Production mode: {workers} worker(s), loop={loop}, http={http}, "
+          f"conversations={os.getenv('CONVERSATION_STORE', 'memory')}")
+    return {
+        "workers": workers,
+        "loop": loop,
+        "http": http,
+        "backlog": BACKLOG,
+        "timeout_keep_alive": KEEPALIVE_SECONDS,
+        "limit_concurrency": LIMIT_CONCURRENCY,
+        # Stop accepting, let open requests finish, then run the lifespan shutdown
+        # (which drains in-flight chatbot calls) before a worker exits
+        "timeout_graceful_shutdown": GRACEFUL_SHUTDOWN_SECONDS,
+        "proxy_headers": True,
+    }
+
+
 if __name__ == "__main__":
     # Use environment port or default to 5000 for production, 8000 for dev
     port = int(os.getenv("PORT", 8000))
     # Bind to all interfaces for Replit accessibility
     host = "0.0.0.0"
     # Only use reload in development
+    production = os.getenv("ENVIRONMENT", "development") == "production"
     reload = os.getenv("ENVIRONMENT", "development") == "development"
-    
+
     uvicorn.run(
-        "main:app",  # Import string for reload to work
+        "main:app",  # Import string, so reload and every worker import the app themselves
         host=host,
         port=port,
         reload=reload,
-        log_level="info"
-    )
\ No newline at end of file
+        log_level="info",
+        **(production_options() if production else {}),
+    )
@@ -0,0 +1,268 @@
+"""
+Schedule conflict detection - sorted interval lists per practitioner and per room
+The index is loaded once from the sessions store and then kept warm by this process's own
+writes and by the storage watch (writes from other processes). Times are integer minutes
+on a proleptic calendar (date ordinal * 1440 + minute of day), so no time zones are involved;
+"now" is the server's local clock, which is taken to be clinic time.
+
+Only future slots are protected: completed and cancelled sessions free their slot, and a
+session that has already ended never conflicts (recording a past session is not a booking).
+Locations listed in SCHEDULE_SHARED_LOCATIONS name the whole clinic rather than a room and
+are not locked at all.
+"""
+import os
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from datetime import date as Date, datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from repositories import RESYNC, SessionChange, SessionRepository, get_session_repository
+from session_watch import get_session_watch
+from session_time import parse_date, parse_duration_minutes, parse_time_minutes
+
+# Used when a session has no parseable duration
+SCHEDULE_DEFAULT_DURATION_MINUTES = int(os.getenv("SCHEDULE_DEFAULT_DURATION_MINUTES", 60))
+# Statuses that no longer hold the practitioner or the room
+FREE_STATUSES = {"cancelled", "canceled", "completed"}
+# Locations that are not a bookable room (e.g. the default the booking form sends), comma-separated
+SCHEDULE_SHARED_LOCATIONS = {
+    name.strip().casefold() for name in os.getenv("SCHEDULE_SHARED_LOCATIONS", "clinic").split(",") if name.strip()
+}
+
+SCHEDULE_FIELDS = ["date", "time", "duration", "startsAt", "durationMinutes", "practitioner", "location", "status"]
+MINUTES_PER_DAY = 24 * 60
+
+Resource = Tuple[str, str] # ("practitioner" | "location", normalized name)
+
+
+class Conflict(NamedTuple):
+    resource: str # "practitioner" | "location"
+    session_id: str
+    start: int
+    end: int
+
+
+class ScheduleConflictError(Exception):
+    def __init__(self, conflicts: List[Conflict]):
+        super().__init__(f"{len(conflicts)} conflicting session(s)")
+        self.conflicts = conflicts
+
+
+def parse_start(day: Any, time: Any) -> Optional[int]:
+    """'2025-09-30' + '14:00' (or '2:00 PM') -> minutes on the schedule clock"""
+    parsed_day, minutes = parse_date(day), parse_time_minutes(time)
+    if parsed_day is None or minutes is None:
+        return None
+    return parsed_day.toordinal() * MINUTES_PER_DAY + minutes
+
+
+def session_interval(session: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+    # The typed fields are authoritative; legacy documents fall back to the strings
+    starts_at = session.get("startsAt")
+    if starts_at:
+        start = parse_start(starts_at[:10], starts_at[11:16])
+    else:
+        start = parse_start(session.get("date"), session.get("time"))
+    if start is None:
+        return None
+    duration = session.get("durationMinutes") or parse_duration_minutes(session.get("duration")) or SCHEDULE_DEFAULT_DURATION_MINUTES
+    return start, start + max(duration, 1)
+
+
+def schedule_now() -> int:
+    now = datetime.now()
+    return now.date().toordinal() * MINUTES_PER_DAY + now.hour * 60 + now.minute
+
+
+def format_minutes(minutes: int) -> str:
+    day, minute_of_day = divmod(minutes, MINUTES_PER_DAY)
+    return f"{Date.fromordinal(day).isoformat()}T{minute_of_day // 60:02d}:{minute_of_day % 60:02d}"
+
+
+def session_resources(session: Dict[str, Any]) -> List[Resource]:
+    resources = []
+    for kind in ("practitioner", "location"):
+        name = str(session.get(kind) or "").strip().casefold()
+        if name and not (kind == "location" and name in SCHEDULE_SHARED_LOCATIONS):
+            resources.append((kind, name))
+    return resources
+
+
+def touches_schedule(update_data: Dict[str, Any]) -> bool:
+    return not set(SCHEDULE_FIELDS).isdisjoint(update_data)
+
+
+class IntervalList:
+    """
+    (start, end, session_id) tuples sorted by start for one practitioner or room.
+    Tracking the longest interval bounds how far back an overlap can begin, so a query is
+    two bisections plus the overlapping items.
+    """
+
+    def __init__(self):
+        self.items: List[Tuple[int, int, str]] = []
+        self.max_length = 0
+
+    def add(self, start: int, end: int, session_id: str):
+        insort(self.items, (start, end, session_id))
+        self.max_length = max(self.max_length, end - start)
+
+    def remove(self, start: int, end: int, session_id: str):
+        index = bisect_left(self.items, (start, end, session_id))
+        if index < len(self.items) and self.items[index] == (start, end, session_id):
+            del self.items[index]
+
+    def overlapping(self, start: int, end: int) -> List[Tuple[int, int, str]]:
+        low = bisect_left(self.items, (start - self.max_length,))
+        high = bisect_left(self.items, (end,))
+        return [item for item in self.items[low:high] if item[1] > start]
+
+
+class ScheduleIndex:
+    def __init__(self):
+        self._lists: Dict[Resource, IntervalList] = defaultdict(IntervalList)
+        # session ID -> (schedule fields, interval, resources) of what is indexed for it
+        self._entries: Dict[str, Tuple[Dict[str, Any], Tuple[int, int], List[Resource]]] = {}
+        self._lock = threading.RLock()
+        self._resource_locks: Dict[Resource, threading.Lock] = defaultdict(threading.Lock)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self, sessions: Iterable[Dict[str, Any]]):
+        for session in sessions:
+            self.upsert(session["id"], session)
+
+    def replace(self, sessions: Iterable[Dict[str, Any]]):
+        """Swap in a freshly loaded index; lookups keep using the old one while it loads"""
+        fresh = ScheduleIndex()
+        fresh.load(sessions)
+        with self._lock:
+            self._lists, self._entries = fresh._lists, fresh._entries
+
+    def upsert(self, session_id: str, session: Dict[str, Any]):
+        fields = {field: session.get(field) for field in SCHEDULE_FIELDS}
+        interval = session_interval(fields)
+        with self._lock:
+            self.remove(session_id)
+            if interval is None or str(fields.get("status") or "").lower() in FREE_STATUSES:
+                return
+            resources = session_resources(fields)
+            for resource in resources:
+                self._lists[resource].add(interval[0], interval[1], session_id)
+            self._entries[session_id] = (fields, interval, resources)
+
+    def remove(self, session_id: str):
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is None:
+                return
+            _, (start, end), resources = entry
+            for resource in resources:
+                self._lists[resource].remove(start, end, session_id)
+
+    def apply_changes(self, changes: List[SessionChange]):
+        for change in changes:
+            if change.type == "removed":
+                self.remove(change.id)
+            else:
+                self.upsert(change.id, change.data)
+
+    def current(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The indexed schedule fields of a session, or None if it is not indexed"""
+        entry = self._entries.get(session_id)
+        return dict(entry[0]) if entry else None
+
+    def conflicts(self, session: Dict[str, Any], exclude_id: Optional[str] = None) -> List[Conflict]:
+        interval = session_interval(session)
+        if interval is None or str(session.get("status") or "").lower() in FREE_STATUSES:
+            return []
+        if interval[1] <= schedule_now():
+            return [] # already over
+        found = []
+        with self._lock:
+            for kind, name in session_resources(session):
+                intervals = self._lists.get((kind, name))
+                for start, end, session_id in intervals.overlapping(*interval) if intervals else []:
+                    if session_id != exclude_id:
+                        found.append(Conflict(kind, session_id, start, end))
+        return found
+
+    def busy(self, resources: List[Resource], start: int, end: int) -> List[Tuple[int, int, str]]:
+        """Booked intervals of any of `resources` that overlap [start, end), sorted by start"""
+        with self._lock:
+            items = {item for resource in resources if resource in self._lists
+                     for item in self._lists[resource].overlapping(start, end)}
+        return sorted(items)
+
+    @contextmanager
+    def hold(self, resources: Iterable[Resource]):
+        """Lock practitioners and rooms, always in sorted order so overlapping holds cannot deadlock"""
+        with ExitStack() as stack:
+            for resource in sorted(set(resources)):
+                stack.enter_context(self._resource_locks[resource])
+            yield
+
+    @contextmanager
+    def reserve(self, session: Dict[str, Any], session_id: Optional[str] = None):
+        """
+        Hold the session's practitioner and room while it is checked and written, so two
+        concurrent writes in this process cannot book the same slot. Raises ScheduleConflictError.
+        """
+        with self.hold(session_resources(session)):
+            conflicts = self.conflicts(session, exclude_id=session_id)
+            if conflicts:
+                raise ScheduleConflictError(conflicts)
+            yield
+
+
+def conflict_detail(error: ScheduleConflictError) -> Dict[str, Any]:
+    return {
+        "message": "The practitioner or room is already booked at this time",
+        "conflicts": [
+            {"resource": c.resource, "sessionId": c.session_id, "start": format_minutes(c.start), "end": format_minutes(c.end)}
+            for c in error.conflicts
+        ],
+    }
+
+
+_schedule_index: Optional[ScheduleIndex] = None
+_schedule_index_lock = threading.Lock()
+
+
+def _load_schedule_index() -> ScheduleIndex:
+    repo: SessionRepository = get_session_repository()
+    index = ScheduleIndex()
+
+    def on_changes(changes: List[SessionChange]):
+        if any(change.type == RESYNC.type for change in changes):
+            index.replace(repo.stream_all(fields=SCHEDULE_FIELDS))
+        else:
+            index.apply_changes(changes)
+
+    # Listen first so writes made while loading are not lost; upserts are idempotent
+    remove_listener = None
+    try:
+        remove_listener = get_session_watch().add_listener(on_changes)
+    except Exception as e:
+        print(f"WARNING: schedule index only sees this process's writes: {e}")
+    try:
+        index.load(repo.stream_all(fields=SCHEDULE_FIELDS))
+    except Exception:
+        # Not cached, so the next request loads again; this index must stop listening
+        if remove_listener:
+            remove_listener()
+        raise
+    print(f"Schedule index loaded with {len(index)} sessions")
+    return index
+
+
+def get_schedule_index() -> ScheduleIndex:
+    global _schedule_index
+    if _schedule_index is None:
+        with _schedule_index_lock: # concurrent first requests load it once
+            if _schedule_index is None:
+                _schedule_index = _load_schedule_index()
+    return _schedule_index
@@ -0,0 +1,118 @@
+"""
+Session change feed - the process's storage watch, fanned out to SSE subscribers
+Browser tabs subscribe to /sessions/{patient_id}/events instead of opening their own
+Firestore listeners, so the number of listeners stays at one however many tabs are open.
+"""
+import asyncio
+import os
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from repositories import RESYNC, SessionChange
+from session_watch import SessionWatch, get_session_watch
+from sse import sse_event
+
+# Changes buffered per client before it is considered too slow and told to resync
+SESSION_FEED_QUEUE_SIZE = int(os.getenv("SESSION_FEED_QUEUE_SIZE", 100))
+# Comment frames keep proxies from closing idle streams and surface dead connections
+SESSION_FEED_HEARTBEAT_SECONDS = float(os.getenv("SESSION_FEED_HEARTBEAT_SECONDS", 15))
+
+
+class Subscription:
+    """One connected client: a bounded queue of changes for a single patient."""
+
+    def __init__(self, patient_id: str, queue_size: int):
+        self.patient_id = patient_id
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.resyncs = 0
+
+    def offer(self, change: SessionChange):
+        try:
+            self.queue.put_nowait(change)
+        except asyncio.QueueFull:
+            # A slow client never holds up the others: drop its backlog and have it refetch the list
+            self.resyncs += 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    async def events(self) -> AsyncIterator[str]:
+        """SSE frames for this subscription, with heartbeats while idle"""
+        yield sse_event("ready", {"patientId": self.patient_id})
+        while True:
+            try:
+                change = await asyncio.wait_for(self.queue.get(), SESSION_FEED_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if change.type in ("removed", RESYNC.type):
+                yield sse_event(change.type, {"id": change.id})
+            else:
+                yield sse_event(change.type, {**change.data, "id": change.id})
+
+
+class SessionFeed:
+    """
+    Fans storage changes out to subscribers by patient ID. It listens on the shared
+    session watch from the first subscriber until close(); restarting a Firestore
+    listener would re-read the whole collection.
+    """
+
+    def __init__(self, watch: SessionWatch, queue_size: int = SESSION_FEED_QUEUE_SIZE):
+        self.watch = watch
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._unwatch = None
+
+    def subscribe(self, patient_id: str) -> Subscription:
+        if self._unwatch is None:
+            self._loop = asyncio.get_running_loop()
+            self._unwatch = self.watch.add_listener(self._on_changes)
+        subscription = Subscription(patient_id, self.queue_size)
+        self._subscribers.setdefault(patient_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.patient_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.patient_id]
+
+    def _on_changes(self, changes: List[SessionChange]):
+        # Runs on the storage watch thread; hand the batch to the event loop
+        try:
+            self._loop.call_soon_threadsafe(self._dispatch, changes)
+        except RuntimeError:
+            pass # loop already closed during shutdown
+
+    def _dispatch(self, changes: List[SessionChange]):
+        for change in changes:
+            if change.type == RESYNC.type:
+                # The storage watch lost track of changes; every client refetches its list
+                for subscription in [s for subscribers in self._subscribers.values() for s in subscribers]:
+                    subscription.offer(RESYNC)
+                return
+            for subscription in self._subscribers.get(change.data.get("patientId"), ()):
+                subscription.offer(change)
+
+    def stats(self) -> Dict[str, Any]:
+        subscriptions = [s for subscribers in self._subscribers.values() for s in subscribers]
+        return {
+            "watching": self._unwatch is not None,
+            "patients": len(self._subscribers),
+            "subscribers": len(subscriptions),
+            "queued": sum(s.queue.qsize() for s in subscriptions),
+            "resyncs": sum(s.resyncs for s in subscriptions),
+        }
+
+    def close(self):
+        if self._unwatch is not None:
+            self._unwatch()
+            self._unwatch = None
+
+
+@lru_cache(maxsize=None)
+def get_session_feed() -> SessionFeed:
+    return SessionFeed(get_session_watch())
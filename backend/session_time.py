@@ -0,0 +1,68 @@
+"""
+Session time normalization - legacy date/time/duration strings to typed fields
+Sessions keep the strings they were created with and also store:
+  startsAt         "YYYY-MM-DDTHH:MM" clinic-local start; sorts and range-filters as a string
+  durationMinutes  integer length of the session
+"""
+import re
+from datetime import date as Date
+from typing import Any, Dict, Optional
+
+_TIME = re.compile(r"^\s*(\d{1,2})(?::(\d{2}))?(?::\d{2})?\s*([ap]\.?m\.?)?\s*$", re.IGNORECASE)
+_DURATION = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(h|hr|hrs|hour|hours|m|min|mins|minute|minutes)?\b", re.IGNORECASE)
+
+
+def parse_date(value: Any) -> Optional[Date]:
+    """'2025-09-30' (or an ISO datetime) -> date"""
+    try:
+        return Date.fromisoformat(str(value).strip()[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_time_minutes(value: Any) -> Optional[int]:
+    """'14:00', '2:00 PM', '9 am' -> minutes after midnight"""
+    match = _TIME.match(str(value or ""))
+    if not match:
+        return None
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem[0].lower() == "p" else 0)
+    elif match.group(2) is None:
+        return None # a bare number is not a time
+    if hour > 23 or minute > 59:
+        return None
+    return hour * 60 + minute
+
+
+def parse_duration_minutes(value: Any) -> Optional[int]:
+    """'60 min', '1.5 hours', '45' -> minutes"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    match = _DURATION.match(str(value or ""))
+    if not match:
+        return None
+    amount, unit = float(match.group(1)), (match.group(2) or "m").lower()
+    return int(round(amount * 60 if unit.startswith("h") else amount))
+
+
+def format_starts_at(day: Date, minute_of_day: int) -> str:
+    return f"{day.isoformat()}T{minute_of_day // 60:02d}:{minute_of_day % 60:02d}"
+
+
+def normalized_fields(session: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    startsAt and durationMinutes for a session's date/time/duration strings. A value that
+    cannot be parsed comes back as None so a stale typed value is cleared with it.
+    """
+    day, minutes = parse_date(session.get("date")), parse_time_minutes(session.get("time"))
+    return {
+        "startsAt": format_starts_at(day, minutes) if day is not None and minutes is not None else None,
+        "durationMinutes": parse_duration_minutes(session.get("duration")),
+    }
+
+
+def touches_time(update_data: Dict[str, Any]) -> bool:
+    return not {"date", "time", "duration"}.isdisjoint(update_data)
@@ -0,0 +1,79 @@
+"""
+Session watch - the one storage watch per process
+The change feed and the schedule index both follow the sessions collection. They register
+listeners here instead of opening watches of their own; for Firestore each watch is a
+listener that first re-reads the whole collection.
+"""
+import threading
+from typing import Callable, List, Optional
+
+from repositories import SessionChange, SessionRepository, get_session_repository
+
+Listener = Callable[[List[SessionChange]], None]
+
+
+class SessionWatch:
+    """
+    Fans each batch of storage changes out to every listener, on the storage watch thread.
+    The watch starts with the first listener and stays open until close().
+    """
+
+    def __init__(self, repo: SessionRepository):
+        self.repo = repo
+        self._listeners: List[Listener] = []
+        # Reentrant: a backend may deliver changes from inside watch() on this same thread
+        self._lock = threading.RLock()
+        self._unwatch: Optional[Callable[[], None]] = None
+
+    @property
+    def watching(self) -> bool:
+        return self._unwatch is not None
+
+    def add_listener(self, listener: Listener) -> Callable[[], None]:
+        """Register `listener`; returns a function that removes it. Raises if the watch cannot start."""
+        with self._lock:
+            if self._unwatch is None:
+                self._unwatch = self.repo.watch(self._on_changes)
+            self._listeners.append(listener)
+
+        def remove():
+            with self._lock:
+                if listener in self._listeners:
+                    self._listeners.remove(listener)
+        return remove
+
+    def _on_changes(self, changes: List[SessionChange]):
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(changes)
+            except Exception as e:
+                # One failing consumer must not starve the others
+                print(f"WARNING: session change listener failed: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._unwatch is not None:
+                self._unwatch()
+                self._unwatch = None
+            self._listeners.clear()
+
+
+_session_watch: Optional[SessionWatch] = None
+_session_watch_lock = threading.Lock()
+
+
+def get_session_watch() -> SessionWatch:
+    global _session_watch
+    with _session_watch_lock:
+        if _session_watch is None:
+            _session_watch = SessionWatch(get_session_repository())
+        return _session_watch
+
+
+def close_session_watch():
+    """Stop the shared watch, if anything ever started one"""
+    with _session_watch_lock:
+        if _session_watch is not None:
+            _session_watch.close()
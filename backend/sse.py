@@ -0,0 +1,12 @@
+"""
+Server-Sent Events helpers shared by the streaming endpoints
+"""
+import json
+from typing import Dict
+
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+def sse_event(event: str, data: Dict) -> str:
+    """Encode one Server-Sent Event frame with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
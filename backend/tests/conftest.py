@@ -0,0 +1,59 @@
+"""
+Shared test setup: the backend modules import each other by top-level name, and read their
+configuration from the environment at import time, so both are settled before any test module
+imports them. Run from backend/: python -m pytest -q
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+os.environ.setdefault("SQLITE_PATH", ":memory:")
+os.environ.setdefault("CHAT_HISTORY_SUMMARIZER", "extractive")
+os.environ.setdefault("CHATBOT_CACHE_BACKEND", "memory")
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def build_index(tmp_path):
+    """Write entries to a .jsonl source and index it with index_knowledge.py; returns the index path"""
+    def build(entries):
+        source_dir = tmp_path / "knowledge"
+        source_dir.mkdir(exist_ok=True)
+        with open(source_dir / "entries.jsonl", "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        out = tmp_path / "knowledge.idx"
+        subprocess.run(
+            [sys.executable, "index_knowledge.py", str(source_dir), "--out", str(out)],
+            cwd=BACKEND_DIR, check=True, capture_output=True,
+        )
+        return str(out)
+    return build
+
+
+class ASGIClient:
+    """Synchronous requests against an ASGI app in-process, through httpx like benchmarks/app_load.py"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        async def send():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), base_url="http://test") as client:
+                return await client.request(method, url, **kwargs)
+        return asyncio.run(send())
+
+    def get(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("POST", url, **kwargs)
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+import chat_history
+from chat_history import compact_history, message_tokens, normalize_history
+
+
+@pytest.fixture(autouse=True)
+def small_budget(monkeypatch):
+    """A 200-token budget with a fresh cache; returns a list that records every summarize() call"""
+    monkeypatch.setattr(chat_history, "CHAT_HISTORY_TOKEN_BUDGET", 200)
+    monkeypatch.setattr(chat_history, "CHAT_HISTORY_SUMMARY_TOKENS", 50)
+    monkeypatch.setattr(chat_history, "CHAT_HISTORY_SUMMARIZER", "extractive")
+    monkeypatch.setattr(chat_history, "summary_cache", chat_history.create_summary_cache())
+    calls = []
+    summarize = chat_history.summarize
+
+    async def counting(previous, folded):
+        calls.append(len(folded))
+        return await summarize(previous, folded)
+
+    monkeypatch.setattr(chat_history, "summarize", counting)
+    return calls
+
+
+def turns(count, start=0):
+    return [
+        {"role": "user" if i % 2 == 0 else "model", "content": f"Message {i}. " + "word " * 8}
+        for i in range(start, start + count)
+    ]
+
+
+def compact(history, key="chat", offset=0):
+    return asyncio.run(compact_history(history, key=key, offset=offset))
+
+
+def test_short_history_is_sent_verbatim(small_budget):
+    history = turns(4)
+    result = compact(history)
+    assert result.summary == "" and result.recent == normalize_history(history)
+    assert small_budget == []
+
+
+def test_long_history_fits_the_budget():
+    history = turns(40)
+    result = compact(history)
+    assert result.summary.startswith("Patient: Message") or result.summary.startswith("Assistant: Message")
+    assert result.recent == normalize_history(history)[-len(result.recent):]
+    assert result.tokens() <= chat_history.CHAT_HISTORY_TOKEN_BUDGET
+    assert result.total_messages == 40
+
+
+def test_summary_is_extended_every_few_turns_not_every_turn(small_budget):
+    history = turns(20)
+    compact(history)
+    assert len(small_budget) == 1
+    for n in range(21, 41):
+        result = compact(turns(n))
+        assert result.tokens() <= chat_history.CHAT_HISTORY_TOKEN_BUDGET
+    # Folding leaves the window half full, so most turns reuse the cached summary
+    assert 1 < len(small_budget) < 12
+    assert all(folded <= 6 for folded in small_budget[1:]) # only the turns that fell out of the window
+
+
+def test_a_different_chat_under_the_same_key_gets_its_own_summary(small_budget):
+    compact(turns(30))
+    other = [{"role": "user", "content": f"Other {i}. " + "word " * 8} for i in range(30)]
+    result = compact(other)
+    assert "Other" in result.summary and "Message" not in result.summary
+    assert len(small_budget) == 2
+
+
+def test_cached_positions_survive_trimming(small_budget):
+    """A stored conversation drops its oldest turns; the offset keeps the cached summary usable"""
+    max_turns = 24
+    for n in range(20, 60):
+        history = turns(n)
+        dropped = max(0, n - max_turns)
+        compact(history[dropped:], offset=dropped)
+    trimmed_calls = len(small_budget)
+    small_budget.clear()
+    for n in range(20, 60):
+        compact(turns(n), key="untrimmed")
+    assert trimmed_calls <= len(small_budget) + 1
+
+
+def test_an_oversized_last_message_is_cut_down():
+    history = turns(2) + [{"role": "user", "content": "long " * 1000}]
+    result = compact(history)
+    assert len(result.recent) == 1
+    assert message_tokens(result.recent[0]) <= chat_history.CHAT_HISTORY_TOKEN_BUDGET - chat_history.CHAT_HISTORY_SUMMARY_TOKENS
+    assert result.recent[0]["content"].endswith("…")
+
+
+def test_client_roles_are_normalized():
+    assert normalize_history([{"role": "model", "content": "hi"}, {"role": "user"}, {"role": "assistant", "content": "x"}]) == [
+        {"role": "assistant", "content": "hi"}, {"role": "user", "content": ""}, {"role": "assistant", "content": "x"},
+    ]
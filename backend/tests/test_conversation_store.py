@@ -0,0 +1,55 @@
+import threading
+
+from conversation_store import ConversationStore
+
+
+def sqlite_store(path, **limits):
+    options = dict(max_count=100, max_bytes=1 << 20, ttl_seconds=3600, max_turns=1000)
+    options.update(limits)
+    return ConversationStore(sqlite_path=str(path), **options)
+
+
+def turn(text):
+    return [{"role": "user", "content": text}]
+
+
+def test_oldest_turns_are_dropped_past_max_turns(tmp_path):
+    store = sqlite_store(tmp_path / "conversations.db", max_turns=3)
+    conversation = store.create()
+    for i in range(5):
+        store.append(conversation["id"], turn(str(i)))
+    stored = store.get(conversation["id"])
+    assert [t["content"] for t in stored["turns"]] == ["2", "3", "4"]
+    assert stored["dropped"] == 2
+
+
+def test_workers_sharing_a_file_do_not_lose_turns(tmp_path):
+    # Two stores on one file stand in for two worker processes
+    workers = [sqlite_store(tmp_path / "conversations.db") for _ in range(2)]
+    conversation_id = workers[0].create()["id"]
+    per_thread = 25
+
+    def chat(store, name):
+        for i in range(per_thread):
+            assert store.append(conversation_id, turn(f"{name}-{i}")) is not None
+
+    threads = [threading.Thread(target=chat, args=(store, f"w{n}-t{t}"))
+               for n, store in enumerate(workers) for t in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for store in workers:
+        turns = store.get(conversation_id)["turns"]
+        assert len(turns) == len(threads) * per_thread
+        assert len({t["content"] for t in turns}) == len(turns)
+
+
+def test_delete_is_seen_by_every_worker(tmp_path):
+    first, second = (sqlite_store(tmp_path / "conversations.db") for _ in range(2))
+    conversation_id = first.create()["id"]
+    assert second.get(conversation_id) is not None
+    assert first.delete(conversation_id)
+    assert second.get(conversation_id) is None
+    assert second.append(conversation_id, turn("hi")) is None
@@ -0,0 +1,121 @@
+import pytest
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import StreamingResponse
+
+from http_cache import CachedPayload, ConditionalGetMiddleware, compute_etag, etag_matches
+
+from conftest import ASGIClient
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    state = {"items": ["a", "b"]}
+
+    @app.get("/items")
+    def items():
+        return state["items"]
+
+    @app.post("/items")
+    def add_item(item: str):
+        state["items"].append(item)
+        return state["items"]
+
+    @app.get("/items/missing")
+    def missing():
+        raise HTTPException(status_code=404)
+
+    @app.get("/items/events")
+    def events():
+        return StreamingResponse(iter(["event: ping\ndata: {}\n\n"]), media_type="text/event-stream")
+
+    @app.get("/items/own")
+    def own(response: Response):
+        response.headers["ETag"] = '"fixed"'
+        return {"ok": True}
+
+    @app.get("/other")
+    def other():
+        return {"ok": True}
+
+    app.add_middleware(ConditionalGetMiddleware, cache_control={"/items": "private, no-cache", "/items/own": "public, max-age=60"})
+    return ASGIClient(app), state
+
+
+def test_etag_matching():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc"', '"abc"')
+    assert etag_matches('"x", "abc"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+def test_get_gets_an_etag_and_revalidates_with_304(client):
+    client, state = client
+    first = client.get("/items")
+    etag = first.headers["etag"]
+    assert etag == compute_etag(first.content)
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    cached = client.get("/items", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+
+    client.post("/items", params={"item": "c"})
+    changed = client.get("/items", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json() == ["a", "b", "c"]
+    assert changed.headers["etag"] != etag
+
+
+def test_route_etag_and_longest_prefix_policy(client):
+    client, _ = client
+    response = client.get("/items/own")
+    assert response.headers["etag"] == '"fixed"'
+    assert response.headers["cache-control"] == "public, max-age=60"
+    assert client.get("/items/own", headers={"If-None-Match": '"fixed"'}).status_code == 304
+
+
+def test_errors_streams_and_other_paths_pass_through(client):
+    client, _ = client
+    assert "etag" not in client.get("/items/missing").headers
+    events = client.get("/items/events", headers={"If-None-Match": "*"})
+    assert events.status_code == 200 and "etag" not in events.headers
+    assert "etag" not in client.get("/other").headers
+    assert "etag" not in client.post("/items", params={"item": "d"}).headers
+
+
+def test_cached_payload_loads_once_until_invalidated(monkeypatch):
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return f"body {len(loads)}".encode()
+
+    payload = CachedPayload(loader, ttl_seconds=60)
+    body, etag = payload.get()
+    assert payload.get() == (body, etag) and len(loads) == 1
+    payload.invalidate()
+    assert payload.get()[0] == b"body 2"
+
+    now = [1000.0]
+    monkeypatch.setattr("http_cache.time.monotonic", lambda: now[0])
+    payload.invalidate()
+    payload.get()
+    now[0] += 61
+    assert payload.get()[0] == b"body 4"
+
+
+def test_invalidation_during_a_load_is_not_lost():
+    payload = None
+
+    def loader():
+        payload.invalidate() # a write lands while the old data is being read
+        return b"stale"
+
+    payload = CachedPayload(loader, ttl_seconds=60)
+    payload.get()
+    payload.loader = lambda: b"fresh"
+    assert payload.get()[0] == b"fresh"
@@ -0,0 +1,80 @@
+import pytest
+
+from knowledge_base import KnowledgeBase
+from retrieval import BM25Index, MappedBM25Index, preprocess_text
+
+ENTRIES = [
+    {"id": f"e{i}", "content": f"vata dosha {'ghee ' * (i % 4)}herb{i % 5} massage {'warm oil ' * (i % 3)}", "metadata": {}}
+    for i in range(12)
+]
+QUERIES = ["warm ghee vata", "herb3 massage", "oil", "pitta cooling", "dosha"]
+
+
+def ranked(snapshot_or_index, query):
+    return [(pytest.approx(score), entry["id"]) for score, entry in snapshot_or_index.search(query, top_k=20)]
+
+
+def assert_matches_rebuild(snapshot):
+    """Corpus statistics and every score must equal an index built from scratch on the live entries"""
+    rebuilt = BM25Index(snapshot.live_entries(), tokenizer=preprocess_text)
+    assert len(snapshot) == len(rebuilt)
+    assert snapshot.total_length == rebuilt.total_length
+    for term in ("vata", "ghee", "oil", "herb3", "pitta", "cooling"):
+        live_df = rebuilt.term_doc_freq(term)
+        assert snapshot.base.term_doc_freq(term) - snapshot.removed_df.get(term, 0) + len(snapshot.overlay_postings.get(term, ())) == live_df
+    for query in QUERIES:
+        assert ranked(snapshot, query) == [(score, entry["id"]) for score, entry in rebuilt.search(query, top_k=20)]
+
+
+@pytest.fixture(params=["memory", "mapped"])
+def base(request, build_index):
+    if request.param == "mapped":
+        return MappedBM25Index(build_index(ENTRIES), tokenizer=preprocess_text)
+    return BM25Index(ENTRIES, tokenizer=preprocess_text)
+
+
+def test_changes_score_like_a_rebuild(base):
+    kb = KnowledgeBase(base, overlay_max=0)
+    kb.apply(upserts=[{"id": "new", "content": "pitta cooling herb3 herb3", "metadata": {}}])
+    kb.apply(upserts=[{"id": "e2", "content": "replaced with warm ghee for vata", "metadata": {}}])
+    kb.apply(removals=["e5", "new"])
+    kb.apply(upserts=[{"id": "new", "content": "pitta again, cooling oil", "metadata": {}}])
+    snapshot = kb.snapshot
+    assert snapshot.version == 4
+    assert snapshot.get("e5") is None
+    assert snapshot.get("e2")["content"].startswith("replaced")
+    assert len(snapshot.overlay) == 2 and snapshot.removed == frozenset({2, 5})
+    assert_matches_rebuild(snapshot)
+
+
+def test_snapshots_are_never_modified(base):
+    kb = KnowledgeBase(base, overlay_max=0)
+    before = kb.snapshot
+    scores = before.score("warm ghee vata")
+    kb.apply(upserts=[{"id": "e1", "content": "something else", "metadata": {}}], removals=["e3"])
+    assert before.version == 0 and before.get("e3") is not None
+    assert before.score("warm ghee vata") == scores
+    assert kb.snapshot is not before
+
+
+def test_missing_removals_are_reported_once():
+    kb = KnowledgeBase(BM25Index(ENTRIES, tokenizer=preprocess_text))
+    assert kb.apply(removals=["e1", "e1", "nope"]) == ["nope"]
+    assert kb.snapshot.version == 1
+    assert kb.apply(removals=["nope"]) == ["nope"]
+    assert kb.snapshot.version == 1 # nothing changed, no new version
+    assert kb.remove("e1") is False
+
+
+def test_a_large_overlay_is_compacted(base):
+    kb = KnowledgeBase(base, overlay_max=4)
+    kb.apply(upserts=[{"id": f"n{i}", "content": f"warm oil herb{i}", "metadata": {}} for i in range(3)])
+    kb.apply(removals=["e0"])
+    assert kb.compactions == 0
+    kb.apply(upserts=[{"id": "e4", "content": "ghee ghee vata", "metadata": {}}])
+    snapshot = kb.snapshot
+    assert kb.compactions == 1
+    assert snapshot.version == 3
+    assert not snapshot.overlay and not snapshot.removed
+    assert len(snapshot) == len(ENTRIES) + 3 - 1
+    assert_matches_rebuild(snapshot)
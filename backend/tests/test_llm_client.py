@@ -0,0 +1,62 @@
+import asyncio
+from types import SimpleNamespace
+
+import llm_client
+from llm_client import DeltaStream
+
+
+class FakeStream:
+    def __init__(self, texts):
+        self.texts = list(texts)
+        self.closed = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.texts:
+            raise StopAsyncIteration
+        text = self.texts.pop(0)
+        return SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+    async def close(self):
+        self.closed += 1
+
+
+async def open_stream(texts):
+    await llm_client._acquire_slot()
+    loop = asyncio.get_running_loop()
+    stream = FakeStream(texts)
+    return DeltaStream(stream, loop.time(), loop.time() + 30), stream
+
+
+def test_slot_is_released_once_after_a_full_stream():
+    async def run():
+        deltas, stream = await open_stream(["a", "b"])
+        assert llm_client.in_flight() == 1
+        assert [text async for text in deltas] == ["a", "b"]
+        await deltas.aclose()
+        return stream
+    stream = asyncio.run(run())
+    assert llm_client.in_flight() == 0 and stream.closed == 1
+
+
+def test_slot_is_released_when_iteration_never_starts():
+    async def run():
+        deltas, stream = await open_stream(["a"])
+        await deltas.aclose()
+        await deltas.aclose()
+        return stream
+    stream = asyncio.run(run())
+    assert llm_client.in_flight() == 0 and stream.closed == 1
+
+
+def test_slot_is_released_when_abandoned_mid_stream():
+    async def run():
+        deltas, stream = await open_stream(["a", "b", "c"])
+        async for _ in deltas:
+            break
+        await deltas.aclose()
+        return stream
+    stream = asyncio.run(run())
+    assert llm_client.in_flight() == 0 and stream.closed == 1
@@ -0,0 +1,85 @@
+import pytest
+from fastapi import FastAPI
+
+from repositories import InvalidCursorError, get_session_repository
+from repositories.sqlite import SQLiteDatabase, SQLiteSessionRepository
+from routers import sessions
+from session_time import normalized_fields
+
+from conftest import ASGIClient
+
+TIMES = ["10:00", "9:00", "2:00 PM", "10:00", "8:30", "10:00", "11:15"]
+
+
+def make_session(patient_id, day, time, status="Scheduled"):
+    session = {
+        "therapy": "Abhyanga", "date": f"2026-03-{day:02d}", "time": time, "duration": "60 min",
+        "practitioner": "Dr. Sharma", "location": "Room 1", "status": status, "sessionId": "S",
+        "patientId": patient_id,
+    }
+    return {**session, **normalized_fields(session)}
+
+
+@pytest.fixture
+def repo():
+    repo = SQLiteSessionRepository(SQLiteDatabase(":memory:"))
+    for i, time in enumerate(TIMES):
+        repo.create(make_session("p1", 1 + i % 3, time, status="Completed" if i % 2 else "Scheduled"))
+    repo.create(make_session("p2", 1, "10:00"))
+    return repo
+
+
+def walk(repo, limit, **filters):
+    pages, cursor = [], None
+    while True:
+        page, cursor = repo.list_for_patient("p1", limit=limit, start_after=cursor, **filters)
+        pages.append(page)
+        if cursor is None:
+            return pages
+        assert cursor == page[-1]["id"]
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 7, 50])
+@pytest.mark.parametrize("filters", [{}, {"order_by": "startsAt"}, {"order_by": "date"}, {"status": "Completed"},
+                                     {"order_by": "startsAt", "date_from": "2026-03-02", "date_to": "2026-03-03"}])
+def test_pages_cover_the_list_exactly_once_in_order(repo, limit, filters):
+    everything, cursor = repo.list_for_patient("p1", **filters)
+    assert cursor is None
+    pages = walk(repo, limit, **filters)
+    assert all(0 < len(page) <= limit for page in pages)
+    assert [s["id"] for page in pages for s in page] == [s["id"] for s in everything]
+
+
+def test_ordering_and_filters(repo):
+    by_start, _ = repo.list_for_patient("p1", order_by="startsAt")
+    starts = [s["startsAt"] for s in by_start]
+    assert starts == sorted(starts) and len(starts) == len(TIMES)
+    completed, _ = repo.list_for_patient("p1", status="Completed")
+    assert {s["status"] for s in completed} == {"Completed"} and len(completed) == 3
+    ranged, _ = repo.list_for_patient("p1", order_by="startsAt", date_from="2026-03-03", date_to="2026-03-03")
+    assert ranged and all(s["startsAt"].startswith("2026-03-03") for s in ranged)
+
+
+def test_projection_and_invalid_cursor(repo):
+    page, _ = repo.list_for_patient("p1", limit=2, fields=["therapy", "time"])
+    assert all(set(s) == {"id", "therapy", "time"} for s in page)
+    with pytest.raises(InvalidCursorError):
+        repo.list_for_patient("p1", start_after="no-such-session")
+
+
+def test_route_sends_the_cursor_header(repo):
+    app = FastAPI()
+    app.include_router(sessions.router)
+    app.dependency_overrides[get_session_repository] = lambda: repo
+    client = ASGIClient(app)
+
+    first = client.get("/sessions/p1", params={"limit": 4, "order_by": "startsAt"})
+    assert first.status_code == 200 and len(first.json()) == 4
+    cursor = first.headers["x-next-cursor"]
+    rest = client.get("/sessions/p1", params={"limit": 4, "order_by": "startsAt", "start_after": cursor})
+    assert len(rest.json()) == 3 and "x-next-cursor" not in rest.headers
+
+    assert client.get("/sessions/p1", params={"start_after": "nope"}).status_code == 400
+    assert client.get("/sessions/p1", params={"fields": "therapy,secret"}).status_code == 400
+    projected = client.get("/sessions/p1", params={"fields": "therapy", "limit": 1}).json()
+    assert projected == [{"id": projected[0]["id"], "therapy": "Abhyanga"}]
@@ -0,0 +1,50 @@
+import pytest
+
+from http_cache import CachedPayload
+from main import app
+from repositories import StorageUnavailableError
+from routers.practitioners import get_practitioners_cache
+from scheduling import ScheduleIndex, get_schedule_index
+
+from conftest import ASGIClient
+
+
+@pytest.fixture
+def roster():
+    state = {"body": b'[{"id":"p1","name":"Dr. Sharma","userType":"practitioner"}]', "error": None}
+
+    def load():
+        if state["error"]:
+            raise state["error"]
+        return state["body"]
+
+    cache = CachedPayload(load, ttl_seconds=0)
+    app.dependency_overrides[get_practitioners_cache] = lambda: cache
+    app.dependency_overrides[get_schedule_index] = ScheduleIndex
+    yield state
+    app.dependency_overrides.clear()
+
+
+AVAILABILITY = "/practitioners/p1/availability?date=2099-03-02"
+
+
+def test_availability_lists_free_windows(roster):
+    response = ASGIClient(app).get(AVAILABILITY)
+    assert response.status_code == 200
+    assert response.json()["free"] == [{"start": "2099-03-02T09:00", "end": "2099-03-02T18:00"}]
+
+
+@pytest.mark.parametrize("url", ["/practitioners/", AVAILABILITY])
+def test_roster_outage_is_a_503(roster, url):
+    roster["error"] = StorageUnavailableError("no credentials")
+    response = ASGIClient(app).get(url)
+    assert response.status_code == 503
+    assert response.json() == {"detail": "Storage is unavailable"}
+
+
+@pytest.mark.parametrize("url", ["/practitioners/", AVAILABILITY])
+def test_other_roster_failures_are_a_500(roster, url):
+    roster["error"] = RuntimeError("deadline exceeded")
+    response = ASGIClient(app).get(url)
+    assert response.status_code == 500
+    assert response.json() == {"detail": "deadline exceeded"}
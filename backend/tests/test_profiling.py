@@ -0,0 +1,65 @@
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+import profiling
+from profiling import ProfilingMiddleware
+
+from conftest import ASGIClient
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "secret")
+    monkeypatch.setattr(profiling, "PROFILING_DIR", str(tmp_path))
+    app = FastAPI()
+
+    @app.get("/items")
+    def items():
+        return ["a", "b"]
+
+    @app.get("/items/events")
+    def events():
+        return StreamingResponse(iter(["event: ping\ndata: {}\n\n"]), media_type="text/event-stream")
+
+    app.add_middleware(ProfilingMiddleware)
+    return ASGIClient(app), tmp_path
+
+
+def test_profile_header_returns_the_profile(client):
+    client, profiles = client
+    response = client.get("/items", headers={"X-Profile": "secret"})
+    assert response.status_code == 200
+    assert response.headers["x-profiled-status"] == "200"
+    assert response.headers["content-type"].startswith("text/plain")
+    assert os.listdir(profiles) == [response.headers["x-profile-file"]]
+
+
+def test_wrong_token_is_served_normally(client):
+    client, profiles = client
+    response = client.get("/items", headers={"X-Profile": "guess"})
+    assert response.json() == ["a", "b"]
+    assert os.listdir(profiles) == []
+
+
+def test_event_streams_are_passed_through_unprofiled(client):
+    client, profiles = client
+    response = client.get("/items/events", headers={"X-Profile": "secret"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.headers["x-profile-skipped"] == "event-stream"
+    assert response.text == "event: ping\ndata: {}\n\n"
+    assert os.listdir(profiles) == []
+    assert profiling._sampler._active == [] # the sampler is not left recording
+
+
+def test_sampled_event_streams_are_not_saved(client, monkeypatch):
+    client, profiles = client
+    monkeypatch.setattr(profiling, "PROFILING_SAMPLE_RATE", 1.0)
+    response = client.get("/items/events")
+    assert response.text == "event: ping\ndata: {}\n\n"
+    assert os.listdir(profiles) == []
+    client.get("/items")
+    assert len(os.listdir(profiles)) == 1
@@ -0,0 +1,99 @@
+import math
+from collections import Counter
+
+import pytest
+
+from retrieval import BM25Index, IndexFormatError, MappedBM25Index, bm25_idf, preprocess_text
+
+ENTRIES = [
+    {"id": "vata", "content": "Vata dosha governs movement. Warm oil massage and ghee balance vata.", "metadata": {}},
+    {"id": "pitta", "content": "Pitta dosha controls digestion and heat. Cooling foods balance pitta.", "metadata": {}},
+    {"id": "kapha", "content": "Kapha dosha gives structure. Exercise and light spicy foods balance kapha.", "metadata": {}},
+    {"id": "abhyanga", "content": "Abhyanga is a warm oil massage, oil oil oil, that calms vata.", "metadata": {}},
+]
+
+
+def reference_scores(entries, query, k1=1.5, b=0.75):
+    """BM25 computed directly from its definition, one document at a time"""
+    docs = [Counter(preprocess_text(entry["content"])) for entry in entries]
+    avg_length = sum(sum(doc.values()) for doc in docs) / len(docs)
+    scores = {}
+    for term, qtf in Counter(preprocess_text(query)).items():
+        doc_freq = sum(1 for doc in docs if term in doc)
+        if not doc_freq:
+            continue
+        idf = math.log(1 + (len(docs) - doc_freq + 0.5) / (doc_freq + 0.5))
+        for doc_idx, doc in enumerate(docs):
+            tf = doc.get(term, 0)
+            if tf:
+                norm = k1 * (1 - b + b * sum(doc.values()) / avg_length)
+                scores[doc_idx] = scores.get(doc_idx, 0.0) + qtf * idf * tf * (k1 + 1) / (tf + norm)
+    return scores
+
+
+def test_preprocess_drops_stop_words_and_short_words():
+    assert preprocess_text("The Vata of an ox is in balance") == ["vata", "balance"]
+
+
+def test_idf_is_never_negative():
+    assert bm25_idf(10, 10) > 0
+    assert bm25_idf(10, 1) > bm25_idf(10, 5)
+
+
+@pytest.mark.parametrize("query", ["warm oil massage", "dosha", "pitta digestion heat", "oil oil vata", "unknownword"])
+def test_scores_match_bm25_definition(query):
+    index = BM25Index(ENTRIES, tokenizer=preprocess_text)
+    expected = reference_scores(ENTRIES, query)
+    scores = index.score(query)
+    assert scores.keys() == expected.keys()
+    for doc_idx, score in expected.items():
+        assert scores[doc_idx] == pytest.approx(score)
+
+
+def test_search_orders_best_first_and_skips_unmatched():
+    index = BM25Index(ENTRIES, tokenizer=preprocess_text)
+    results = index.search("warm oil massage", top_k=3)
+    assert [entry["id"] for _, entry in results] == ["abhyanga", "vata"]
+    assert results[0][0] > results[1][0]
+    assert index.search("unknownword") == []
+
+
+def test_ties_go_to_the_earlier_entry():
+    entries = [{"id": name, "content": "same words here", "metadata": {}} for name in ("first", "second")]
+    index = BM25Index(entries, tokenizer=preprocess_text)
+    assert [entry["id"] for _, entry in index.search("words", top_k=1)] == ["first"]
+
+
+# --- Memory-mapped index file ---
+QUERIES = ["warm oil massage", "dosha", "pitta digestion heat", "oil oil vata", "exercise spicy", "unknownword"]
+
+
+def test_mapped_index_matches_in_memory_index(build_index):
+    mapped = MappedBM25Index(build_index(ENTRIES), tokenizer=preprocess_text)
+    memory = BM25Index(ENTRIES, tokenizer=preprocess_text)
+    assert len(mapped) == len(memory)
+    assert mapped.total_length == memory.total_length
+    for query in QUERIES:
+        assert mapped.score(query) == pytest.approx(memory.score(query))
+        assert [(pytest.approx(score), entry["id"]) for score, entry in memory.search(query)] == \
+            [(score, entry["id"]) for score, entry in mapped.search(query)]
+
+
+def test_mapped_index_statistics_and_lookups(build_index):
+    mapped = MappedBM25Index(build_index(ENTRIES), tokenizer=preprocess_text)
+    memory = BM25Index(ENTRIES, tokenizer=preprocess_text)
+    for term in ("oil", "dosha", "vata", "missing"):
+        assert mapped.term_doc_freq(term) == memory.term_doc_freq(term)
+        assert sorted(mapped.term_postings(term)) == sorted(memory.term_postings(term))
+    for entry in ENTRIES:
+        doc_idx = mapped.doc_index(entry["id"])
+        assert mapped.entry(doc_idx)["content"] == entry["content"]
+        assert mapped.doc_length(doc_idx) == memory.doc_length(memory.doc_index(entry["id"]))
+    assert mapped.doc_index("nope") is None
+
+
+def test_mapping_a_file_that_is_not_an_index_fails(tmp_path):
+    path = tmp_path / "not.idx"
+    path.write_bytes(b"x" * 4096)
+    with pytest.raises(IndexFormatError):
+        MappedBM25Index(str(path), tokenizer=preprocess_text)
@@ -0,0 +1,146 @@
+import random
+import threading
+
+import pytest
+
+from scheduling import IntervalList, ScheduleConflictError, ScheduleIndex, session_interval
+
+
+def session(time, practitioner="Dr. Sharma", location="Room 1", duration="60 min", date="2099-03-02", status="Scheduled"):
+    return {"date": date, "time": time, "duration": duration, "practitioner": practitioner, "location": location, "status": status}
+
+
+def test_interval_list_matches_brute_force():
+    rng = random.Random(7)
+    intervals = IntervalList()
+    items = []
+    for i in range(300):
+        start = rng.randrange(0, 5000)
+        item = (start, start + rng.randrange(1, 200), f"s{i}")
+        items.append(item)
+        intervals.add(*item)
+    for removed in items[::5]:
+        intervals.remove(*removed)
+    live = [item for index, item in enumerate(items) if index % 5]
+    for _ in range(200):
+        start = rng.randrange(0, 5200)
+        end = start + rng.randrange(1, 300)
+        expected = sorted(item for item in live if item[0] < end and item[1] > start)
+        assert sorted(intervals.overlapping(start, end)) == expected
+
+
+def test_interval_bounds_are_half_open():
+    intervals = IntervalList()
+    intervals.add(600, 660, "a")
+    assert intervals.overlapping(660, 720) == []
+    assert intervals.overlapping(540, 600) == []
+    assert intervals.overlapping(659, 700) == [(600, 660, "a")]
+
+
+def test_session_interval_prefers_typed_fields():
+    typed = {**session("10:00"), "startsAt": "2099-03-02T14:30", "durationMinutes": 45}
+    start, end = session_interval(typed)
+    assert end - start == 45
+    assert session_interval(session("2:30 PM")) == (start, start + 60)
+    assert session_interval(session("not a time")) is None
+
+
+def test_practitioner_and_room_conflicts():
+    index = ScheduleIndex()
+    index.upsert("a", session("10:00"))
+    assert [c.resource for c in index.conflicts(session("10:30"))] == ["practitioner", "location"]
+    assert [c.resource for c in index.conflicts(session("10:30", location="Room 2"))] == ["practitioner"]
+    assert [c.resource for c in index.conflicts(session("10:30", practitioner="  dr. SHARMA "))] == ["practitioner", "location"]
+    assert index.conflicts(session("11:00")) == []                 # back to back
+    assert index.conflicts(session("10:30", date="2099-03-03")) == []
+    assert index.conflicts(session("10:30", practitioner="Dr. Rao", location="Room 2")) == []
+
+
+def test_a_session_never_conflicts_with_itself_or_when_cancelled():
+    index = ScheduleIndex()
+    index.upsert("a", session("10:00"))
+    assert index.conflicts(session("10:15"), exclude_id="a") == []
+    assert index.conflicts(session("10:15", status="Cancelled")) == []
+    index.upsert("a", session("10:00", status="Cancelled"))
+    assert index.current("a") is None
+    assert index.conflicts(session("10:15")) == []
+
+
+def test_upsert_moves_and_remove_frees_the_slot():
+    index = ScheduleIndex()
+    index.upsert("a", session("10:00"))
+    index.upsert("a", session("15:00"))
+    assert index.conflicts(session("10:00")) == []
+    assert [c.session_id for c in index.conflicts(session("15:30"))] == ["a", "a"]
+    index.remove("a")
+    assert len(index) == 0 and index.conflicts(session("15:30")) == []
+
+
+def test_reserve_rejects_double_booking():
+    index = ScheduleIndex()
+    index.upsert("a", session("10:00"))
+    with pytest.raises(ScheduleConflictError) as error:
+        with index.reserve(session("10:30", location="Room 2")):
+            pass
+    assert [c.session_id for c in error.value.conflicts] == ["a"]
+    with index.reserve(session("10:00"), "a"): # rescheduling onto its own slot
+        pass
+
+
+def test_concurrent_reservations_book_a_slot_once():
+    index = ScheduleIndex()
+    wanted = session("10:00")
+    booked, rejected = [], []
+    start = threading.Barrier(16)
+
+    def book(n):
+        start.wait()
+        try:
+            with index.reserve(wanted):
+                index.upsert(f"s{n}", wanted)
+                booked.append(n)
+        except ScheduleConflictError:
+            rejected.append(n)
+
+    threads = [threading.Thread(target=book, args=(n,)) for n in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert len(booked) == 1 and len(rejected) == 15
+
+
+def test_hold_locks_in_sorted_order():
+    index = ScheduleIndex()
+    done = []
+
+    def hold(resources):
+        for _ in range(200):
+            with index.hold(resources):
+                pass
+        done.append(resources)
+
+    # Opposite orders from two threads would deadlock without the sort
+    a, b = ("practitioner", "dr. sharma"), ("practitioner", "dr. rao")
+    threads = [threading.Thread(target=hold, args=([a, b],)), threading.Thread(target=hold, args=([b, a, b],))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert len(done) == 2
+
+
+def test_only_future_bookable_slots_are_held():
+    index = ScheduleIndex()
+    index.upsert("done", session("10:00", status="Completed"))
+    assert index.conflicts(session("10:00")) == []
+    # Sessions that are already over never conflict, so past records can be entered freely
+    index.upsert("past", session("10:00", date="2020-01-06"))
+    assert index.conflicts(session("10:00", date="2020-01-06")) == []
+
+
+def test_the_clinic_itself_is_not_a_room():
+    index = ScheduleIndex()
+    index.upsert("a", session("10:00", location="Clinic"))
+    assert index.conflicts(session("10:00", practitioner="Dr. Rao", location=" clinic ")) == []
+    assert [c.resource for c in index.conflicts(session("10:00", location="Clinic"))] == ["practitioner"]
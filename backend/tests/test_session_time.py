@@ -0,0 +1,76 @@
+from datetime import date
+
+import pytest
+
+from session_time import normalized_fields, parse_date, parse_duration_minutes, parse_time_minutes, touches_time
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2025-09-30", date(2025, 9, 30)),
+    (" 2025-09-30T14:00:00Z", date(2025, 9, 30)),
+    ("30/09/2025", None),
+    ("2025-02-30", None),
+    (None, None),
+])
+def test_parse_date(value, expected):
+    assert parse_date(value) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("14:00", 840),
+    ("9:05", 545),
+    ("09:30:00", 570),
+    ("2:00 PM", 840),
+    ("9 am", 540),
+    ("12:15 a.m.", 15),
+    ("12 PM", 720),
+    ("0:00", 0),
+    ("23:59", 1439),
+    ("24:00", None),
+    ("10:60", None),
+    ("13 pm", None),
+    ("14", None),           # a bare number is not a time
+    ("noon", None),
+    ("", None),
+    (None, None),
+])
+def test_parse_time_minutes(value, expected):
+    assert parse_time_minutes(value) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("60 min", 60),
+    ("45", 45),
+    ("1.5 hours", 90),
+    ("2 hrs", 120),
+    ("90 Minutes", 90),
+    ("1h", 60),
+    (30, 30),
+    (45.0, 45),
+    (True, None),
+    ("about an hour", None),
+    (None, None),
+])
+def test_parse_duration_minutes(value, expected):
+    assert parse_duration_minutes(value) == expected
+
+
+def test_normalized_fields():
+    assert normalized_fields({"date": "2026-03-02", "time": "2:30 PM", "duration": "1 hour"}) == {
+        "startsAt": "2026-03-02T14:30", "durationMinutes": 60,
+    }
+    # Unparseable values clear the typed fields rather than keeping stale ones
+    assert normalized_fields({"date": "soon", "time": "2:30 PM", "duration": "long"}) == {
+        "startsAt": None, "durationMinutes": None,
+    }
+
+
+def test_starts_at_sorts_chronologically():
+    times = ["9 am", "10:00", "2:00 PM", "11:45"]
+    starts = [normalized_fields({"date": "2026-03-02", "time": t})["startsAt"] for t in times]
+    assert sorted(starts) == ["2026-03-02T09:00", "2026-03-02T10:00", "2026-03-02T11:45", "2026-03-02T14:00"]
+
+
+def test_touches_time():
+    assert touches_time({"time": "10:00"})
+    assert not touches_time({"notes": "bring a towel", "status": "Completed"})
@@ -0,0 +1,128 @@
+import threading
+
+import pytest
+
+import scheduling
+from repositories import RESYNC, SessionChange
+from repositories import sqlite
+from session_watch import SessionWatch
+
+
+class FakeRepo:
+    def __init__(self, sessions=()):
+        self.sessions = list(sessions)
+        self.watches = 0
+        self.callback = None
+        self.fail_stream = False
+
+    def watch(self, callback):
+        self.watches += 1
+        self.callback = callback
+        return lambda: None
+
+    def stream_all(self, fields=None):
+        if self.fail_stream:
+            raise RuntimeError("storage down")
+        return [dict(session) for session in self.sessions]
+
+
+def booked(session_id, time="10:00"):
+    return {"id": session_id, "date": "2099-03-02", "time": time, "duration": "60 min",
+            "practitioner": "Dr. Sharma", "location": "Room 1", "status": "Scheduled"}
+
+
+def test_listeners_share_one_storage_watch():
+    repo = FakeRepo()
+    watch = SessionWatch(repo)
+    seen_a, seen_b = [], []
+
+    def broken(changes):
+        raise ValueError("boom")
+
+    watch.add_listener(seen_a.extend)
+    watch.add_listener(broken)
+    remove_b = watch.add_listener(seen_b.extend)
+    assert repo.watches == 1
+
+    change = SessionChange("added", "s1", {})
+    repo.callback([change])
+    assert seen_a == [change] and seen_b == [change] # a failing listener does not starve the rest
+
+    remove_b()
+    repo.callback([change])
+    assert len(seen_a) == 2 and len(seen_b) == 1
+
+
+@pytest.fixture
+def index_with(monkeypatch):
+    def build(repo):
+        watch = SessionWatch(repo)
+        monkeypatch.setattr(scheduling, "get_session_repository", lambda: repo)
+        monkeypatch.setattr(scheduling, "get_session_watch", lambda: watch)
+        monkeypatch.setattr(scheduling, "_schedule_index", None)
+        return watch
+    return build
+
+
+def test_schedule_index_stops_listening_when_its_load_fails(index_with):
+    repo = FakeRepo()
+    repo.fail_stream = True
+    watch = index_with(repo)
+    with pytest.raises(RuntimeError):
+        scheduling.get_schedule_index()
+    assert watch._listeners == []
+    assert scheduling._schedule_index is None
+
+    repo.fail_stream = False
+    assert scheduling.get_schedule_index() is scheduling.get_schedule_index()
+    assert len(watch._listeners) == 1
+
+
+def test_schedule_index_loads_once_under_concurrent_first_requests(index_with):
+    repo = FakeRepo([booked("s1")])
+    index_with(repo)
+    indexes = []
+    threads = [threading.Thread(target=lambda: indexes.append(scheduling.get_schedule_index())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(index) for index in indexes}) == 1
+    assert repo.watches == 1
+
+
+def test_schedule_index_reloads_on_resync(index_with):
+    repo = FakeRepo([booked("s1")])
+    index_with(repo)
+    index = scheduling.get_schedule_index()
+    assert index.current("s1") is not None
+
+    repo.sessions = [booked("s2", time="12:00")]
+    repo.callback([RESYNC])
+    assert index.current("s1") is None
+    assert index.current("s2") is not None
+
+
+def test_sqlite_watch_resyncs_when_the_log_was_trimmed_past_it(monkeypatch):
+    monkeypatch.setattr(sqlite, "SQLITE_POLL_SECONDS", 0.2)
+    monkeypatch.setattr(sqlite, "SQLITE_CHANGE_LOG_KEEP", 2)
+    repo = sqlite.SQLiteSessionRepository(sqlite.SQLiteDatabase(":memory:"))
+    batches, delivered = [], threading.Event()
+
+    def on_changes(changes):
+        batches.append(changes)
+        delivered.set()
+
+    stop = repo.watch(on_changes)
+    try:
+        for i in range(5): # before the first poll; only the last two stay in the log
+            repo.create({**booked(f"s{i}"), "patientId": "p1"})
+        assert delivered.wait(5)
+        assert batches[0] == [RESYNC]
+
+        delivered.clear()
+        repo.create({**booked("s5"), "patientId": "p1"})
+        assert delivered.wait(5)
+        assert [change.type for change in batches[1]] == ["added"]
+    finally:
+        stop()
@@ -81,6 +81,8 @@ export function AyurvedaChatbot({ isVisible = true }) {
   const [messages, setMessages] = React.useState([]);
   const [inputMessage, setInputMessage] = React.useState('');
   const [isTyping, setIsTyping] = React.useState(false);
+  // The server keeps the transcript; each turn only sends the new message
+  const conversationIdRef = React.useRef(null);
 
   React.useEffect(() => {
     // Welcome message when chat is first opened
@@ -96,6 +98,39 @@ export function AyurvedaChatbot({ isVisible = true }) {
     }
   }, [isOpen, messages.length]);
 
+  const createConversation = async () => {
+    const response = await fetch(`${API_BASE_URL}/chatbot/conversations`, { method: 'POST' });
+    if (!response.ok) {
+      throw new Error('Failed to start a conversation');
+    }
+    conversationIdRef.current = (await response.json()).id;
+    return conversationIdRef.current;
+  };
+
+  const postMessage = async (text) => {
+    const conversationId = conversationIdRef.current || await createConversation();
+    const send = (id) => fetch(`${API_BASE_URL}/chatbot/conversations/${id}/messages/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ message: text })
+    });
+    const response = await send(conversationId);
+    if (response.status !== 404) {
+      return response;
+    }
+    // The conversation expired after a period of inactivity. Say so, since the answer will no
+    // longer take the earlier messages into account, then start a new one and retry once
+    setMessages(prev => [...prev, {
+      id: `expired-${Date.now()}`,
+      text: "Our earlier conversation has expired, so I no longer remember what we discussed. I'm starting a new conversation; please mention anything important again.",
+      sender: 'bot',
+      timestamp: new Date()
+    }]);
+    return send(await createConversation());
+  };
+
   const sendMessage = async (text) => {
     if (!text.trim()) return;
 
@@ -111,38 +146,69 @@ export function AyurvedaChatbot({ isVisible = true }) {
     setIsTyping(true);
 
     try {
-      // Call the AI backend
-      const response = await fetch(`${API_BASE_URL}/chatbot/chat`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          message: text,
-          conversation_history: messages.map(msg => ({
-            role: msg.sender === 'user' ? 'user' : 'assistant',
-            content: msg.text
-          })).slice(-8) // Send last 8 messages for context
-        })
-      });
+      // Call the AI backend; the answer streams back as Server-Sent Events
+      const response = await postMessage(text);
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error('Failed to get AI response');
       }
 
-      const data = await response.json();
-      
-      const botMessage = {
-        id: (Date.now() + 1).toString(),
-        text: data.response,
-        formatted_html: data.formatted_html, // New field for HTML content
-        sender: 'bot',
-        timestamp: new Date(),
-        sources: data.sources || [],
-        suggestions: extractSuggestions(data.response) // Extract suggestions from AI response
+      const botId = (Date.now() + 1).toString();
+      let sources = [];
+      let streamedText = '';
+      let finished = false;
+
+      const updateBotMessage = (fields) => {
+        setMessages(prev => {
+          const exists = prev.some(msg => msg.id === botId);
+          if (!exists) {
+            return [...prev, { id: botId, text: '', sender: 'bot', timestamp: new Date(), sources, ...fields }];
+          }
+          return prev.map(msg => (msg.id === botId ? { ...msg, ...fields } : msg));
+        });
       };
 
-      setMessages(prev => [...prev, botMessage]);
+      const handleEvent = (event, data) => {
+        if (event === 'sources') {
+          sources = data.sources || [];
+        } else if (event === 'token') {
+          streamedText += data.text;
+          setIsTyping(false);
+          updateBotMessage({ text: streamedText });
+        } else if (event === 'done') {
+          finished = true;
+          updateBotMessage({
+            text: data.plain_text,
+            formatted_html: data.formatted_html, // New field for HTML content
+            sources,
+            suggestions: extractSuggestions(data.plain_text) // Extract suggestions from AI response
+          });
+        }
+      };
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+          const frame = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          const eventLine = frame.split('\n').find(line => line.startsWith('event: '));
+          const dataLine = frame.split('\n').find(line => line.startsWith('data: '));
+          if (eventLine && dataLine) {
+            handleEvent(eventLine.slice(7), JSON.parse(dataLine.slice(6)));
+          }
+        }
+      }
+
+      if (!finished) {
+        throw new Error('AI response stream ended early');
+      }
     } catch (error) {
       console.error('Error getting AI response:', error);
       // Fallback to basic response
@@ -21,6 +21,12 @@ const API_BASE_URL = import.meta.env.VITE_API_URL ||
     ? `${window.location.protocol}//${window.location.hostname}:8000`
     : `${window.location.protocol}//${window.location.hostname}`);
 
+// Chronological order from the server-normalized start ("YYYY-MM-DDTHH:MM" sorts as text);
+// sessions not yet migrated fall back to their date string
+const startKey = (session) => session.startsAt || session.date || '';
+const byStartAsc = (a, b) => startKey(a).localeCompare(startKey(b));
+const byStartDesc = (a, b) => startKey(b).localeCompare(startKey(a));
+
 const getDummySessions = (patientId) => [
     { therapy: 'Abhyanga Massage', date: '2025-09-30', time: '14:00', practitioner: 'Dr. Kamal Raj', status: 'confirmed', patientId, notes: 'Follow-up massage session.' },
     { therapy: 'Swedana Steam Therapy', date: '2025-10-02', time: '11:00', practitioner: 'Dr. Anjali Nair', status: 'confirmed', patientId, notes: 'Post-massage steam therapy.' },
@@ -33,6 +39,7 @@ export function Sessions({ onPageChange }) {
   const [previousSessions, setPreviousSessions] = useState([]);
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState(null);
+  const [notice, setNotice] = useState(null);
   const [isModalOpen, setIsModalOpen] = useState(false);
   const [sessionToEdit, setSessionToEdit] = useState(null);
 
@@ -46,19 +53,31 @@ export function Sessions({ onPageChange }) {
 
       if (allSessions.length === 0 && shouldTrySeeding) {
         const dummySessions = getDummySessions(patientId);
-        await Promise.all(dummySessions.map(session => fetch(`${API_BASE_URL}/sessions/`, {
+        // One batched request instead of one POST per session
+        const seeded = await fetch(`${API_BASE_URL}/sessions/bulk`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ ...session, duration: '60 min', location: 'Clinic', sessionId: `DUMMY-${Math.random()}` }),
-        })));
+            body: JSON.stringify({
+              operations: dummySessions.map(session => ({
+                op: 'create',
+                data: { ...session, duration: '60 min', location: 'Clinic', sessionId: `DUMMY-${Math.random()}` },
+              })),
+            }),
+        });
+        // Each item succeeds or fails on its own (e.g. 409 when its slot is taken)
+        const failed = seeded.ok ? (await seeded.json()).filter(result => result.status >= 400) : dummySessions;
+        if (failed.length > 0) {
+          const reasons = [...new Set(failed.map(result => result.error).filter(Boolean))];
+          setNotice(`${failed.length} of ${dummySessions.length} sample sessions could not be added${reasons.length ? `: ${reasons.join('; ')}` : '.'}`);
+        }
         response = await fetch(`${API_BASE_URL}/sessions/${patientId}`);
         allSessions = await response.json();
       }
 
       const upcoming = allSessions.filter(s => s.status === 'confirmed' || s.status === 'pending');
       const previous = allSessions.filter(s => s.status === 'completed');
-      setUpcomingSessions(upcoming.sort((a, b) => new Date(a.date) - new Date(b.date)));
-      setPreviousSessions(previous.sort((a, b) => new Date(b.date) - new Date(a.date)));
+      setUpcomingSessions(upcoming.sort(byStartAsc));
+      setPreviousSessions(previous.sort(byStartDesc));
     } catch (err) {
       setError('Failed to fetch sessions.');
       console.error('Fetch error:', err);
@@ -77,6 +96,32 @@ export function Sessions({ onPageChange }) {
     }
   }, [currentUser]);
 
+  // Live updates from other tabs and devices, through the backend's shared change feed
+  useEffect(() => {
+    if (!currentUser) return;
+    const source = new EventSource(`${API_BASE_URL}/sessions/${currentUser.uid}/events`);
+    const upsert = (list, session, belongs) => {
+      const rest = list.filter(s => s.id !== session.id);
+      return belongs ? [...rest, session] : rest;
+    };
+    const applyChange = (event) => {
+      const session = JSON.parse(event.data);
+      setUpcomingSessions(current => upsert(current, session, session.status === 'confirmed' || session.status === 'pending').sort(byStartAsc));
+      setPreviousSessions(current => upsert(current, session, session.status === 'completed').sort(byStartDesc));
+    };
+    const removeSession = (event) => {
+      const { id } = JSON.parse(event.data);
+      setUpcomingSessions(current => current.filter(s => s.id !== id));
+      setPreviousSessions(current => current.filter(s => s.id !== id));
+    };
+    source.addEventListener('added', applyChange);
+    source.addEventListener('modified', applyChange);
+    source.addEventListener('removed', removeSession);
+    // Sent when this client fell behind and changes were dropped
+    source.addEventListener('resync', () => fetchSessions(currentUser.uid, false));
+    return () => source.close();
+  }, [currentUser]);
+
   const handleOpenCreateModal = () => {
     setSessionToEdit(null);
     setIsModalOpen(true);
@@ -94,7 +139,7 @@ export function Sessions({ onPageChange }) {
       ...formData,
       patientId: currentUser.uid,
       duration: '60 minutes',
-      location: 'Treatment Room A',
+      location: 'Clinic', // no room picker yet; the clinic assigns the room
       status: 'confirmed',
       sessionId: `SES${Math.floor(Math.random() * 1000)}`,
     };
@@ -108,6 +153,12 @@ export function Sessions({ onPageChange }) {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(sessionData),
       });
+      if (response.status === 409) {
+        // The practitioner or room is already booked for that slot
+        const { detail } = await response.json();
+        alert(`${detail.message}. Please pick another time.`);
+        return;
+      }
       if (!response.ok) throw new Error(`Failed to save session.`);
       setIsModalOpen(false);
       await fetchSessions(currentUser.uid, false);
@@ -175,6 +226,13 @@ export function Sessions({ onPageChange }) {
 
   return (
     <div className="p-6 space-y-8 max-w-7xl mx-auto">
+      {notice && (
+        <div className="flex items-start space-x-3 rounded-lg border border-amber-300 bg-amber-50 p-4 text-amber-800">
+          <AlertCircle className="w-5 h-5 mt-0.5 flex-shrink-0" />
+          <p className="flex-1 text-sm">{notice}</p>
+          <button onClick={() => setNotice(null)} className="text-amber-700 hover:text-amber-900"><X className="w-4 h-4" /></button>
+        </div>
+      )}
       <div className="bg-gradient-to-br from-emerald-600 to-cyan-600 rounded-2xl p-8 text-white">
         <div className="flex justify-between items-center mb-6">
           <div><h1 className="text-3xl font-bold">My Sessions</h1><p className="text-emerald-100">Manage your therapy sessions and track your progress</p></div>